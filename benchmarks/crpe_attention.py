@@ -0,0 +1,101 @@
+import argparse
+
+import os, sys
+sys.path.append(os.getcwd())
+
+import torch
+
+from benchmarks.utils import benchmark
+from teethland import PointTensor
+from teethland.nn.modules.attention import (
+    CRPEAttention,
+    DenseOrSparseStratifiedCRPEAttention,
+)
+
+
+class Attend(torch.nn.Module):
+
+    def __init__(self, attention: CRPEAttention):
+        super().__init__()
+
+        self.attention = attention
+
+    def forward(self, features, qk_pair_idxs, rel_xyz_table_idxs):
+        return self.attention.attend(features, qk_pair_idxs, rel_xyz_table_idxs)
+
+
+def synthetic_attention(
+    num_points: int,
+    channels: int,
+    heads: int,
+    window_size: float,
+    device: torch.device,
+    seed: int=0,
+):
+    g = torch.Generator().manual_seed(seed)
+
+    # points in the size of a normalized dental arch, with stratified windows
+    coords = torch.rand(num_points, 3, generator=g) * torch.tensor([6.0, 6.0, 1.0])
+    x = PointTensor(
+        coordinates=coords,
+        features=torch.randn(num_points, channels, generator=g),
+    ).to(device)
+
+    layer = DenseOrSparseStratifiedCRPEAttention(
+        in_channels=channels,
+        out_channels=channels,
+        heads=heads,
+        window_size=window_size,
+        shifted=False,
+        downsample_ratio=0.26,
+        crpe_bins=80,
+    ).to(device)
+    qk_pair_idxs, _ = layer.query_key_pair_indices(x)
+
+    attention = layer.dense_attention
+    rel_xyz_table_idxs = attention.relative_xyz_table_indices(x, qk_pair_idxs)
+
+    return attention, (x.F, qk_pair_idxs, rel_xyz_table_idxs)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num_points', required=False, default=20000, type=int)
+    parser.add_argument('--window_size', required=False, default=0.2, type=float)
+    parser.add_argument('--channels', required=False, default=48, type=int)
+    parser.add_argument('--heads', required=False, default=6, type=int)
+    parser.add_argument('--repeats', required=False, default=10, type=int)
+    parser.add_argument('--device', required=False, default='cpu', type=str)
+    args = parser.parse_args()
+
+    device = torch.device(args.device)
+
+    attention, inputs = synthetic_attention(
+        args.num_points, args.channels, args.heads, args.window_size, device,
+    )
+    features, qk_pair_idxs, _ = inputs
+    print(f'{args.num_points} points, {qk_pair_idxs.shape[1]} query-key pairs')
+
+    model = Attend(attention)
+    compiled = torch.compile(model, fullgraph=True, dynamic=True)
+    exported = torch.export.export(model, inputs).module()
+
+    with torch.no_grad():
+        out, time = benchmark(lambda: model(*inputs), device, args.repeats)
+        compiled_out, compiled_time = benchmark(lambda: compiled(*inputs), device, args.repeats)
+        exported_out = exported(*inputs)
+    assert torch.allclose(out, compiled_out, atol=1e-5), 'Compiled output differs.'
+    assert torch.allclose(out, exported_out, atol=1e-5), 'Exported output differs.'
+    print(f'forward: eager {1000 * time:.2f} ms, compiled {1000 * compiled_time:.2f} ms')
+
+    def forward_backward(model):
+        model.zero_grad()
+        features.requires_grad_(True).grad = None
+        model(*inputs).square().sum().backward()
+
+        return torch.cat([features.grad.flatten()] + [p.grad.flatten() for p in model.parameters()])
+
+    grads, time = benchmark(lambda: forward_backward(model), device, args.repeats)
+    compiled_grads, compiled_time = benchmark(lambda: forward_backward(compiled), device, args.repeats)
+    assert torch.allclose(grads, compiled_grads, rtol=1e-4, atol=1e-4), 'Compiled gradients differ.'
+    print(f'forward+backward: eager {1000 * time:.2f} ms, compiled {1000 * compiled_time:.2f} ms')
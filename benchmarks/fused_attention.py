@@ -0,0 +1,87 @@
+import argparse
+
+import os, sys
+sys.path.append(os.getcwd())
+
+import torch
+
+from benchmarks.crpe_attention import synthetic_attention
+from benchmarks.utils import benchmark
+from teethland.nn.modules.attention import CRPEAttention
+import teethland.nn.functional as F
+
+
+def attend_unfused(
+    attention: CRPEAttention,
+    features: torch.Tensor,
+    qk_pair_idxs: torch.Tensor,
+    rel_xyz_table_idxs: torch.Tensor,
+) -> torch.Tensor:
+    qkv = attention.qkv.linear(features)
+    qkv = qkv.reshape(-1, 3, attention.heads, attention.head_channels)
+    queries, keys, values = qkv.transpose(0, 1)
+
+    attention_logits = F.attention_logits_crpe(
+        queries * attention.query_scale,
+        keys,
+        qk_pair_idxs,
+        attention.query_rel_xyz_tables,
+        attention.key_rel_xyz_tables,
+        rel_xyz_table_idxs
+    )
+    attention_distrs = F.segment_softmax(
+        attention_logits, qk_pair_idxs[0], features.shape[0],
+    )
+    agg_values = F.aggregate_values_crpe(
+        values,
+        qk_pair_idxs,
+        attention_distrs,
+        attention.value_rel_xyz_tables,
+        rel_xyz_table_idxs,
+    )
+
+    return agg_values.reshape(-1, attention.heads * attention.head_channels)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num_points', required=False, default=20000, type=int)
+    parser.add_argument('--window_size', required=False, default=0.2, type=float)
+    parser.add_argument('--channels', required=False, default=48, type=int)
+    parser.add_argument('--heads', required=False, default=6, type=int)
+    parser.add_argument('--repeats', required=False, default=10, type=int)
+    args = parser.parse_args()
+
+    # the fused kernel is only implemented for CPU
+    device = torch.device('cpu')
+
+    attention, inputs = synthetic_attention(
+        args.num_points, args.channels, args.heads, args.window_size, device,
+    )
+    features, qk_pair_idxs, _ = inputs
+    num_pairs = qk_pair_idxs.shape[1]
+    pair_bytes = 3 * num_pairs * args.heads * features.element_size()
+    print(f'{args.num_points} points, {num_pairs} query-key pairs')
+    print(f'pair-level activations of unfused attention: {pair_bytes / 2**20:.1f} MiB')
+
+    with torch.no_grad():
+        out, time = benchmark(lambda: attend_unfused(attention, *inputs), device, args.repeats)
+        fused_out, fused_time = benchmark(lambda: attention.attend(*inputs), device, args.repeats)
+    assert torch.allclose(out, fused_out, atol=1e-5), 'Fused output differs.'
+    print(f'forward: unfused {1000 * time:.2f} ms, fused {1000 * fused_time:.2f} ms')
+
+    def forward_backward(fn):
+        attention.zero_grad()
+        features.requires_grad_(True).grad = None
+        fn(*inputs).square().sum().backward()
+
+        return torch.cat([features.grad.flatten()] + [p.grad.flatten() for p in attention.parameters()])
+
+    grads, time = benchmark(
+        lambda: forward_backward(lambda *x: attend_unfused(attention, *x)), device, args.repeats,
+    )
+    fused_grads, fused_time = benchmark(
+        lambda: forward_backward(attention.attend), device, args.repeats,
+    )
+    assert torch.allclose(grads, fused_grads, rtol=1e-4, atol=1e-4), 'Fused gradients differ.'
+    print(f'forward+backward: unfused {1000 * time:.2f} ms, fused {1000 * fused_time:.2f} ms')
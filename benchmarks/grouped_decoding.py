@@ -0,0 +1,52 @@
+import argparse
+
+import os, sys
+sys.path.append(os.getcwd())
+
+import torch
+import yaml
+
+from benchmarks.utils import benchmark
+from teethland import PointTensor
+from teethland.nn.modules.stratified_transformer import StratifiedTransformer
+
+
+def decoder_outputs(
+    model: StratifiedTransformer,
+    x: PointTensor,
+    grouped: bool,
+):
+    # the encoder samples randomly, so fix the seed to compare decoders
+    torch.manual_seed(0)
+    model.grouped_decoding = grouped
+    _, outs = model(x)
+
+    return torch.cat([out.F for out in outs], dim=1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num_points', required=False, default=10000, type=int)
+    parser.add_argument('--config', required=False, default='landmarks', type=str)
+    parser.add_argument('--repeats', required=False, default=5, type=int)
+    parser.add_argument('--device', required=False, default='cpu', type=str)
+    args = parser.parse_args()
+
+    device = torch.device(args.device)
+
+    with open('teethland/config/config.yaml', 'r') as f:
+        config = yaml.safe_load(f)['model'][args.config]
+    model = StratifiedTransformer(in_channels=6, **config).to(device).eval()
+
+    coords = torch.rand(args.num_points, 3) * torch.tensor([2.0, 2.0, 0.5])
+    x = PointTensor(
+        coordinates=coords,
+        features=torch.randn(args.num_points, 6),
+    ).to(device)
+    print(f'{args.num_points} points, {len(model.heads)} decoder branches')
+
+    with torch.no_grad():
+        out, time = benchmark(lambda: decoder_outputs(model, x, False), device, args.repeats)
+        grouped_out, grouped_time = benchmark(lambda: decoder_outputs(model, x, True), device, args.repeats)
+    assert torch.allclose(out, grouped_out, rtol=1e-4, atol=1e-5), 'Grouped output differs.'
+    print(f'forward: per branch {1000 * time:.2f} ms, grouped {1000 * grouped_time:.2f} ms')
@@ -0,0 +1,83 @@
+import argparse
+
+import os, sys
+sys.path.append(os.getcwd())
+
+import torch
+
+from benchmarks.utils import benchmark
+from teethland import PointTensor
+
+
+def interpolate_labels_loop(
+    x: PointTensor,
+    other: PointTensor,
+    k: int=3,
+) -> torch.Tensor:
+    neighbor_idxs, _, weights = x.interpolation_weights(other, k, cache=True)
+
+    weights = weights.float()
+    features = torch.full((neighbor_idxs.shape[0],), x.F.amin()).to(x.F)
+    max_interp = torch.zeros_like(features).float()
+    for value in torch.unique(x.F)[1:]:
+        interp = torch.einsum(
+            'Mk...,Mk,M->M...',
+            (x.F == value).float()[neighbor_idxs],
+            weights,
+            1 / weights.sum(dim=1),
+        )
+        features = torch.where(
+            (interp >= 0.5) & (interp > max_interp), value, features,
+        )
+        max_interp = torch.maximum(max_interp, interp)
+
+    return features
+
+
+def synthetic_instances(
+    num_teeth: int,
+    num_points: int,
+    downsample_ratio: float,
+    device: torch.device,
+    seed: int=0,
+):
+    g = torch.Generator().manual_seed(seed)
+
+    # points of a full-resolution scan with teeth along an arch
+    angles = torch.linspace(-torch.pi / 2, torch.pi / 2, num_teeth)
+    centres = 25 * torch.column_stack((
+        torch.sin(angles), torch.cos(angles), torch.zeros(num_teeth),
+    ))
+    coords = centres[torch.randint(num_teeth, (num_points,), generator=g)]
+    coords += 3 * torch.randn(num_points, 3, generator=g)
+
+    # instances at downsampled points, -1 for gingiva
+    dists, instances = torch.cdist(coords, centres).min(dim=1)
+    instances[dists > 4] = -1
+    x = PointTensor(coordinates=coords, features=instances).to(device)
+    x_down = x[x.farthest_point_sampling(downsample_ratio)]
+
+    return x_down, x.new_tensor(features=None)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num_teeth', required=False, default=32, type=int)
+    parser.add_argument('--num_points', required=False, default=150000, type=int)
+    parser.add_argument('--downsample_ratio', required=False, default=0.1, type=float)
+    parser.add_argument('--repeats', required=False, default=10, type=int)
+    parser.add_argument('--device', required=False, default='cpu', type=str)
+    args = parser.parse_args()
+
+    device = torch.device(args.device)
+
+    x_down, x = synthetic_instances(
+        args.num_teeth, args.num_points, args.downsample_ratio, device,
+    )
+    print(f'{x_down.num_points} to {x.num_points} points, {x_down.F.unique().numel()} labels')
+
+    # neighbors are cached, so only the label voting is timed
+    out, time = benchmark(lambda: interpolate_labels_loop(x_down, x), device, args.repeats)
+    vec_out, vec_time = benchmark(lambda: x_down.interpolate(x, cache=True).F, device, args.repeats)
+    assert torch.equal(out, vec_out), 'Vectorized labels differ.'
+    print(f'loop: {1000 * time:.2f} ms, vectorized: {1000 * vec_time:.2f} ms')
@@ -0,0 +1,75 @@
+import argparse
+
+import os, sys
+sys.path.append(os.getcwd())
+
+import torch
+
+from benchmarks.utils import benchmark
+from teethland import PointTensor
+from teethland.cluster import learned_region_cluster
+
+
+def synthetic_embeddings(
+    batch_size: int,
+    num_points: int,
+    num_teeth: int,
+    device: torch.device,
+    seed: int=0,
+):
+    g = torch.Generator().manual_seed(seed)
+
+    # points are pulled towards one of the tooth centroids
+    coords = torch.rand(batch_size * num_points, 3, generator=g)
+    centroids = torch.rand(batch_size, num_teeth, 3, generator=g)
+    batch_idxs = torch.arange(batch_size).repeat_interleave(num_points)
+    tooth_idxs = torch.randint(num_teeth, (batch_size * num_points,), generator=g)
+    dirs = centroids[batch_idxs, tooth_idxs] - coords
+
+    offsets = dirs + 0.01 * torch.randn(coords.shape, generator=g)
+    offsets = torch.atanh(offsets.clamp(-0.99, 0.99))
+    sigmas = torch.log(400 * (1 + 0.5 * torch.rand(coords.shape[0], 1, generator=g))) / 10
+    errors = torch.linalg.norm(dirs - torch.tanh(offsets), dim=-1, keepdim=True)
+    seeds = 1 - 5 * errors - 0.2 * torch.rand(errors.shape, generator=g)
+    seeds = torch.logit(seeds.clamp(0.01, 0.99))
+    seeds[torch.rand(coords.shape[0], generator=g) < 0.2] = -5  # gingiva
+
+    batch_counts = torch.full((batch_size,), num_points)
+    out = []
+    for features in [offsets, sigmas, seeds]:
+        pt = PointTensor(coords, features, batch_counts)
+        out.append(pt.to(device))
+
+    return out
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch_size', required=False, default=2, type=int)
+    parser.add_argument('--num_points', required=False, default=20000, type=int)
+    parser.add_argument('--num_teeth', required=False, default=16, type=int)
+    parser.add_argument('--num_seeds', required=False, default=256, type=int)
+    parser.add_argument('--repeats', required=False, default=10, type=int)
+    parser.add_argument('--device', required=False, default='cuda' if torch.cuda.is_available() else 'cpu', type=str)
+    args = parser.parse_args()
+
+    device = torch.device(args.device)
+    offsets, sigmas, seeds = synthetic_embeddings(
+        args.batch_size, args.num_points, args.num_teeth, device,
+    )
+
+    sequential, sequential_time = benchmark(
+        lambda: learned_region_cluster(offsets, sigmas, seeds),
+        device, args.repeats,
+    )
+    batched, batched_time = benchmark(
+        lambda: learned_region_cluster(
+            offsets, sigmas, seeds, batched=True, num_seeds=args.num_seeds,
+        ),
+        device, args.repeats,
+    )
+
+    assert torch.equal(sequential.F, batched.F), 'Instance assignments differ.'
+    print(f'Instances: {sequential.F.amax().item() + 1}')
+    print(f'Sequential: {1000 * sequential_time:.2f} ms')
+    print(f'Batched:    {1000 * batched_time:.2f} ms')
@@ -0,0 +1,170 @@
+import argparse
+
+import os, sys
+sys.path.append(os.getcwd())
+
+import torch
+
+from benchmarks.utils import benchmark
+from teethland import PointTensor
+from teethland.models.fullnet import instance_nms, tta_nms
+
+
+def tta_nms_loop(
+    clusters: PointTensor,
+    labels: PointTensor,
+    iou_thresh: float=0.8,
+):
+    clusters1, clusters2 = clusters.batch(0), clusters.batch(1)
+
+    num_instances = labels.batch_counts.sum()
+    ious = torch.zeros(num_instances, num_instances).to(clusters.F.device)
+    for i in range(labels.batch_counts[0]):
+        mask1 = clusters1.F == i
+        for j in range(labels.batch_counts[1]):
+            mask2 = clusters2.F == (labels.batch_counts[0] + j)
+
+            inter = (mask1 & mask2).sum()
+            union = (mask1 | mask2).sum()
+            iou = inter / (union + 1e-6)
+            ious[i, labels.batch_counts[0] + j] = iou
+
+    keep = torch.ones(labels.batch_counts.sum()).bool().to(clusters.F.device)
+    for index, iou in enumerate(ious):
+        if not keep[index]:
+            continue
+
+        condition = iou >= iou_thresh
+        keep = keep & ~condition
+
+    return torch.nonzero(keep)[:, 0]
+
+
+def instance_nms_loop(
+    probs: PointTensor,
+    point_idxs: torch.Tensor,
+    conf_thresh: float=0.5,
+    iou_thresh: float=0.3,
+    score_thresh: float=0.5,
+):
+    fg_point_idxs, scores = [], torch.empty(0).to(probs.F)
+    for i in range(probs.batch_size):
+        fg_mask = probs.batch(i).F >= conf_thresh
+        fg_idxs = point_idxs[i][fg_mask]
+        fg_point_idxs.append(set(fg_idxs.cpu().tolist()))
+
+        score = probs.batch(i).F[fg_mask].mean()
+        scores = torch.cat((scores, score[None]))
+
+    sort_index = torch.argsort(scores, descending=True)
+    fg_point_idxs = [fg_point_idxs[idx.item()] for idx in sort_index]
+
+    ious = torch.zeros(probs.batch_size, probs.batch_size).to(probs.F)
+    for i in range(probs.batch_size):
+        for j in range(i + 1, probs.batch_size):
+            inter = len(fg_point_idxs[i] & fg_point_idxs[j])
+            union = len(fg_point_idxs[i] | fg_point_idxs[j])
+            iou = inter / (union + 1e-6)
+            ious[i, j] = iou
+
+    keep = scores[sort_index] >= score_thresh
+    for index, iou in enumerate(ious):
+        if not keep[index]:
+            continue
+
+        condition = iou >= iou_thresh
+        keep = keep & ~condition
+
+    return sort_index[keep].unique()
+
+
+def synthetic_proposals(
+    num_proposals: int,
+    proposal_points: int,
+    num_points: int,
+    device: torch.device,
+    seed: int=0,
+):
+    g = torch.Generator().manual_seed(seed)
+
+    # proposals around random centres, neighboring proposals overlap
+    centres = torch.randint(num_points, (num_proposals,), generator=g)
+    offsets = torch.randint(-proposal_points, proposal_points, (num_proposals, proposal_points), generator=g)
+    point_idxs = (centres[:, None] + offsets).clamp(0, num_points - 1)
+
+    probs = torch.rand(num_proposals, proposal_points, generator=g)
+    probs = torch.where(offsets.abs() < proposal_points // 2, probs ** 0.25, probs ** 4)
+    probs = PointTensor(
+        coordinates=torch.rand(num_proposals * proposal_points, 3, generator=g),
+        features=probs.flatten(),
+        batch_counts=torch.full((num_proposals,), proposal_points),
+    )
+
+    return probs.to(device), point_idxs.to(device)
+
+
+def synthetic_tta_clusters(
+    num_teeth: int,
+    num_points: int,
+    device: torch.device,
+    seed: int=0,
+):
+    g = torch.Generator().manual_seed(seed)
+
+    # second batch element is a noisy copy of the first
+    cluster_idxs1 = torch.randint(-1, num_teeth, (num_points,), generator=g)
+    cluster_idxs2 = torch.where(
+        torch.rand(num_points, generator=g) < 0.9,
+        cluster_idxs1,
+        torch.randint(-1, num_teeth, (num_points,), generator=g),
+    )
+    cluster_idxs2[cluster_idxs2 >= 0] += num_teeth
+
+    clusters = PointTensor(
+        coordinates=torch.rand(2 * num_points, 3, generator=g),
+        features=torch.cat((cluster_idxs1, cluster_idxs2)),
+        batch_counts=torch.tensor([num_points, num_points]),
+    )
+    labels = PointTensor(
+        coordinates=torch.rand(2 * num_teeth, 3, generator=g),
+        batch_counts=torch.tensor([num_teeth, num_teeth]),
+    )
+
+    return clusters.to(device), labels.to(device)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num_proposals', required=False, default=32, type=int)
+    parser.add_argument('--proposal_points', required=False, default=10000, type=int)
+    parser.add_argument('--num_points', required=False, default=100000, type=int)
+    parser.add_argument('--num_teeth', required=False, default=16, type=int)
+    parser.add_argument('--repeats', required=False, default=10, type=int)
+    parser.add_argument('--device', required=False, default='cuda' if torch.cuda.is_available() else 'cpu', type=str)
+    args = parser.parse_args()
+
+    device = torch.device(args.device)
+
+    probs, point_idxs = synthetic_proposals(
+        args.num_proposals, args.proposal_points, args.num_points, device,
+    )
+    loop_keep, loop_time = benchmark(
+        lambda: instance_nms_loop(probs, point_idxs), device, args.repeats,
+    )
+    keep, time = benchmark(
+        lambda: instance_nms(probs, point_idxs), device, args.repeats,
+    )
+    assert torch.equal(loop_keep, keep), 'Kept proposals differ.'
+    print(f'instance_nms: loop {1000 * loop_time:.2f} ms, sparse {1000 * time:.2f} ms')
+
+    clusters, labels = synthetic_tta_clusters(
+        args.num_teeth, args.num_points, device,
+    )
+    loop_keep, loop_time = benchmark(
+        lambda: tta_nms_loop(clusters, labels), device, args.repeats,
+    )
+    keep, time = benchmark(
+        lambda: tta_nms(clusters, labels), device, args.repeats,
+    )
+    assert torch.equal(loop_keep, keep), 'Kept instances differ.'
+    print(f'tta_nms: loop {1000 * loop_time:.2f} ms, sparse {1000 * time:.2f} ms')
@@ -0,0 +1,124 @@
+import argparse
+import importlib
+
+import os, sys
+sys.path.append(os.getcwd())
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+import scipy.spatial.distance as compute_dist_matrix
+from sklearn.metrics import f1_score
+import torch
+
+from benchmarks.utils import benchmark
+calculate_metrics = importlib.import_module('evaluation.3dteethseg').calculate_metrics
+
+
+def calculate_metrics_loop(gt_label_dict, pred_label_dict):
+    gt_instances = np.array(gt_label_dict['instances'])
+    gt_labels = np.array(gt_label_dict['labels'])
+    pred_instances = np.array(pred_label_dict['instances'])
+    pred_labels = np.array(pred_label_dict['labels'])
+
+    pred_instance_label_dict = {}
+    for pred_inst in np.unique(pred_instances[pred_instances != 0]):
+        pred_label_inst = pred_labels[pred_instances == pred_inst]
+        if len(np.unique(pred_label_inst)) == 1:
+            pred_verts = gt_label_dict['mesh_vertices'][pred_instances == pred_inst]
+            pred_center = np.mean(pred_verts, axis=0)
+            pred_instance_label_dict[str(pred_inst)] = {'label': pred_label_inst[0], 'centroid': pred_center}
+        else:
+            pred_labels[pred_instances == pred_inst] = 0
+            pred_instances[pred_instances == pred_inst] = 0
+
+    gt_instance_label_dict = {}
+    for l in np.unique(gt_instances[gt_instances != 0]):
+        label = np.unique(gt_labels[gt_instances == l])
+        assert len(label) == 1
+
+        gt_verts = gt_label_dict['mesh_vertices'][gt_instances == l]
+        gt_center = np.mean(gt_verts, axis=0)
+        tooth_size = np.sqrt(np.sum((gt_center - gt_verts) ** 2, axis=0))
+        gt_instance_label_dict[str(l)] = {'label': label[0], 'centroid': gt_center, 'tooth_size': tooth_size}
+
+    M = compute_dist_matrix.cdist(
+        [v['centroid'] for v in gt_instance_label_dict.values()],
+        [v['centroid'] for v in pred_instance_label_dict.values()],
+    )
+    row_ind, col_ind = linear_sum_assignment(M)
+    gt_keys, pred_keys = list(gt_instance_label_dict), list(pred_instance_label_dict)
+    matching_dict = {gt_keys[i]: pred_keys[j] for i, j in zip(row_ind, col_ind)}
+
+    TLA = 0
+    for inst, info in gt_instance_label_dict.items():
+        if inst in matching_dict:
+            pred_info = pred_instance_label_dict[matching_dict[inst]]
+            TLA += np.linalg.norm((info['centroid'] - pred_info['centroid']) / info['tooth_size'])
+        else:
+            TLA += 5 * np.linalg.norm(info['tooth_size'])
+    TLA /= len(gt_instance_label_dict)
+
+    gt_instances[gt_instances != 0] = 1
+    pred_instances[pred_instances != 0] = 1
+    TSA = f1_score(gt_instances, pred_instances, average='micro')
+
+    TIR = 0
+    for gt_inst, pred_inst in matching_dict.items():
+        gt_info, pred_info = gt_instance_label_dict[gt_inst], pred_instance_label_dict[pred_inst]
+        dist = np.linalg.norm((gt_info['centroid'] - pred_info['centroid']) / gt_info['tooth_size'])
+        if dist < 0.5 and gt_info['label'] == pred_info['label']:
+            TIR += 1
+    TIR /= len(matching_dict)
+
+    return TLA, TSA, TIR
+
+
+def synthetic_scan(
+    num_teeth: int,
+    num_points: int,
+    seed: int=0,
+):
+    rng = np.random.default_rng(seed)
+
+    # teeth along an arch surrounded by gingiva
+    angles = np.linspace(-np.pi / 2, np.pi / 2, num_teeth)
+    centres = 25 * np.column_stack((np.sin(angles), np.cos(angles), np.zeros(num_teeth)))
+    gt_instances = rng.integers(-num_teeth, num_teeth + 1, size=num_points).clip(0)
+    vertices = np.concatenate((np.zeros((1, 3)), centres))[gt_instances]
+    vertices += rng.normal(scale=np.where(gt_instances > 0, 3, 15)[:, None], size=(num_points, 3))
+    gt_labels = np.where(gt_instances > 0, 10 * (1 + 2 * (gt_instances > num_teeth // 2)) + (gt_instances - 1) % 8 + 1, 0)
+
+    # predictions mislabel points and swap the labels of two teeth
+    noise = rng.random(num_points) < 0.05
+    pred_instances = np.where(noise, rng.integers(num_teeth + 1, size=num_points), gt_instances)
+    pred_labels = np.where(pred_instances > 0, gt_labels.max(), 0)
+    for inst in range(1, num_teeth + 1):
+        pred_labels[pred_instances == inst] = gt_labels[gt_instances == inst][0]
+    pred_labels[pred_instances == 1], pred_labels[pred_instances == 2] = gt_labels[gt_instances == 2][0], gt_labels[gt_instances == 1][0]
+    pred_labels[np.flatnonzero(pred_instances == 3)[0]] = 0  # ambiguous instance
+
+    gt_label_dict = {'instances': gt_instances.tolist(), 'labels': gt_labels.tolist(), 'mesh_vertices': vertices}
+    pred_label_dict = {'instances': pred_instances.tolist(), 'labels': pred_labels.tolist()}
+
+    return gt_label_dict, pred_label_dict
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num_teeth', required=False, default=16, type=int)
+    parser.add_argument('--num_points', required=False, default=150000, type=int)
+    parser.add_argument('--repeats', required=False, default=10, type=int)
+    args = parser.parse_args()
+
+    device = torch.device('cpu')
+
+    gt_label_dict, pred_label_dict = synthetic_scan(args.num_teeth, args.num_points)
+    loop_metrics, loop_time = benchmark(
+        lambda: calculate_metrics_loop(gt_label_dict, pred_label_dict), device, args.repeats,
+    )
+    metrics, time = benchmark(
+        lambda: calculate_metrics(gt_label_dict, pred_label_dict), device, args.repeats,
+    )
+    assert np.allclose(loop_metrics, metrics, rtol=1e-12, atol=0), 'Metrics differ.'
+    print('TLA: {:.6f}, TSA: {:.6f}, TIR: {:.6f}'.format(*metrics))
+    print(f'calculate_metrics: loop {1000 * loop_time:.2f} ms, vectorized {1000 * time:.2f} ms')
@@ -0,0 +1,18 @@
+from time import perf_counter
+
+import torch
+
+
+def benchmark(fn, device: torch.device, repeats: int):
+    times = []
+    for _ in range(repeats + 1):
+        if device.type == 'cuda':
+            torch.cuda.synchronize(device)
+        time = perf_counter()
+        out = fn()
+        if device.type == 'cuda':
+            torch.cuda.synchronize(device)
+        times.append(perf_counter() - time)
+
+    # skip first run as warm-up
+    return out, sum(times[1:]) / repeats
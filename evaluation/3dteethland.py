@@ -256,16 +256,12 @@ def main():
         "FacialPoint": {}
     }
 
-    for _, row in pred_submission.iterrows():
-        class_name = row['class']
-        key = row['key']
-        coord = [row['coord_x'], row['coord_y'], row['coord_z']]
-        prob = row['score']
-
-        if key not in pred_all_map[class_name]:
-            pred_all_map[class_name][key] = [[coord, prob]]
-        else:
-            pred_all_map[class_name][key].append([coord, prob])
+    # group rows per class and mesh, keeping order of rows
+    groups = pred_submission.groupby(['class', 'key'], sort=False)
+    for (class_name, key), rows in groups:
+        coords = rows[['coord_x', 'coord_y', 'coord_z']].values.tolist()
+        probs = rows['score'].values.tolist()
+        pred_all_map[class_name][key] = [list(pair) for pair in zip(coords, probs)]
 
     with open(args.goldstandard_file, 'rb') as fp:
         gold = pickle.load(fp)
@@ -1,22 +1,54 @@
+import argparse
 from collections import defaultdict
-from functools import partial
 import math
-import multiprocessing as mp
 from pathlib import Path
 import json
 
+import os, sys
+sys.path.append(os.getcwd())
+
 import numpy as np
 import pymeshlab
 from scipy.optimize import linear_sum_assignment
 import scipy.spatial.distance as compute_dist_matrix
-from sklearn.metrics import f1_score
 import traceback
-from tqdm import tqdm
 
+from evaluation.engine import evaluate, index_files, match_files
+
+
+def instance_properties(instances, labels, vertices):
+    """
+    Determine the centroid, tooth size and label of all instances at once.
+
+    Returns the instance ids, centroids, tooth sizes, labels and whether the
+    points of each instance have one unique label, excluding instance 0
+    -------
 
-def compute_tooth_size(points, centroid):
-    size = np.sqrt(np.sum((centroid - points) ** 2, axis=0))
-    return size
+    """
+    # instances are small non-negative integers, so compact them by counting
+    counts = np.bincount(instances)
+    ids = np.flatnonzero(counts)
+    idxs = (np.cumsum(counts > 0) - 1)[instances]
+    counts = counts[ids]
+
+    centroids = np.column_stack([
+        np.bincount(idxs, vertices[:, i], minlength=ids.shape[0]) for i in range(3)
+    ]) / counts[:, None]
+    sq_dists = (vertices - centroids[idxs]) ** 2
+    tooth_sizes = np.sqrt(np.column_stack([
+        np.bincount(idxs, sq_dists[:, i], minlength=ids.shape[0]) for i in range(3)
+    ]))
+
+    min_labels = np.full(ids.shape[0], labels.max(initial=0))
+    max_labels = np.full(ids.shape[0], labels.min(initial=0))
+    np.minimum.at(min_labels, idxs, labels)
+    np.maximum.at(max_labels, idxs, labels)
+
+    fg = ids != 0
+    return (
+        ids[fg], centroids[fg], tooth_sizes[fg],
+        max_labels[fg], (min_labels == max_labels)[fg],
+    )
 
 
 def calculate_jaw_TSA(gt_instances, pred_instances):
@@ -24,35 +56,21 @@ def calculate_jaw_TSA(gt_instances, pred_instances):
     Teeth segmentation accuracy (TSA): is computed as the average F1-score over all instances of teeth point clouds.
     The F1-score of each tooth instance is measured as: F1=2*(precision * recall)/(precision+recall)
 
+    The micro-averaged F1-score of binary teeth masks equals their accuracy.
+
     Returns F1-score per jaw
     -------
 
     """
-    gt_instances[gt_instances != 0] = 1
-    pred_instances[pred_instances != 0] = 1
-    return f1_score(gt_instances, pred_instances, average='micro')
-
-
-def extract_centroids(instance_label_dict):
-    centroids_list = []
-    for k, v in instance_label_dict.items():
-        centroids_list.append((v["centroid"]))
-    return centroids_list
-
-
-def centroids_pred_to_gt_attribution(gt_instance_label_dict, pred_instance_label_dict):
-    gt_cent_list = extract_centroids(gt_instance_label_dict)
-    pred_cent_list = extract_centroids(pred_instance_label_dict)
-    M = compute_dist_matrix.cdist(gt_cent_list, pred_cent_list)
-    row_ind, col_ind = linear_sum_assignment(M)
+    return np.mean((gt_instances != 0) == (pred_instances != 0))
 
-    matching_dict = {list(gt_instance_label_dict.keys())[i]: list(pred_instance_label_dict.keys())[j]
-                    for i,j in zip(row_ind,col_ind)}
 
-    return matching_dict
+def calculate_normalized_distances(gt_centroids, gt_tooth_sizes, pred_centroids, gt_idxs, pred_idxs):
+    offsets = gt_centroids[gt_idxs] - pred_centroids[pred_idxs]
+    return np.linalg.norm(offsets / gt_tooth_sizes[gt_idxs], axis=-1)
 
 
-def calculate_jaw_TLA(gt_instance_label_dict, pred_instance_label_dict, matching_dict):
+def calculate_jaw_TLA(gt_tooth_sizes, dists, gt_idxs):
 
     """
     Teeth localization accuracy (TLA): mean of normalized Euclidean distance between ground truth (GT) teeth centroids and the closest localized teeth
@@ -62,26 +80,20 @@ def calculate_jaw_TLA(gt_instance_label_dict, pred_instance_label_dict, matching
     patient may be variable, here the mean is computed over all gathered GT Teeth in the two testing sets.
     Parameters
     ----------
-    matching_dict
-    gt_instance_label_dict
-    pred_instance_label_dict
+    gt_tooth_sizes: size of each GT tooth
+    dists: normalized distances between matched GT and predicted centroids
+    gt_idxs: indices of matched GT teeth
 
     Returns
     -------
     """
-    TLA = 0
-    for inst, info in gt_instance_label_dict.items():
-        if inst in matching_dict.keys():
+    TLA = 5 * np.linalg.norm(gt_tooth_sizes, axis=-1)
+    TLA[gt_idxs] = dists
 
-            TLA += np.linalg.norm((gt_instance_label_dict[inst]['centroid'] - pred_instance_label_dict[matching_dict
-            [inst]]['centroid']) / gt_instance_label_dict[inst]['tooth_size'])
-        else:
-            TLA += 5 * np.linalg.norm(gt_instance_label_dict[inst]['tooth_size'])
+    return TLA.sum() / TLA.shape[0]
 
-    return TLA/len(gt_instance_label_dict.keys())
 
-
-def calculate_jaw_TIR(gt_instance_label_dict, pred_instance_label_dict, matching_dict, threshold=0.5):
+def calculate_jaw_TIR(gt_labels, pred_labels, dists, gt_idxs, pred_idxs, threshold=0.5):
     """
     Teeth identification rate (TIR): is computed as the percentage of true identification cases relatively to all GT
     teeth in the two testing sets. A true identification is considered when for a given GT Tooth,
@@ -91,64 +103,41 @@ def calculate_jaw_TIR(gt_instance_label_dict, pred_instance_label_dict, matching
     -------
 
     """
-    tir = 0
-    for gt_inst, pred_inst in matching_dict.items():
-        dist = np.linalg.norm((gt_instance_label_dict[gt_inst]["centroid"]-pred_instance_label_dict[pred_inst]["centroid"])
-                         /gt_instance_label_dict[gt_inst]['tooth_size'])
-        if dist < threshold and gt_instance_label_dict[gt_inst]["label"]==pred_instance_label_dict[pred_inst]["label"]:
-            tir += 1
-    return tir/len(matching_dict)
+    tir = np.sum((dists < threshold) & (gt_labels[gt_idxs] == pred_labels[pred_idxs]))
+    return int(tir) / gt_idxs.shape[0]
 
 
 def calculate_metrics(gt_label_dict, pred_label_dict):
-    # read gt labels
-    # with open(gt_labels_path) as f:
-    #     gt_label_dict = json.load(f)
+    vertices = gt_label_dict["mesh_vertices"]
     gt_instances = np.array(gt_label_dict['instances'])
     gt_labels = np.array(gt_label_dict['labels'])
 
-    u_instances = np.unique(gt_instances)
-    u_instances = u_instances[u_instances != 0]
-
     pred_instances = np.array(pred_label_dict['instances'])
     pred_labels = np.array(pred_label_dict['labels'])
 
     # check if one instance match exactly one label else this instance(label) will be attributed to gingiva 0
-    pred_instance_label_dict = {}
-    u_pred_instances = np.unique(pred_instances)
-    # delete 0 instance
-    u_pred_instances = u_pred_instances[u_pred_instances != 0]
-    for pred_inst in u_pred_instances:
-        pred_label_inst = pred_labels[pred_instances == pred_inst]
-        nb_predicted_labels_per_inst = np.unique(pred_label_inst)
-        if len(nb_predicted_labels_per_inst) == 1:
-            # compute predicted tooth center
-            pred_verts = gt_label_dict["mesh_vertices"][pred_instances == pred_inst]
-            pred_center = np.mean(pred_verts, axis=0)
-            # tooth_size = compute_tooth_size(pred_verts, pred_center)
-            pred_instance_label_dict[str(pred_inst)] = {"label": pred_label_inst[0], "centroid": pred_center}
-
-        else:
-            pred_labels[pred_instances == pred_inst] = 0
-            pred_instances[pred_instances == pred_inst] = 0
-
-    gt_instance_label_dict = {}
-    for l in u_instances:
-        gt_lbl = gt_labels[gt_instances == l]
-        label = np.unique(gt_lbl)
-
-        assert len(label) == 1
-        # compute gt tooth center and size
-
-        gt_verts = gt_label_dict["mesh_vertices"][gt_instances == l]
-        gt_center = np.mean(gt_verts, axis=0)
-        tooth_size = compute_tooth_size(gt_verts, gt_center)
-        gt_instance_label_dict[str(l)] = {"label": label[0], "centroid": gt_center, "tooth_size": tooth_size}
-
-    matching_dict = centroids_pred_to_gt_attribution(gt_instance_label_dict, pred_instance_label_dict)
+    pred_ids, pred_centroids, _, pred_inst_labels, unique = instance_properties(
+        pred_instances, pred_labels, vertices,
+    )
+    ambiguous = np.isin(pred_instances, pred_ids[~unique])
+    pred_labels[ambiguous] = 0
+    pred_instances[ambiguous] = 0
+    pred_centroids, pred_inst_labels = pred_centroids[unique], pred_inst_labels[unique]
+
+    gt_ids, gt_centroids, gt_tooth_sizes, gt_inst_labels, unique = instance_properties(
+        gt_instances, gt_labels, vertices,
+    )
+    assert np.all(unique), f'GT instances {gt_ids[~unique]} have multiple labels.'
+
+    # Hungarian matching of GT and predicted tooth centroids
+    M = compute_dist_matrix.cdist(gt_centroids, pred_centroids)
+    gt_idxs, pred_idxs = linear_sum_assignment(M)
+    dists = calculate_normalized_distances(
+        gt_centroids, gt_tooth_sizes, pred_centroids, gt_idxs, pred_idxs,
+    )
 
     try:
-        jaw_TLA = calculate_jaw_TLA(gt_instance_label_dict, pred_instance_label_dict, matching_dict)
+        jaw_TLA = calculate_jaw_TLA(gt_tooth_sizes, dists, gt_idxs)
 
     except Exception as e:
         print("error in jaw TLA calculation")
@@ -165,7 +154,7 @@ def calculate_metrics(gt_label_dict, pred_label_dict):
         jaw_TSA = 0
 
     try:
-        jaw_TIR = calculate_jaw_TIR(gt_instance_label_dict, pred_instance_label_dict, matching_dict)
+        jaw_TIR = calculate_jaw_TIR(gt_inst_labels, pred_inst_labels, dists, gt_idxs, pred_idxs)
     except Exception as e:
         print("error in jaw TIR calculation")
         print(str(e))
@@ -190,13 +179,21 @@ def get_teeth_vertices(mesh, labels_path):
     return teeth_list, teeth_centers
 
 
-def process_scan(gt_files, pred_filename):
+def find_mesh_file(gt_filename):
+    mesh_file = gt_filename.with_suffix('.obj')
+    if mesh_file.exists():
+        return mesh_file
+
+    mesh_files = gt_filename.parent.glob(f'{gt_filename.stem}*')
+    return sorted(f for f in mesh_files if f.suffix != '.json')[-1]
+
+
+def process_scan(pred_filename, gt_filename):
     with open(pred_filename, 'r') as f:
         pred_label_dict = json.load(f)
     pred_label_dict['instances'] = (np.array(pred_label_dict['instances']) + 1).tolist()
 
     # load ground-truth segmentations
-    gt_filename = [f for f in gt_files if f.name == pred_filename.name][0]
     with open(gt_filename, 'r') as f:
         gt_label_dict = json.load(f)
 
@@ -207,70 +204,48 @@ def process_scan(gt_files, pred_filename):
         pred_label_dict['labels'] = pred_labels.tolist()
     
     ms = pymeshlab.MeshSet()
-    try:
-        ms.load_new_mesh(str(gt_filename.with_suffix('.obj')))
-    except Exception:
-        mesh_file = sorted(gt_dir.glob(f'**/{gt_filename.stem}*'))[-1]
-        ms.load_new_mesh(str(mesh_file))
-        
+    ms.load_new_mesh(str(find_mesh_file(gt_filename)))
+
     vertices = ms.current_mesh().vertex_matrix()
     gt_label_dict['mesh_vertices'] = vertices
 
     jaw_TLA, jaw_TSA, jaw_TIR = calculate_metrics(gt_label_dict, pred_label_dict)
 
-    return pred_filename, math.exp(-jaw_TLA), jaw_TSA, jaw_TIR
+    return {'TLA': math.exp(-jaw_TLA), 'TSA': jaw_TSA, 'TIR': jaw_TIR}
 
 
 
 if __name__ == "__main__":
-    sample_dir = Path('/home/mkaailab/Documents/IOS/partials/full_dataset/result_3dteethseg')
-
-    # gt_dir = Path('/home/mkaailab/Documents/IOS/Brazil/cases')    
-    gt_dir = Path('/mnt/diag/IOS/3dteethseg/full_dataset/lower_upper')
-    # pred_dir = Path('3dteethseg')
-    
-    # gt_dir = Path('/home/mkaailab/Documents/IOS/Brazil/cases')
+    parser = argparse.ArgumentParser()
+    parser.add_argument('pred_dirs', nargs='*', type=Path, default=[
+        Path('/home/mkaailab/Documents/IOS/partials/full_dataset/result_3dteethseg'),
+    ])
+    parser.add_argument('--gt_dir', required=False, default='/mnt/diag/IOS/3dteethseg/full_dataset/lower_upper', type=Path)
+    parser.add_argument('--sample_dir', required=False, default=None, type=Path)
+    parser.add_argument('--num_workers', required=False, default=8, type=int)
+    args = parser.parse_args()
+
+    # only evaluate scans in sample directory, first prediction directory by default
+    sample_dir = args.sample_dir or args.pred_dirs[0]
+    sample_names = list(index_files(sample_dir))
+    gt_files = index_files(args.gt_dir)
 
     all_scores = defaultdict(dict)
-    for pred_dir in [
-        sample_dir,
-        # Path('mixed_3dteethseg_3')
-        # Path('mixed_ios_stage1'),
-        # Path('mixed_ios_stage1tta'),
-        # Path('mixed_ios_stage2tta'),
-        # Path('mixed_ios_standardized'),
-        # Path('mixed_ios_stage2'),
-        # Path('mixed_ios_stage2twice'),
-        # Path('mixed_ios'),
-        # Path('3dteethseg_stage2tta'),
-        # Path('3dteethseg_standardized'),
-        # Path('3dteethseg_stage2'),
-        # Path('3dteethseg_stage2twice'),
-        # Path('3dteethseg'),
-    ]:
-        scans, TLA, TSA, TIR = [], [], [], []
-
-        gt_files = sorted(gt_dir.glob(f'**/*er.json'))
-        gt_files = [f for f in gt_files if (sample_dir / f.name).exists()]
-        scan_ids = [f.stem for f in gt_files]
-        _, unique_idxs = np.unique(scan_ids, return_index=True)
-        gt_files = [gt_files[i] for i in unique_idxs]
-
-        pred_files = sorted(pred_dir.glob(f'**/*er.json'))
-        pred_files = [f for f in pred_files if (sample_dir / f.name).exists()]
-        scan_ids = [f.stem for f in pred_files]
-        _, unique_idxs = np.unique(scan_ids, return_index=True)
-        pred_files = [pred_files[i] for i in unique_idxs]
-
-        with mp.Pool(8) as p:
-            i = p.imap_unordered(partial(process_scan, gt_files), pred_files)
-            for scan, tla, tsa, tir in tqdm(i, total=len(pred_files)):
-                
-                scans.append(scan)
-                TLA.append(tla)
-                TSA.append(tsa)
-                TIR.append(tir)
-                all_scores[scan.stem][pred_dir.name] = (tla + tsa + tir) / 3
+    for pred_dir in args.pred_dirs:
+        pairs = match_files(index_files(pred_dir), gt_files, sample_names)
+        results = evaluate(
+            process_scan, pairs,
+            store_path=pred_dir / f'.{Path(__file__).stem}_results.jsonl',
+            num_workers=args.num_workers,
+            input_files=lambda _, gt_file: [find_mesh_file(gt_file)],
+        )
+
+        scans = [Path(name) for name in results]
+        TLA = [result['TLA'] for result in results.values()]
+        TSA = [result['TSA'] for result in results.values()]
+        TIR = [result['TIR'] for result in results.values()]
+        for scan, tla, tsa, tir in zip(scans, TLA, TSA, TIR):
+            all_scores[scan.stem][pred_dir.name] = (tla + tsa + tir) / 3
 
         score = (np.mean(TSA) + np.mean(TLA) + np.mean(TIR))/3
         print("TSA : {} +- {}".format(np.mean(TSA), np.std(TSA)))
@@ -289,10 +264,16 @@ if __name__ == "__main__":
             "TIR": np.mean(TIR)
         }
 
+    if len(args.pred_dirs) == 1:
+        exit()
+
+    # print scans that improve with each next prediction directory
     scan_diffs = {}
     for scan, score_dict in all_scores.items():
-        scores = [score_dict[k] for k in ['mixed_ios_stage1', 'mixed_ios_stage1tta', 'mixed_ios_stage2tta', 'mixed_ios_stage2twice', 'mixed_ios']]
-        # scores = [score_dict[k] for k in ['3dteethseg_stage1', '3dteethseg_standardized', '3dteethseg_stage2', '3dteethseg_stage2twice', '3dteethseg']]
+        if len(score_dict) < len(args.pred_dirs):
+            continue
+
+        scores = [score_dict[pred_dir.name] for pred_dir in args.pred_dirs]
         scores = np.array(scores)
         if np.all((scores[1:] - scores[:-1]) > 0):
             diffs = (scores[1:] - scores[:-1]).sum()
@@ -301,4 +282,3 @@ if __name__ == "__main__":
     idxs = np.argsort(list(scan_diffs.values()))
     for idx in idxs:
         print(list(scan_diffs.keys())[idx])
-
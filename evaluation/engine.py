@@ -0,0 +1,180 @@
+from functools import partial
+import hashlib
+import inspect
+import json
+import multiprocessing as mp
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from tqdm import tqdm
+
+
+def index_files(
+    root: Path,
+    pattern: str='**/*er.json',
+) -> Dict[str, Path]:
+    """Map file names to files below root, keeping the first duplicate in sorted order."""
+    files = {}
+    for file in sorted(root.glob(pattern)):
+        files.setdefault(file.name, file)
+
+    return files
+
+
+def match_files(
+    pred_files: Dict[str, Path],
+    gt_files: Dict[str, Path],
+    names: Optional[List[str]]=None,
+) -> List[Tuple[Path, Path]]:
+    """Pair prediction and ground-truth files with the same name."""
+    names = pred_files.keys() & gt_files.keys() & set(names or pred_files)
+
+    return [(pred_files[name], gt_files[name]) for name in sorted(names)]
+
+
+class ResultsStore:
+    """Append-only store of per-scan results as JSON lines.
+
+    Every line holds the result of one prediction file, together with the
+    path, size and modification time of every file read to score the scan,
+    and a hash of the scorer configuration. A result is only reused when
+    no file nor the scorer changed since it was stored, so an interrupted
+    run resumes where it stopped.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.records = {}
+
+        if not path.exists():
+            return
+
+        with open(path, 'r') as f:
+            content = f.read()
+        for line in content.splitlines():
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:  # line of interrupted write
+                continue
+            self.records[record['key']] = record
+
+        # start on new line if last write was interrupted
+        if content and not content.endswith('\n'):
+            with open(path, 'a') as f:
+                f.write('\n')
+
+    @staticmethod
+    def fingerprint(*files: Path, config: str='') -> List[Any]:
+        stats = [(file.as_posix(), file.stat()) for file in files]
+        stats = [v for path, stat in stats for v in (path, stat.st_size, stat.st_mtime_ns)]
+
+        return stats + [config]
+
+    @staticmethod
+    def config(score_fn: Callable[[Path, Path], Any]) -> str:
+        """Hash the function, arguments, defaults and source file of a scorer."""
+        args, keywords = (), {}
+        while isinstance(score_fn, partial):
+            args, keywords = score_fn.args + args, {**score_fn.keywords, **keywords}
+            score_fn = score_fn.func
+
+        config = repr((
+            score_fn.__module__, score_fn.__qualname__,
+            getattr(score_fn, '__defaults__', None),
+            getattr(score_fn, '__kwdefaults__', None),
+            args, sorted(keywords.items()),
+        )).encode('utf-8')
+        source_file = inspect.getsourcefile(score_fn)
+        with open(source_file, 'rb') as f:
+            config += f.read()
+
+        return hashlib.sha1(config).hexdigest()
+
+    def get(
+        self,
+        key: str,
+        fingerprint: List[Any],
+    ) -> Optional[Dict[str, Any]]:
+        record = self.records.get(key)
+        if record is None or record['fingerprint'] != fingerprint:
+            return None
+
+        return record
+
+    def append(
+        self,
+        key: str,
+        fingerprint: List[Any],
+        result: Any,
+    ):
+        record = {'key': key, 'fingerprint': fingerprint, 'result': result}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+        self.records[key] = record
+
+
+def _score(
+    score_fn: Callable[[Path, Path], Any],
+    pair: Tuple[Path, Path, List[Any]],
+) -> Tuple[str, List[Any], Any]:
+    pred_file, gt_file, fingerprint = pair
+
+    return pred_file.name, fingerprint, score_fn(pred_file, gt_file)
+
+
+def evaluate(
+    score_fn: Callable[[Path, Path], Any],
+    pairs: List[Tuple[Path, Path]],
+    store_path: Optional[Path]=None,
+    num_workers: int=8,
+    input_files: Optional[Callable[[Path, Path], List[Path]]]=None,
+) -> Dict[str, Any]:
+    """Score pairs of prediction and ground-truth files in parallel.
+
+    Args:
+        score_fn: picklable function of prediction and ground-truth file,
+            which returns a JSON-serializable result of the scan.
+        pairs: prediction and ground-truth files, e.g. from match_files.
+        store_path: JSON lines file to reuse and append results, if given.
+        num_workers: number of processes, 0 to score in main process.
+        input_files: function of prediction and ground-truth file, which
+            returns the other files read by score_fn, e.g. the mesh. These
+            are included in the fingerprint of stored results.
+
+    Returns:
+        Dictionary from prediction file name to result, in order of pairs.
+    """
+    store = ResultsStore(store_path) if store_path is not None else None
+
+    config = ResultsStore.config(score_fn)
+    results, pending = {}, []
+    for pred_file, gt_file in pairs:
+        files = [pred_file, gt_file]
+        files += input_files(pred_file, gt_file) if input_files else []
+        fingerprint = ResultsStore.fingerprint(*files, config=config)
+        record = store.get(pred_file.name, fingerprint) if store else None
+        if record is None:
+            pending.append((pred_file, gt_file, fingerprint))
+        else:
+            results[pred_file.name] = record['result']
+    print(f'Scoring {len(pending)} of {len(pairs)} scans.')
+
+    score = partial(_score, score_fn)
+    if num_workers == 0:
+        outputs = map(score, pending)
+    else:
+        pool = mp.Pool(num_workers)
+        outputs = pool.imap_unordered(score, pending)
+
+    try:
+        for name, fingerprint, result in tqdm(outputs, total=len(pending)):
+            results[name] = result
+            if store:
+                store.append(name, fingerprint, result)
+    finally:
+        if num_workers > 0:
+            pool.terminate()
+
+    return {pred_file.name: results[pred_file.name] for pred_file, _ in pairs}
@@ -1,16 +1,23 @@
+import argparse
+from functools import partial
 import json
-import multiprocessing as mp
 from pathlib import Path
 import re
 
+import os, sys
+sys.path.append(os.getcwd())
+
 import matplotlib.pyplot as plt
 import numpy as np
 from sklearn.metrics import ConfusionMatrixDisplay, f1_score, jaccard_score
-from tqdm import tqdm
+
+from evaluation.engine import evaluate, index_files, match_files
 
 
 def process_scan(
     pred_filename,
+    gt_filename,
+    class_key: str='labels',
     score_thresh: float=0.0,
     iou_thresh: float=0.5,
 ):
@@ -24,7 +31,6 @@ def process_scan(
     
 
     # load ground-truth segmentations
-    gt_filename = [f for f in gt_files if f.name == pred_filename.name][0]
     with open(gt_filename, 'r') as f:
         gt_label_dict = json.load(f)
     gt_label_dict['labels'] = gt_label_dict[class_key]
@@ -78,67 +84,58 @@ def process_scan(
     fns = (np.max(ious, axis=1) < iou_thresh).sum()
     tps = (max(gt_label_dict['instances']) + max(pred_label_dict['instances']) - fps - fns) / 2
 
-    gt_points = gt_label_dict['labels']
-    pred_points = pred_label_dict['labels']
-
-    gt_labels = np.array(gt_labels)
-    pred_labels = np.array(pred_labels)
-
-    return tps, fps, fns, tooth_dices, gt_labels, pred_labels, gt_points, pred_points, pred_filename
+    return {
+        'tps': float(tps), 'fps': int(fps), 'fns': int(fns),
+        'dices': tooth_dices,
+        'gt_labels': np.array(gt_labels).tolist(),
+        'pred_labels': np.array(pred_labels).tolist(),
+    }
 
 
 
 if __name__ == "__main__":
-    gt_dir = Path('/home/mkaailab/Documents/IOS/Brazil/cases')
-    pred_dir = Path('/mnt/diag/IOS/mixed_ios/predictions/mixed_ios')
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--gt_dir', required=False, default='/home/mkaailab/Documents/IOS/Brazil/cases', type=Path)
+    parser.add_argument('--pred_dir', required=False, default='/mnt/diag/IOS/mixed_ios/predictions/mixed_ios', type=Path)
+    parser.add_argument('--class_key', required=False, default='labels', choices=['labels', 'types'])
+    parser.add_argument('--num_workers', required=False, default=16, type=int)
+    args = parser.parse_args()
 
     stats = {
         'names': [], 'fps': [], 'fns': [], 'tps': [], 'dices': [],
         'gt_labels': [], 'pred_labels': [],
-        'gt_points': [], 'pred_points': [],
     }
 
-    pred_files = sorted(pred_dir.glob('**/*er.json'))
-    # pred_files = [f for f in pred_files if len(re.split('\-|_', f.stem)[0]) == 4]
-    # pred_files = [f for f in pred_files if len(re.split('\-|_', f.stem)[0]) == 5]
-    # pred_files = [f for f in pred_files if len(re.split('\-|_', f.stem)[0]) > 5]
-
-    # pred_files = [f for f in pred_files if (sample_dir / f.name).exists()]
-    scan_ids = [f.stem for f in pred_files]
-    _, unique_idxs = np.unique(scan_ids, return_index=True)
-    pred_files = [pred_files[i] for i in unique_idxs]
-
-    gt_files = sorted(gt_dir.glob('**/*er.json'))
-    scan_ids = [f.stem for f in gt_files]
-    _, unique_idxs = np.unique(scan_ids, return_index=True)
-    gt_files = [gt_files[i] for i in unique_idxs]
-
-    stems = set([f.stem for f in gt_files]) & set([f.stem for f in pred_files])
-    gt_files = [f for f in gt_files if f.stem in stems]
-    pred_files = [f for f in pred_files if f.stem in stems]
+    pred_files = index_files(args.pred_dir)
+    # pred_files = {k: f for k, f in pred_files.items() if len(re.split('\-|_', f.stem)[0]) == 4}
+    # pred_files = {k: f for k, f in pred_files.items() if len(re.split('\-|_', f.stem)[0]) == 5}
+    # pred_files = {k: f for k, f in pred_files.items() if len(re.split('\-|_', f.stem)[0]) > 5}
+    pairs = match_files(pred_files, index_files(args.gt_dir))
     
     # thresh = determine_optimal_threshold(pred_files, gt_files)
-    class_key = 'labels'
+    results = evaluate(
+        partial(process_scan, class_key=args.class_key), pairs,
+        store_path=args.pred_dir / f'.{Path(__file__).stem}_{args.class_key}_results.jsonl',
+        num_workers=args.num_workers,
+    )
 
     failures = []
-    with mp.Pool(16) as p:
-        i = p.imap_unordered(process_scan, pred_files)
-        for out in tqdm(i, total=len(pred_files)):
-            tps, fps, fns, tooth_dices, gt_labels, pred_labels, gt_points, pred_points, pred_filename = out
-
-            # if False:
-            if fps or fns or not np.all(gt_labels == pred_labels):
-                failures.append((pred_filename, fps, fns, np.sum(gt_labels != pred_labels), gt_labels, pred_labels))
-                
-            stats['tps'].append(tps)
-            stats['fps'].append(fps)
-            stats['fns'].append(fns)
-            stats['dices'].extend(tooth_dices)
-            stats['gt_labels'].extend(gt_labels)
-            stats['pred_labels'].extend(pred_labels)
-            stats['gt_points'].extend(gt_points)
-            stats['pred_points'].extend(pred_points)
-            stats['names'].append(pred_filename.name)
+    for (pred_filename, _), out in zip(pairs, results.values()):
+        gt_labels = np.array(out['gt_labels'])
+        pred_labels = np.array(out['pred_labels'])
+        fps, fns = out['fps'], out['fns']
+
+        # if False:
+        if fps or fns or not np.all(gt_labels == pred_labels):
+            failures.append((pred_filename, fps, fns, np.sum(gt_labels != pred_labels), gt_labels, pred_labels))
+            
+        stats['tps'].append(out['tps'])
+        stats['fps'].append(fps)
+        stats['fns'].append(fns)
+        stats['dices'].extend(out['dices'])
+        stats['gt_labels'].extend(gt_labels)
+        stats['pred_labels'].extend(pred_labels)
+        stats['names'].append(pred_filename.name)
 
     print('Tooth Precision:', sum(stats['tps']) / (sum(stats['tps']) + sum(stats['fps'])))
     print('Tooth Sensitivity:', sum(stats['tps']) / (sum(stats['tps']) + sum(stats['fns'])))
@@ -149,9 +146,6 @@ if __name__ == "__main__":
     pred_labels = np.array(stats['pred_labels'])
     print('Tooth macro-F1:', f1_score(gt_labels, pred_labels, average='macro'))
 
-    # macro_iou = jaccard_score(stats['gt_points'], stats['pred_points'], labels=np.unique(stats['gt_points'])[1:], average='macro')
-    # print('macro-IoU:', macro_iou)
-
     # with open(pred_dir / f'{gt_dir.name}_failures.txt', 'w') as f:
     #     f.write('file,false_positive,false_negative,wrong_labels,gt_labels,pred_labels\n')
     #     for filename, fp, fn, count, gt_labels, pred_labels in failures:
@@ -1,6 +1,7 @@
 import argparse
 from pathlib import Path
 from time import perf_counter
+from typing import Optional
 
 import os, sys
 sys.path.append(os.getcwd())
@@ -17,13 +18,22 @@ from teethland.datamodules import (
 from teethland.models import AlignNet, FullNet
 
 
-def predict(stage: str, mixed: bool, panoptic: bool, attributes: bool, devices: int, config: str):
+def predict(
+    stage: str,
+    mixed: bool,
+    panoptic: bool,
+    attributes: bool,
+    devices: int,
+    config: str,
+    pack_path: Optional[str]=None,
+    batch_size: int=1,
+):
     with open(config, 'r') as f:
         config = yaml.safe_load(f)
 
     pl.seed_everything(config['seed'], workers=True)
 
-    config['datamodule']['batch_size'] = 1
+    config['datamodule']['batch_size'] = 1 if stage == 'align' else batch_size
     if stage == 'align':
         dm = TeethAlignDataModule(
             seed=config['seed'], **config['datamodule'],
@@ -57,6 +67,12 @@ def predict(stage: str, mixed: bool, panoptic: bool, attributes: bool, devices:
             out_dir=Path(config['out_dir']),
         )
 
+    # save parameters of all stages to one checkpoint for faster loading
+    if pack_path is not None and stage != 'align':
+        model.save_packed(pack_path)
+        print('Saved packed checkpoint to', pack_path)
+        return
+
     logger = TensorBoardLogger(
         save_dir=config['work_dir'],
         name='',
@@ -66,7 +82,7 @@ def predict(stage: str, mixed: bool, panoptic: bool, attributes: bool, devices:
     logger.log_hyperparams(config)
 
     trainer = pl.Trainer(
-        accelerator='gpu',
+        accelerator='auto',
         devices=devices,
         logger=logger,
         log_every_n_steps=1,
@@ -84,6 +100,8 @@ if __name__ == '__main__':
     parser.add_argument('--attributes', action='store_true')
     parser.add_argument('--devices', required=False, default=1, type=int)
     parser.add_argument('--config', required=False, default='teethland/config/config.yaml', type=str)
+    parser.add_argument('--pack_path', required=False, default=None, type=str)
+    parser.add_argument('--batch_size', required=False, default=1, type=int)
     args = parser.parse_args()
 
-    predict(args.stage, args.mixed, args.panoptic, args.attributes, args.devices, args.config)
+    predict(args.stage, args.mixed, args.panoptic, args.attributes, args.devices, args.config, args.pack_path, args.batch_size)
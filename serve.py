@@ -0,0 +1,176 @@
+import argparse
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import json
+from pathlib import Path
+import tempfile
+from time import perf_counter
+import traceback
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+import os, sys
+sys.path.append(os.getcwd())
+
+import pytorch_lightning as pl
+from pytorch_lightning.strategies import SingleDeviceStrategy
+import torch
+import yaml
+
+from teethland.datamodules import (
+    TeethInstFullDataModule,
+    TeethMixedFullDataModule,
+)
+from teethland.models import FullNet
+
+
+class ResidentStrategy(SingleDeviceStrategy):
+    """Strategy that keeps the model on the device after predicting."""
+
+    def teardown(self) -> None:
+        pass
+
+
+class InferenceServer(HTTPServer):
+    """HTTP server that keeps FullNet resident to predict one scan per request.
+
+    POST /predict?path=<mesh file> predicts a mesh on the local file system,
+    POST /predict?filename=<mesh name> predicts the mesh in the request body.
+    The filename is used to determine the jaw, as in TeethSegDataset. The
+    response holds the segmentation and landmarks that FullNet saves as JSON.
+    Uploaded meshes are stored temporarily, so without an out_dir, their
+    results are only returned in the response.
+    """
+
+    def __init__(
+        self,
+        address: tuple,
+        stage: str,
+        mixed: bool,
+        panoptic: bool,
+        attributes: bool,
+        config: str,
+    ):
+        super().__init__(address, PredictionHandler)
+
+        with open(config, 'r') as f:
+            config = yaml.safe_load(f)
+
+        pl.seed_everything(config['seed'], workers=True)
+
+        # load one scan per request in the main process
+        config['datamodule']['batch_size'] = 1
+        config['datamodule']['num_workers'] = 0
+        config['datamodule']['persistent_workers'] = False
+        if mixed:
+            self.dm = TeethMixedFullDataModule(
+                seed=config['seed'], **config['datamodule'],
+            )
+            config['model']['instseg'] = config['model']['mixedseg']
+        else:
+            self.dm = TeethInstFullDataModule(
+                seed=config['seed'], **config['datamodule'],
+            )
+
+        single_tooth = f'binseg{"_attributes" if attributes else ""}' if stage == 'highres' else 'landmarks'
+        config['model']['single_tooth'] = config['model'][single_tooth]
+        self.model = FullNet(
+            in_channels=self.dm.num_channels,
+            num_classes=self.dm.num_classes,
+            is_panoptic=panoptic,
+            with_attributes=attributes,
+            **config['model'],
+            out_dir=Path(config['out_dir']),
+        )
+
+        device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        self.trainer = pl.Trainer(
+            accelerator='auto',
+            strategy=ResidentStrategy(device=device),
+            logger=False,
+            enable_progress_bar=False,
+            enable_model_summary=False,
+        )
+
+    def predict(self, mesh_file: Path) -> Optional[Dict[str, Any]]:
+        self.dm.root = mesh_file.parent
+        self.dm.pred_files = [Path(mesh_file.name)]
+
+        time = perf_counter()
+        out = self.trainer.predict(self.model, datamodule=self.dm)[0][0]
+        print(f'Inference time {mesh_file.name}:', perf_counter() - time)
+
+        return out
+
+
+class PredictionHandler(BaseHTTPRequestHandler):
+
+    def send_json(self, status: int, body: Dict[str, Any]):
+        body = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urlparse(self.path).path != '/health':
+            return self.send_json(404, {'error': f'Unknown endpoint {self.path}.'})
+
+        self.send_json(200, {'status': 'ok'})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/predict':
+            return self.send_json(404, {'error': f'Unknown endpoint {url.path}.'})
+
+        query = parse_qs(url.query)
+        if 'path' in query:
+            mesh_file = Path(query['path'][0]).resolve()
+            if not mesh_file.exists():
+                return self.send_json(404, {'error': f'Mesh {mesh_file} not found.'})
+        elif 'filename' in query:
+            mesh_file = Path(Path(query['filename'][0]).name)
+        else:
+            return self.send_json(400, {'error': 'Specify path or filename of mesh.'})
+
+        try:
+            if 'path' in query:
+                out = self.server.predict(mesh_file)
+            else:
+                out = self.predict_upload(mesh_file)
+        except Exception as e:  # e.g. mesh fails to load, respond instead of dropping connection
+            traceback.print_exc()
+            return self.send_json(500, {'error': f'Inference failed for {mesh_file.name}: {e}'})
+
+        if out is None:
+            return self.send_json(500, {'error': f'Inference failed for {mesh_file.name}.'})
+
+        self.send_json(200, out)
+
+    def predict_upload(self, filename: Path) -> Optional[Dict[str, Any]]:
+        length = int(self.headers.get('Content-Length', 0))
+        with tempfile.TemporaryDirectory() as root:
+            mesh_file = Path(root) / filename
+            with open(mesh_file, 'wb') as f:
+                f.write(self.rfile.read(length))
+
+            return self.server.predict(mesh_file)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('stage', choices=['instances', 'highres', 'landmarks'])
+    parser.add_argument('--mixed', action='store_true')
+    parser.add_argument('--panoptic', action='store_true')
+    parser.add_argument('--attributes', action='store_true')
+    parser.add_argument('--config', required=False, default='teethland/config/config.yaml', type=str)
+    parser.add_argument('--host', required=False, default='127.0.0.1', type=str)
+    parser.add_argument('--port', required=False, default=8000, type=int)
+    args = parser.parse_args()
+
+    server = InferenceServer(
+        (args.host, args.port),
+        args.stage, args.mixed, args.panoptic, args.attributes, args.config,
+    )
+    print(f'Serving on http://{args.host}:{args.port}')
+    server.serve_forever()
@@ -1,29 +1,72 @@
+import os
+
 from setuptools import setup
-from torch.utils.cpp_extension import BuildExtension, CUDAExtension
+import torch
+from torch.utils.cpp_extension import (
+    BuildExtension,
+    CppExtension,
+    CUDAExtension,
+    CUDA_HOME,
+)
+
+
+sources = [
+    'src/api.cpp',
+    'src/attention/aggregate_values/aggregate_values_crpe.cpp',
+    'src/attention/aggregate_values/aggregate_values_crpe_cpu.cpp',
+    'src/attention/attention_logits/attention_logits_crpe.cpp',
+    'src/attention/attention_logits/attention_logits_crpe_cpu.cpp',
+    'src/attention/fused_attention/fused_attention_crpe.cpp',
+    'src/attention/fused_attention/fused_attention_crpe_cpu.cpp',
+    'src/attention/query_key_pairs/stratified_qk_pairs.cpp',
+    'src/attention/query_key_pairs/stratified_qk_pairs_cpu.cpp',
+    'src/farthest_point_sampling/fps.cpp',
+    'src/farthest_point_sampling/fps_cpu.cpp',
+    'src/neighbors/ball_query/ball_query.cpp',
+    'src/neighbors/ball_query/ball_query_cpu.cpp',
+    'src/neighbors/knn_query/knn_query.cpp',
+    'src/neighbors/knn_query/knn_query_cpu.cpp',
+]
+cuda_sources = [
+    'src/attention/aggregate_values/aggregate_values_crpe_cuda.cu',
+    'src/attention/attention_logits/attention_logits_crpe_cuda.cu',
+    'src/attention/query_key_pairs/stratified_qk_pairs_cuda.cu',
+    'src/farthest_point_sampling/fps_cuda.cu',
+    'src/neighbors/ball_query/ball_query_cuda.cu',
+    'src/neighbors/knn_query/knn_query_cuda.cu',
+]
+extra_compile_args = {'cxx': ['-O3', '-fopenmp']}
+extra_link_args = ['-fopenmp']
+
+
+# always compile the CPU kernels, add CUDA kernels when PyTorch and the system support it
+with_cuda = (
+    torch.version.cuda is not None
+    and CUDA_HOME is not None
+    and os.getenv('FORCE_CPU', '0') != '1'
+)
+if with_cuda:
+    extension = CUDAExtension(
+        name='pointops',
+        sources=sources + cuda_sources,
+        define_macros=[('WITH_CUDA', None)],
+        extra_compile_args={**extra_compile_args, 'nvcc': ['-O3']},
+        extra_link_args=extra_link_args,
+        runtime_library_dirs=['/usr/local/lib'],
+    )
+else:
+    extension = CppExtension(
+        name='pointops',
+        sources=sources,
+        extra_compile_args=extra_compile_args,
+        extra_link_args=extra_link_args,
+    )
 
 
 setup(
     name='pointops',
     version='0.0.0',
-    ext_modules=[CUDAExtension(
-        name='pointops',
-        sources=[
-            'src/api.cpp',
-            'src/attention/aggregate_values/aggregate_values_crpe.cu',
-            'src/attention/aggregate_values/aggregate_values_crpe_cuda.cu',
-            'src/attention/attention_logits/attention_logits_crpe.cu',
-            'src/attention/attention_logits/attention_logits_crpe_cuda.cu',
-            'src/attention/query_key_pairs/stratified_qk_pairs.cu',
-            'src/attention/query_key_pairs/stratified_qk_pairs_cuda.cu',
-            'src/farthest_point_sampling/fps.cu',
-            'src/farthest_point_sampling/fps_cuda.cu',
-            'src/neighbors/ball_query/ball_query.cu',
-            'src/neighbors/ball_query/ball_query_cuda.cu',
-            'src/neighbors/knn_query/knn_query.cu',
-            'src/neighbors/knn_query/knn_query_cuda.cu',
-        ],
-        runtime_library_dirs=['/usr/local/lib'],
-    )],
+    ext_modules=[extension],
     cmdclass={
         'build_ext': BuildExtension,
     },
@@ -1,7 +1,9 @@
 #include <pybind11/pybind11.h>
+#include <torch/library.h>
 
 #include "attention/aggregate_values/aggregate_values_crpe.h"
 #include "attention/attention_logits/attention_logits_crpe.h"
+#include "attention/fused_attention/fused_attention_crpe.h"
 #include "attention/query_key_pairs/stratified_qk_pairs.h"
 #include "farthest_point_sampling/fps.h"
 #include "neighbors/ball_query/ball_query.h"
@@ -40,54 +42,6 @@ PYBIND11_MODULE(TORCH_EXTENSION_NAME, m) {
         py::arg("k"),
         py::arg("sorted") = true
     );
-    m.def(
-        "attentionLogitsCRPE_forward",
-        &attentionLogitsCRPE_forward,
-        "Compute attention logits using contextual relative position encoding.",
-        py::arg("queries"),
-        py::arg("keys"),
-        py::arg("query_key_pair_idxs"),
-        py::arg("query_rel_xyz_tables"),
-        py::arg("key_rel_xyz_tables"),
-        py::arg("rel_xyz_table_idxs")
-    );
-    m.def(
-        "attentionLogitsCRPE_backward",
-        &attentionLogitsCRPE_backward,
-        "Compute gradient of attention logits wrt inputs using contextual relative position encoding.",
-        py::arg("queries"),
-        py::arg("keys"),
-        py::arg("query_key_pair_idxs"),
-        py::arg("query_rel_xyz_tables"),
-        py::arg("key_rel_xyz_tables"),
-        py::arg("rel_xyz_table_idxs"),
-        py::arg("attention_grad")
-    );    
-    m.def(
-        "aggregateValuesCRPE_forward",
-        &aggregateValuesCRPE_forward,
-        "Aggregate values given attention distributions using contextual relative position encoding.",
-        py::arg("values"),
-        py::arg("query_key_pair_idxs"),
-        py::arg("query_key_offsets"),
-        py::arg("max_key_count"),
-        py::arg("attention"),
-        py::arg("value_rel_xyz_tables"),
-        py::arg("rel_xyz_table_idxs")
-    );
-    m.def(
-        "aggregateValuesCRPE_backward",
-        &aggregateValuesCRPE_backward,
-        "Compute gradient of aggregated values wrt inputs using contextual relative position encoding.",
-        py::arg("values"),
-        py::arg("query_key_pair_idxs"),
-        py::arg("query_key_offsets"),
-        py::arg("max_key_count"),
-        py::arg("attention"),
-        py::arg("value_rel_xyz_tables"),
-        py::arg("rel_xyz_table_idxs"),
-        py::arg("agg_values_grad")
-    );
     m.def(
         "stratifiedQueryKeyPairs",
         &stratifiedQueryKeyPairs,
@@ -98,3 +52,71 @@ PYBIND11_MODULE(TORCH_EXTENSION_NAME, m) {
         py::arg("union") = true
     );
 }
+
+
+// attention kernels as custom operators, so torch.compile and torch.export trace them
+TORCH_LIBRARY(pointops, m) {
+    m.def(
+        "attention_logits_crpe("
+        "Tensor queries, Tensor keys, Tensor query_key_pair_idxs, "
+        "Tensor query_rel_xyz_tables, Tensor key_rel_xyz_tables, "
+        "Tensor rel_xyz_table_idxs) -> Tensor"
+    );
+    m.def(
+        "attention_logits_crpe_backward("
+        "Tensor queries, Tensor keys, Tensor query_key_pair_idxs, "
+        "Tensor query_rel_xyz_tables, Tensor key_rel_xyz_tables, "
+        "Tensor rel_xyz_table_idxs, Tensor attention_logits_grad) "
+        "-> (Tensor, Tensor, Tensor, Tensor)"
+    );
+    m.def(
+        "aggregate_values_crpe("
+        "Tensor values, Tensor query_key_pair_idxs, Tensor attention_distrs, "
+        "Tensor value_rel_xyz_tables, Tensor rel_xyz_table_idxs) -> Tensor"
+    );
+    m.def(
+        "aggregate_values_crpe_backward("
+        "Tensor values, Tensor query_key_pair_idxs, Tensor attention_distrs, "
+        "Tensor value_rel_xyz_tables, Tensor rel_xyz_table_idxs, "
+        "Tensor agg_values_grad) -> (Tensor, Tensor, Tensor)"
+    );
+    m.def(
+        "fused_attention_crpe("
+        "Tensor queries, Tensor keys, Tensor values, Tensor query_key_pair_idxs, "
+        "Tensor query_rel_xyz_tables, Tensor key_rel_xyz_tables, "
+        "Tensor value_rel_xyz_tables, Tensor rel_xyz_table_idxs) -> (Tensor, Tensor)"
+    );
+    m.def(
+        "fused_attention_crpe_backward("
+        "Tensor queries, Tensor keys, Tensor values, Tensor query_key_pair_idxs, "
+        "Tensor query_rel_xyz_tables, Tensor key_rel_xyz_tables, "
+        "Tensor value_rel_xyz_tables, Tensor rel_xyz_table_idxs, "
+        "Tensor agg_values, Tensor log_sum_exps, Tensor agg_values_grad) "
+        "-> (Tensor, Tensor, Tensor, Tensor, Tensor, Tensor)"
+    );
+}
+
+
+// the kernels dispatch on the device of their inputs themselves
+static void registerAttentionKernels(torch::Library& m) {
+    m.impl("attention_logits_crpe", &attentionLogitsCRPE_forward);
+    m.impl("attention_logits_crpe_backward", &attentionLogitsCRPE_backward);
+    m.impl("aggregate_values_crpe", &aggregateValuesCRPE_forward);
+    m.impl("aggregate_values_crpe_backward", &aggregateValuesCRPE_backward);
+}
+
+
+TORCH_LIBRARY_IMPL(pointops, CPU, m) {
+    registerAttentionKernels(m);
+
+    // fused attention only has a CPU kernel
+    m.impl("fused_attention_crpe", &fusedAttentionCRPE_forward);
+    m.impl("fused_attention_crpe_backward", &fusedAttentionCRPE_backward);
+}
+
+
+#ifdef WITH_CUDA
+TORCH_LIBRARY_IMPL(pointops, CUDA, m) {
+    registerAttentionKernels(m);
+}
+#endif
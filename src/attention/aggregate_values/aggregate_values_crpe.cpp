@@ -0,0 +1,123 @@
+#include "aggregate_values_crpe.h"
+#include "aggregate_values_crpe_cpu.h"
+#ifdef WITH_CUDA
+#include "aggregate_values_crpe_cuda.h"
+#endif
+
+#include <tuple>
+
+
+static std::tuple<torch::Tensor, int> queryKeyOffsetsAndMaxCount(
+    torch::Tensor queryKeyPairIndices
+) {
+    torch::Tensor queryKeyCounts = std::get<2>(torch::unique_consecutive(
+        queryKeyPairIndices[0], /*return_inverse=*/false, /*return_counts=*/true
+    ));
+    torch::Tensor queryKeyOffsets = queryKeyCounts.cumsum(/*dim=*/-1, /*dtype=*/torch::kInt32);
+    const int maxKeyCount = queryKeyCounts.amax().item<int>();
+
+    return std::make_tuple(queryKeyOffsets, maxKeyCount);
+}
+
+
+torch::Tensor aggregateValuesCRPE_forward(
+    torch::Tensor values,
+    torch::Tensor queryKeyPairIndices,
+    torch::Tensor attentionDistributions,
+    torch::Tensor valueRelativeXYZTables,
+    torch::Tensor relativeXYZTableIndices
+) {
+    torch::Tensor aggregatedValues = torch::empty_like(values);
+
+    if (queryKeyPairIndices.size(1) > 0) {
+        auto [queryKeyOffsets, maxKeyCount] = queryKeyOffsetsAndMaxCount(queryKeyPairIndices);
+
+        if (values.is_cuda()) {
+#ifdef WITH_CUDA
+            aggregateValuesCRPE_forward_launcher(
+                values,
+                queryKeyPairIndices,
+                queryKeyOffsets,
+                maxKeyCount,
+                attentionDistributions,
+                valueRelativeXYZTables,
+                relativeXYZTableIndices,
+                aggregatedValues
+            );
+#else
+            TORCH_CHECK(false, "pointops was compiled without CUDA support.");
+#endif
+        } else {
+            aggregateValuesCRPE_forward_cpu(
+                values,
+                queryKeyPairIndices,
+                queryKeyOffsets,
+                maxKeyCount,
+                attentionDistributions,
+                valueRelativeXYZTables,
+                relativeXYZTableIndices,
+                aggregatedValues
+            );
+        }
+    }
+
+    return aggregatedValues;
+}
+
+
+std::tuple<torch::Tensor, torch::Tensor, torch::Tensor> aggregateValuesCRPE_backward(
+    torch::Tensor values,
+    torch::Tensor queryKeyPairIndices,
+    torch::Tensor attentionDistributions,
+    torch::Tensor valueRelativeXYZTables,
+    torch::Tensor relativeXYZTableIndices,
+    torch::Tensor aggregatedValuesGradient
+) {
+    torch::Tensor valuesGradient = torch::zeros_like(values);
+    torch::Tensor attentionDistributionsGradient = torch::zeros_like(attentionDistributions);
+    torch::Tensor valueRelativeXYZTablesGradient = torch::zeros_like(valueRelativeXYZTables);
+    
+    if (queryKeyPairIndices.size(1) > 0) {
+        auto [queryKeyOffsets, maxKeyCount] = queryKeyOffsetsAndMaxCount(queryKeyPairIndices);
+
+        if (values.is_cuda()) {
+#ifdef WITH_CUDA
+            aggregateValuesCRPE_backward_launcher(
+                values,
+                queryKeyPairIndices,
+                queryKeyOffsets,
+                maxKeyCount,
+                attentionDistributions,
+                valueRelativeXYZTables,
+                relativeXYZTableIndices,
+                aggregatedValuesGradient,
+                valuesGradient,
+                attentionDistributionsGradient,
+                valueRelativeXYZTablesGradient
+            );
+#else
+            TORCH_CHECK(false, "pointops was compiled without CUDA support.");
+#endif
+        } else {
+            aggregateValuesCRPE_backward_cpu(
+                values,
+                queryKeyPairIndices,
+                queryKeyOffsets,
+                maxKeyCount,
+                attentionDistributions,
+                valueRelativeXYZTables,
+                relativeXYZTableIndices,
+                aggregatedValuesGradient,
+                valuesGradient,
+                attentionDistributionsGradient,
+                valueRelativeXYZTablesGradient
+            );
+        }
+    }
+
+    return std::make_tuple(
+        valuesGradient,
+        attentionDistributionsGradient,
+        valueRelativeXYZTablesGradient
+    );
+}
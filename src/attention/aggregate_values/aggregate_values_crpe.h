@@ -9,8 +9,6 @@
 torch::Tensor aggregateValuesCRPE_forward(
     torch::Tensor values,
     torch::Tensor queryKeyPairIndices,
-    torch::Tensor queryKeyOffsets,
-    const int maxKeyCount,
     torch::Tensor attentionDistributions,
     torch::Tensor valueRelativeXYZTables,
     torch::Tensor relativeXYZTableIndices
@@ -20,8 +18,6 @@ torch::Tensor aggregateValuesCRPE_forward(
 std::tuple<torch::Tensor, torch::Tensor, torch::Tensor> aggregateValuesCRPE_backward(
     torch::Tensor values,
     torch::Tensor queryKeyPairIndices,
-    torch::Tensor queryKeyOffsets,
-    const int maxKeyCount,
     torch::Tensor attentionDistributions,
     torch::Tensor valueRelativeXYZTables,
     torch::Tensor relativeXYZTableIndices,
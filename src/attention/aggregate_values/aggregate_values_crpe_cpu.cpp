@@ -0,0 +1,167 @@
+#include <vector>
+
+#include "../../cpu_utils.h"
+#include "aggregate_values_crpe_cpu.h"
+
+
+void aggregateValuesCRPE_forward_cpu(
+    torch::Tensor values,
+    torch::Tensor queryKeyPairIndices,
+    torch::Tensor queryKeyOffsets,
+    const int maxKeyCount,
+    torch::Tensor attentionDistributions,
+    torch::Tensor valueRelativeXYZTables,
+    torch::Tensor relativeXYZTableIndices,
+    torch::Tensor aggregatedValues
+) {
+    AT_DISPATCH_FLOATING_TYPES_AND_HALF(values.scalar_type(), "aggregateValuesCRPE_forward_cpu", ([&] {
+        const auto valuesAcc = values.accessor<scalar_t, 3>();
+        const auto queryKeyPairIndicesAcc = queryKeyPairIndices.accessor<int64_t, 2>();
+        const auto queryKeyOffsetsAcc = queryKeyOffsets.accessor<int, 1>();
+        const auto attentionDistributionsAcc = attentionDistributions.accessor<scalar_t, 2>();
+        const auto valueRelativeXYZTablesAcc = valueRelativeXYZTables.accessor<scalar_t, 4>();
+        const auto relativeXYZTableIndicesAcc = relativeXYZTableIndices.accessor<int, 2>();
+        auto aggregatedValuesAcc = aggregatedValues.accessor<scalar_t, 3>();
+
+        const int numHeads = values.size(1);
+        const int numHeadChannels = values.size(2);
+
+        at::parallel_for(0, queryKeyOffsets.size(0), SMALL_GRAIN_SIZE, [&](int64_t begin, int64_t end) {
+            std::vector<double> aggregatedValue(numHeads * numHeadChannels);
+
+            for (int64_t qi = begin; qi < end; qi++) {  // query index
+                const int64_t startIdx = qi == 0 ? 0 : queryKeyOffsetsAcc[qi - 1];
+                const int64_t endIdx = queryKeyOffsetsAcc[qi];
+
+                std::fill(aggregatedValue.begin(), aggregatedValue.end(), 0);
+                for (int64_t qki = startIdx; qki < endIdx; qki++) {  // query-key pair index
+                    const int64_t ki = queryKeyPairIndicesAcc[1][qki];  // key index
+
+                    const int relXTableIdx = relativeXYZTableIndicesAcc[qki][0];
+                    const int relYTableIdx = relativeXYZTableIndicesAcc[qki][1];
+                    const int relZTableIdx = relativeXYZTableIndicesAcc[qki][2];
+
+                    int hi, hci;  // head index, head channel index
+                    scalar_t rpe_hci;  // element of relative position encoding at index hci
+                    for (hi = 0; hi < numHeads; hi++) {
+                        const scalar_t attention = attentionDistributionsAcc[qki][hi];
+                        for (hci = 0; hci < numHeadChannels; hci++) {
+                            rpe_hci = valueRelativeXYZTablesAcc[0][relXTableIdx][hi][hci];
+                            rpe_hci += valueRelativeXYZTablesAcc[1][relYTableIdx][hi][hci];
+                            rpe_hci += valueRelativeXYZTablesAcc[2][relZTableIdx][hi][hci];
+
+                            aggregatedValue[hi * numHeadChannels + hci] += attention * (valuesAcc[ki][hi][hci] + rpe_hci);
+                        }
+                    }
+                }
+
+                for (int hi = 0; hi < numHeads; hi++) {
+                    for (int hci = 0; hci < numHeadChannels; hci++) {
+                        aggregatedValuesAcc[qi][hi][hci] = aggregatedValue[hi * numHeadChannels + hci];
+                    }
+                }
+            }
+        });
+    }));
+}
+
+
+void aggregateValuesCRPE_backward_cpu(
+    torch::Tensor values,
+    torch::Tensor queryKeyPairIndices,
+    torch::Tensor queryKeyOffsets,
+    const int maxKeyCount,
+    torch::Tensor attentionDistributions,
+    torch::Tensor valueRelativeXYZTables,
+    torch::Tensor relativeXYZTableIndices,
+    torch::Tensor aggregatedValuesGradient,
+    torch::Tensor valuesGradient,
+    torch::Tensor attentionDistributionsGradient,
+    torch::Tensor valueRelativeXYZTablesGradient
+) {
+    // visit query-key pairs grouped by key to accumulate value gradients without atomics
+    torch::Tensor keyOrder, keyOffsets;
+    std::tie(keyOrder, keyOffsets) = groupByIndex(queryKeyPairIndices[1], values.size(0));
+
+    // the look-up tables are small, so every thread accumulates into its own copy
+    const int numThreads = at::get_num_threads();
+    torch::Tensor threadValueRelativeXYZTablesGradient = valueRelativeXYZTablesGradient.unsqueeze(0).repeat({numThreads, 1, 1, 1, 1});
+
+    AT_DISPATCH_FLOATING_TYPES_AND_HALF(values.scalar_type(), "aggregateValuesCRPE_backward_cpu", ([&] {
+        const auto valuesAcc = values.accessor<scalar_t, 3>();
+        const auto queryKeyPairIndicesAcc = queryKeyPairIndices.accessor<int64_t, 2>();
+        const auto queryKeyOffsetsAcc = queryKeyOffsets.accessor<int, 1>();
+        const auto attentionDistributionsAcc = attentionDistributions.accessor<scalar_t, 2>();
+        const auto valueRelativeXYZTablesAcc = valueRelativeXYZTables.accessor<scalar_t, 4>();
+        const auto relativeXYZTableIndicesAcc = relativeXYZTableIndices.accessor<int, 2>();
+        const auto aggregatedValuesGradientAcc = aggregatedValuesGradient.accessor<scalar_t, 3>();
+        const auto keyOrderAcc = keyOrder.accessor<int64_t, 1>();
+        const auto keyOffsetsAcc = keyOffsets.accessor<int64_t, 1>();
+        auto valuesGradientAcc = valuesGradient.accessor<scalar_t, 3>();
+        auto attentionDistributionsGradientAcc = attentionDistributionsGradient.accessor<scalar_t, 2>();
+        auto threadValueRelativeXYZTablesGradientAcc = threadValueRelativeXYZTablesGradient.accessor<scalar_t, 5>();
+
+        const int numHeads = values.size(1);
+        const int numHeadChannels = values.size(2);
+
+        // gradients wrt attention distributions and relative position encodings
+        at::parallel_for(0, queryKeyOffsets.size(0), SMALL_GRAIN_SIZE, [&](int64_t begin, int64_t end) {
+            const int ti = at::get_thread_num();
+
+            for (int64_t qi = begin; qi < end; qi++) {  // query index
+                const int64_t startIdx = qi == 0 ? 0 : queryKeyOffsetsAcc[qi - 1];
+                const int64_t endIdx = queryKeyOffsetsAcc[qi];
+                for (int64_t qki = startIdx; qki < endIdx; qki++) {  // query-key pair index
+                    const int64_t ki = queryKeyPairIndicesAcc[1][qki];  // key index
+
+                    const int relXTableIdx = relativeXYZTableIndicesAcc[qki][0];
+                    const int relYTableIdx = relativeXYZTableIndicesAcc[qki][1];
+                    const int relZTableIdx = relativeXYZTableIndicesAcc[qki][2];
+
+                    int hi, hci;  // head index, head channel index
+                    scalar_t dydx;  // partial derivative of output wrt input
+                    scalar_t dLdx;  // partial derivative of loss wrt input
+                    for (hi = 0; hi < numHeads; hi++) {
+                        scalar_t attentionGradient = 0;
+                        for (hci = 0; hci < numHeadChannels; hci++) {
+                            const scalar_t dLdy = aggregatedValuesGradientAcc[qi][hi][hci];  // partial derivative of loss wrt output
+
+                            dydx = valuesAcc[ki][hi][hci];
+                            dydx += valueRelativeXYZTablesAcc[0][relXTableIdx][hi][hci];
+                            dydx += valueRelativeXYZTablesAcc[1][relYTableIdx][hi][hci];
+                            dydx += valueRelativeXYZTablesAcc[2][relZTableIdx][hi][hci];
+                            attentionGradient += dLdy * dydx;
+
+                            dLdx = dLdy * attentionDistributionsAcc[qki][hi];
+                            threadValueRelativeXYZTablesGradientAcc[ti][0][relXTableIdx][hi][hci] += dLdx;
+                            threadValueRelativeXYZTablesGradientAcc[ti][1][relYTableIdx][hi][hci] += dLdx;
+                            threadValueRelativeXYZTablesGradientAcc[ti][2][relZTableIdx][hi][hci] += dLdx;
+                        }
+                        attentionDistributionsGradientAcc[qki][hi] = attentionGradient;
+                    }
+                }
+            }
+        });
+
+        // gradients wrt values
+        at::parallel_for(0, values.size(0), SMALL_GRAIN_SIZE, [&](int64_t begin, int64_t end) {
+            for (int64_t ki = begin; ki < end; ki++) {  // key index
+                const int64_t startIdx = ki == 0 ? 0 : keyOffsetsAcc[ki - 1];
+                const int64_t endIdx = keyOffsetsAcc[ki];
+                for (int64_t i = startIdx; i < endIdx; i++) {
+                    const int64_t qki = keyOrderAcc[i];  // query-key pair index
+                    const int64_t qi = queryKeyPairIndicesAcc[0][qki];  // query index
+
+                    for (int hi = 0; hi < numHeads; hi++) {
+                        const scalar_t attention = attentionDistributionsAcc[qki][hi];
+                        for (int hci = 0; hci < numHeadChannels; hci++) {
+                            valuesGradientAcc[ki][hi][hci] += aggregatedValuesGradientAcc[qi][hi][hci] * attention;
+                        }
+                    }
+                }
+            }
+        });
+    }));
+
+    valueRelativeXYZTablesGradient.copy_(threadValueRelativeXYZTablesGradient.sum(/*dim=*/0));
+}
@@ -0,0 +1,34 @@
+#ifndef AGGREGATE_VALUES_CRPE_CPU_H
+#define AGGREGATE_VALUES_CRPE_CPU_H
+
+#include <torch/extension.h>
+
+
+void aggregateValuesCRPE_forward_cpu(
+    torch::Tensor values,
+    torch::Tensor queryKeyPairIndices,
+    torch::Tensor queryKeyOffsets,
+    const int maxKeyCount,
+    torch::Tensor attentionDistributions,
+    torch::Tensor valueRelativeXYZTables,
+    torch::Tensor relativeXYZTableIndices,
+    torch::Tensor aggregatedValues
+);
+
+
+void aggregateValuesCRPE_backward_cpu(
+    torch::Tensor values,
+    torch::Tensor queryKeyPairIndices,
+    torch::Tensor queryKeyOffsets,
+    const int maxKeyCount,
+    torch::Tensor attentionDistributions,
+    torch::Tensor valueRelativeXYZTables,
+    torch::Tensor relativeXYZTableIndices,
+    torch::Tensor aggregatedValuesGradient,
+    torch::Tensor valuesGradient,
+    torch::Tensor attentionDistributionsGradient,
+    torch::Tensor valueRelativeXYZTablesGradient
+);
+
+
+#endif
@@ -16,6 +16,7 @@ void aggregateValuesCRPE_forward_launcher(
 );
 
 
+#ifdef __CUDACC__
 template <typename scalar_t>
 __global__ void aggregateValuesCRPE_forward_cuda(
     const torch::PackedTensorAccessor32<scalar_t, 3, torch::RestrictPtrTraits> values,
@@ -26,6 +27,7 @@ __global__ void aggregateValuesCRPE_forward_cuda(
     const torch::PackedTensorAccessor32<int, 2, torch::RestrictPtrTraits> relativeXYZTableIndices,
     torch::PackedTensorAccessor32<scalar_t, 3, torch::RestrictPtrTraits> aggregatedValues
 );
+#endif
 
 
 void aggregateValuesCRPE_backward_launcher(
@@ -43,6 +45,7 @@ void aggregateValuesCRPE_backward_launcher(
 );
 
 
+#ifdef __CUDACC__
 template <typename scalar_t>
 __global__ void aggregateValuesCRPE_backward_cuda(
     const torch::PackedTensorAccessor32<scalar_t, 3, torch::RestrictPtrTraits> values,
@@ -56,6 +59,7 @@ __global__ void aggregateValuesCRPE_backward_cuda(
     torch::PackedTensorAccessor32<scalar_t, 2, torch::RestrictPtrTraits> attentionDistributionsGradient,
     torch::PackedTensorAccessor32<scalar_t, 4, torch::RestrictPtrTraits> valueRelativeXYZTablesGradient
 );
+#endif
 
 
 #endif
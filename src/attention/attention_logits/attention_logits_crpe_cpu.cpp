@@ -0,0 +1,180 @@
+#include "../../cpu_utils.h"
+#include "attention_logits_crpe_cpu.h"
+
+
+void attentionLogitsCRPE_forward_cpu(
+    torch::Tensor queries,
+    torch::Tensor keys,
+    torch::Tensor queryKeyPairIndices,
+    torch::Tensor queryRelativeXYZTables,
+    torch::Tensor keyRelativeXYZTables,
+    torch::Tensor relativeXYZTableIndices,
+    torch::Tensor attentionLogits
+) {
+    AT_DISPATCH_FLOATING_TYPES_AND_HALF(queries.scalar_type(), "attentionLogitsCRPE_forward_cpu", ([&] {
+        const auto queriesAcc = queries.accessor<scalar_t, 3>();
+        const auto keysAcc = keys.accessor<scalar_t, 3>();
+        const auto queryKeyPairIndicesAcc = queryKeyPairIndices.accessor<int64_t, 2>();
+        const auto queryRelativeXYZTablesAcc = queryRelativeXYZTables.accessor<scalar_t, 4>();
+        const auto keyRelativeXYZTablesAcc = keyRelativeXYZTables.accessor<scalar_t, 4>();
+        const auto relativeXYZTableIndicesAcc = relativeXYZTableIndices.accessor<int, 2>();
+        auto attentionLogitsAcc = attentionLogits.accessor<scalar_t, 2>();
+
+        const int numHeads = queries.size(1);
+        const int numHeadChannels = queries.size(2);
+
+        at::parallel_for(0, queryKeyPairIndices.size(1), GRAIN_SIZE, [&](int64_t begin, int64_t end) {
+            for (int64_t qki = begin; qki < end; qki++) {  // query-key pair index
+                const int64_t qi = queryKeyPairIndicesAcc[0][qki];  // query index
+                const int64_t ki = queryKeyPairIndicesAcc[1][qki];  // key index
+
+                const int relXTableIdx = relativeXYZTableIndicesAcc[qki][0];
+                const int relYTableIdx = relativeXYZTableIndicesAcc[qki][1];
+                const int relZTableIdx = relativeXYZTableIndicesAcc[qki][2];
+
+                int hi, hci;  // head index, head channel index
+                scalar_t rpe_hci;  // element of relative position encoding at index hci
+                for (hi = 0; hi < numHeads; hi++) {
+                    scalar_t logit = 0;
+                    for (hci = 0; hci < numHeadChannels; hci++) {
+                        // dot product between query and key
+                        logit += queriesAcc[qi][hi][hci] * keysAcc[ki][hi][hci];
+
+                        // relative position bias with query context
+                        rpe_hci = queryRelativeXYZTablesAcc[0][relXTableIdx][hi][hci];
+                        rpe_hci += queryRelativeXYZTablesAcc[1][relYTableIdx][hi][hci];
+                        rpe_hci += queryRelativeXYZTablesAcc[2][relZTableIdx][hi][hci];
+                        logit += queriesAcc[qi][hi][hci] * rpe_hci;
+
+                        // relative position bias with key context
+                        rpe_hci = keyRelativeXYZTablesAcc[0][relXTableIdx][hi][hci];
+                        rpe_hci += keyRelativeXYZTablesAcc[1][relYTableIdx][hi][hci];
+                        rpe_hci += keyRelativeXYZTablesAcc[2][relZTableIdx][hi][hci];
+                        logit += keysAcc[ki][hi][hci] * rpe_hci;
+                    }
+                    attentionLogitsAcc[qki][hi] = logit;
+                }
+            }
+        });
+    }));
+}
+
+
+void attentionLogitsCRPE_backward_cpu(
+    torch::Tensor queries,
+    torch::Tensor keys,
+    torch::Tensor queryKeyPairIndices,
+    torch::Tensor queryRelativeXYZTables,
+    torch::Tensor keyRelativeXYZTables,
+    torch::Tensor relativeXYZTableIndices,
+    torch::Tensor attentionLogitsGradient,
+    torch::Tensor queriesGradient,
+    torch::Tensor keysGradient,
+    torch::Tensor queryRelativeXYZTablesGradient,
+    torch::Tensor keyRelativeXYZTablesGradient
+) {
+    // visit query-key pairs grouped by query and by key to accumulate gradients without atomics
+    torch::Tensor queryOrder, queryOffsets, keyOrder, keyOffsets;
+    std::tie(queryOrder, queryOffsets) = groupByIndex(queryKeyPairIndices[0], queries.size(0));
+    std::tie(keyOrder, keyOffsets) = groupByIndex(queryKeyPairIndices[1], keys.size(0));
+
+    // the look-up tables are small, so every thread accumulates into its own copy
+    const int numThreads = at::get_num_threads();
+    torch::Tensor threadQueryRelativeXYZTablesGradient = queryRelativeXYZTablesGradient.unsqueeze(0).repeat({numThreads, 1, 1, 1, 1});
+    torch::Tensor threadKeyRelativeXYZTablesGradient = keyRelativeXYZTablesGradient.unsqueeze(0).repeat({numThreads, 1, 1, 1, 1});
+
+    AT_DISPATCH_FLOATING_TYPES_AND_HALF(queries.scalar_type(), "attentionLogitsCRPE_backward_cpu", ([&] {
+        const auto queriesAcc = queries.accessor<scalar_t, 3>();
+        const auto keysAcc = keys.accessor<scalar_t, 3>();
+        const auto queryKeyPairIndicesAcc = queryKeyPairIndices.accessor<int64_t, 2>();
+        const auto queryRelativeXYZTablesAcc = queryRelativeXYZTables.accessor<scalar_t, 4>();
+        const auto keyRelativeXYZTablesAcc = keyRelativeXYZTables.accessor<scalar_t, 4>();
+        const auto relativeXYZTableIndicesAcc = relativeXYZTableIndices.accessor<int, 2>();
+        const auto attentionLogitsGradientAcc = attentionLogitsGradient.accessor<scalar_t, 2>();
+        const auto queryOrderAcc = queryOrder.accessor<int64_t, 1>();
+        const auto queryOffsetsAcc = queryOffsets.accessor<int64_t, 1>();
+        const auto keyOrderAcc = keyOrder.accessor<int64_t, 1>();
+        const auto keyOffsetsAcc = keyOffsets.accessor<int64_t, 1>();
+        auto queriesGradientAcc = queriesGradient.accessor<scalar_t, 3>();
+        auto keysGradientAcc = keysGradient.accessor<scalar_t, 3>();
+        auto threadQueryRelativeXYZTablesGradientAcc = threadQueryRelativeXYZTablesGradient.accessor<scalar_t, 5>();
+        auto threadKeyRelativeXYZTablesGradientAcc = threadKeyRelativeXYZTablesGradient.accessor<scalar_t, 5>();
+
+        const int numHeads = queries.size(1);
+        const int numHeadChannels = queries.size(2);
+
+        // gradients wrt queries and relative position encodings
+        at::parallel_for(0, queries.size(0), SMALL_GRAIN_SIZE, [&](int64_t begin, int64_t end) {
+            const int ti = at::get_thread_num();
+
+            for (int64_t qi = begin; qi < end; qi++) {  // query index
+                const int64_t startIdx = qi == 0 ? 0 : queryOffsetsAcc[qi - 1];
+                const int64_t endIdx = queryOffsetsAcc[qi];
+                for (int64_t i = startIdx; i < endIdx; i++) {
+                    const int64_t qki = queryOrderAcc[i];  // query-key pair index
+                    const int64_t ki = queryKeyPairIndicesAcc[1][qki];  // key index
+
+                    const int relXTableIdx = relativeXYZTableIndicesAcc[qki][0];
+                    const int relYTableIdx = relativeXYZTableIndicesAcc[qki][1];
+                    const int relZTableIdx = relativeXYZTableIndicesAcc[qki][2];
+
+                    int hi, hci;  // head index, head channel index
+                    scalar_t dydx;  // partial derivative of output wrt input
+                    scalar_t dLdx;  // partial derivative of loss wrt input
+                    for (hi = 0; hi < numHeads; hi++) {
+                        const scalar_t dLdy = attentionLogitsGradientAcc[qki][hi];  // partial derivative of loss wrt output
+                        for (hci = 0; hci < numHeadChannels; hci++) {
+                            dydx = keysAcc[ki][hi][hci];
+                            dydx += queryRelativeXYZTablesAcc[0][relXTableIdx][hi][hci];
+                            dydx += queryRelativeXYZTablesAcc[1][relYTableIdx][hi][hci];
+                            dydx += queryRelativeXYZTablesAcc[2][relZTableIdx][hi][hci];
+                            queriesGradientAcc[qi][hi][hci] += dLdy * dydx;
+
+                            dLdx = dLdy * queriesAcc[qi][hi][hci];
+                            threadQueryRelativeXYZTablesGradientAcc[ti][0][relXTableIdx][hi][hci] += dLdx;
+                            threadQueryRelativeXYZTablesGradientAcc[ti][1][relYTableIdx][hi][hci] += dLdx;
+                            threadQueryRelativeXYZTablesGradientAcc[ti][2][relZTableIdx][hi][hci] += dLdx;
+
+                            dLdx = dLdy * keysAcc[ki][hi][hci];
+                            threadKeyRelativeXYZTablesGradientAcc[ti][0][relXTableIdx][hi][hci] += dLdx;
+                            threadKeyRelativeXYZTablesGradientAcc[ti][1][relYTableIdx][hi][hci] += dLdx;
+                            threadKeyRelativeXYZTablesGradientAcc[ti][2][relZTableIdx][hi][hci] += dLdx;
+                        }
+                    }
+                }
+            }
+        });
+
+        // gradients wrt keys
+        at::parallel_for(0, keys.size(0), SMALL_GRAIN_SIZE, [&](int64_t begin, int64_t end) {
+            for (int64_t ki = begin; ki < end; ki++) {  // key index
+                const int64_t startIdx = ki == 0 ? 0 : keyOffsetsAcc[ki - 1];
+                const int64_t endIdx = keyOffsetsAcc[ki];
+                for (int64_t i = startIdx; i < endIdx; i++) {
+                    const int64_t qki = keyOrderAcc[i];  // query-key pair index
+                    const int64_t qi = queryKeyPairIndicesAcc[0][qki];  // query index
+
+                    const int relXTableIdx = relativeXYZTableIndicesAcc[qki][0];
+                    const int relYTableIdx = relativeXYZTableIndicesAcc[qki][1];
+                    const int relZTableIdx = relativeXYZTableIndicesAcc[qki][2];
+
+                    int hi, hci;  // head index, head channel index
+                    scalar_t dydx;  // partial derivative of output wrt input
+                    for (hi = 0; hi < numHeads; hi++) {
+                        const scalar_t dLdy = attentionLogitsGradientAcc[qki][hi];  // partial derivative of loss wrt output
+                        for (hci = 0; hci < numHeadChannels; hci++) {
+                            dydx = queriesAcc[qi][hi][hci];
+                            dydx += keyRelativeXYZTablesAcc[0][relXTableIdx][hi][hci];
+                            dydx += keyRelativeXYZTablesAcc[1][relYTableIdx][hi][hci];
+                            dydx += keyRelativeXYZTablesAcc[2][relZTableIdx][hi][hci];
+                            keysGradientAcc[ki][hi][hci] += dLdy * dydx;
+                        }
+                    }
+                }
+            }
+        });
+    }));
+
+    queryRelativeXYZTablesGradient.copy_(threadQueryRelativeXYZTablesGradient.sum(/*dim=*/0));
+    keyRelativeXYZTablesGradient.copy_(threadKeyRelativeXYZTablesGradient.sum(/*dim=*/0));
+}
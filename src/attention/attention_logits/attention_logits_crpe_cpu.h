@@ -0,0 +1,33 @@
+#ifndef ATTENTION_LOGITS_CRPE_CPU_H
+#define ATTENTION_LOGITS_CRPE_CPU_H
+
+#include <torch/extension.h>
+
+
+void attentionLogitsCRPE_forward_cpu(
+    torch::Tensor queries,
+    torch::Tensor keys,
+    torch::Tensor queryKeyPairIndices,
+    torch::Tensor queryRelativeXYZTables,
+    torch::Tensor keyRelativeXYZTables,
+    torch::Tensor relativeXYZTableIndices,
+    torch::Tensor attentionLogits
+);
+
+
+void attentionLogitsCRPE_backward_cpu(
+    torch::Tensor queries,
+    torch::Tensor keys,
+    torch::Tensor queryKeyPairIndices,
+    torch::Tensor queryRelativeXYZTables,
+    torch::Tensor keyRelativeXYZTables,
+    torch::Tensor relativeXYZTableIndices,
+    torch::Tensor attentionLogitsGradient,
+    torch::Tensor queriesGradient,
+    torch::Tensor keysGradient,
+    torch::Tensor queryRelativeXYZTablesGradient,
+    torch::Tensor keyRelativeXYZTablesGradient
+);
+
+
+#endif
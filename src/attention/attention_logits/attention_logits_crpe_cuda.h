@@ -15,6 +15,7 @@ void attentionLogitsCRPE_forward_launcher(
 );
 
 
+#ifdef __CUDACC__
 template <typename scalar_t>
 __global__ void attentionLogitsCRPE_forward_cuda(
     const torch::PackedTensorAccessor32<scalar_t, 3, torch::RestrictPtrTraits> queries,
@@ -25,6 +26,7 @@ __global__ void attentionLogitsCRPE_forward_cuda(
     const torch::PackedTensorAccessor32<int, 2, torch::RestrictPtrTraits> relativeXYZTableIndices,
     torch::PackedTensorAccessor32<scalar_t, 2, torch::RestrictPtrTraits> attentionLogits
 );
+#endif
 
 
 void attentionLogitsCRPE_backward_launcher(
@@ -42,6 +44,7 @@ void attentionLogitsCRPE_backward_launcher(
 );
 
 
+#ifdef __CUDACC__
 template <typename scalar_t>
 __global__ void attentionLogitsCRPE_backward_cuda(
     const torch::PackedTensorAccessor32<scalar_t, 3, torch::RestrictPtrTraits> queries,
@@ -56,6 +59,7 @@ __global__ void attentionLogitsCRPE_backward_cuda(
     torch::PackedTensorAccessor32<scalar_t, 4, torch::RestrictPtrTraits> queryRelativeXYZTablesGradient,
     torch::PackedTensorAccessor32<scalar_t, 4, torch::RestrictPtrTraits> keyRelativeXYZTablesGradient
 );
+#endif
 
 
 #endif
@@ -0,0 +1,125 @@
+#include "fused_attention_crpe.h"
+#include "fused_attention_crpe_cpu.h"
+
+#include <limits>
+#include <tuple>
+
+
+// offsets of the query-key pairs of each query, given pairs sorted by query
+static torch::Tensor queryOffsets(
+    torch::Tensor queryKeyPairIndices,
+    const int64_t numQueries
+) {
+    const torch::Tensor queryIndices = queryKeyPairIndices[0];
+    TORCH_CHECK(
+        queryIndices.numel() < 2
+        || (queryIndices.slice(0, 1) >= queryIndices.slice(0, 0, -1)).all().item<bool>(),
+        "fused attention requires query-key pairs sorted by query."
+    );
+
+    return torch::bincount(
+        queryIndices, /*weights=*/{}, /*minlength=*/numQueries
+    ).cumsum(/*dim=*/-1);
+}
+
+
+std::tuple<torch::Tensor, torch::Tensor> fusedAttentionCRPE_forward(
+    torch::Tensor queries,
+    torch::Tensor keys,
+    torch::Tensor values,
+    torch::Tensor queryKeyPairIndices,
+    torch::Tensor queryRelativeXYZTables,
+    torch::Tensor keyRelativeXYZTables,
+    torch::Tensor valueRelativeXYZTables,
+    torch::Tensor relativeXYZTableIndices
+) {
+    TORCH_CHECK(!queries.is_cuda(), "fused attention is only implemented for CPU tensors.");
+
+    const int numQueries = queries.size(0);
+    const int numHeads = queries.size(1);
+
+    torch::Tensor aggregatedValues = torch::zeros({numQueries, numHeads, values.size(2)}, values.options());
+    torch::Tensor logSumExps = torch::full(
+        {numQueries, numHeads}, -std::numeric_limits<float>::infinity(), queries.options()
+    );
+
+    if (queryKeyPairIndices.size(1) > 0) {
+        fusedAttentionCRPE_forward_cpu(
+            queries,
+            keys,
+            values,
+            queryKeyPairIndices,
+            queryOffsets(queryKeyPairIndices, numQueries),
+            queryRelativeXYZTables,
+            keyRelativeXYZTables,
+            valueRelativeXYZTables,
+            relativeXYZTableIndices,
+            aggregatedValues,
+            logSumExps
+        );
+    }
+
+    return std::make_tuple(aggregatedValues, logSumExps);
+}
+
+
+std::tuple<
+    torch::Tensor, torch::Tensor, torch::Tensor,
+    torch::Tensor, torch::Tensor, torch::Tensor
+> fusedAttentionCRPE_backward(
+    torch::Tensor queries,
+    torch::Tensor keys,
+    torch::Tensor values,
+    torch::Tensor queryKeyPairIndices,
+    torch::Tensor queryRelativeXYZTables,
+    torch::Tensor keyRelativeXYZTables,
+    torch::Tensor valueRelativeXYZTables,
+    torch::Tensor relativeXYZTableIndices,
+    torch::Tensor aggregatedValues,
+    torch::Tensor logSumExps,
+    torch::Tensor aggregatedValuesGradient
+) {
+    TORCH_CHECK(!queries.is_cuda(), "fused attention is only implemented for CPU tensors.");
+
+    torch::Tensor queriesGradient = torch::zeros_like(queries);
+    torch::Tensor keysGradient = torch::zeros_like(keys);
+    torch::Tensor valuesGradient = torch::zeros_like(values);
+    torch::Tensor queryRelativeXYZTablesGradient = torch::zeros_like(queryRelativeXYZTables);
+    torch::Tensor keyRelativeXYZTablesGradient = torch::zeros_like(keyRelativeXYZTables);
+    torch::Tensor valueRelativeXYZTablesGradient = torch::zeros_like(valueRelativeXYZTables);
+
+    if (queryKeyPairIndices.size(1) > 0) {
+        // row sums of output gradient times output, which equal the expected gradient wrt the logits
+        torch::Tensor outputGradientDotProducts = (aggregatedValuesGradient * aggregatedValues).sum(/*dim=*/-1);
+
+        fusedAttentionCRPE_backward_cpu(
+            queries,
+            keys,
+            values,
+            queryKeyPairIndices,
+            queryOffsets(queryKeyPairIndices, queries.size(0)),
+            queryRelativeXYZTables,
+            keyRelativeXYZTables,
+            valueRelativeXYZTables,
+            relativeXYZTableIndices,
+            logSumExps,
+            outputGradientDotProducts,
+            aggregatedValuesGradient,
+            queriesGradient,
+            keysGradient,
+            valuesGradient,
+            queryRelativeXYZTablesGradient,
+            keyRelativeXYZTablesGradient,
+            valueRelativeXYZTablesGradient
+        );
+    }
+
+    return std::make_tuple(
+        queriesGradient,
+        keysGradient,
+        valuesGradient,
+        queryRelativeXYZTablesGradient,
+        keyRelativeXYZTablesGradient,
+        valueRelativeXYZTablesGradient
+    );
+}
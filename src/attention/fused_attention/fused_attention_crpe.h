@@ -0,0 +1,39 @@
+#ifndef FUSED_ATTENTION_CRPE_H
+#define FUSED_ATTENTION_CRPE_H
+
+#include <tuple>
+
+#include <torch/extension.h>
+
+
+std::tuple<torch::Tensor, torch::Tensor> fusedAttentionCRPE_forward(
+    torch::Tensor queries,
+    torch::Tensor keys,
+    torch::Tensor values,
+    torch::Tensor queryKeyPairIndices,
+    torch::Tensor queryRelativeXYZTables,
+    torch::Tensor keyRelativeXYZTables,
+    torch::Tensor valueRelativeXYZTables,
+    torch::Tensor relativeXYZTableIndices
+);
+
+
+std::tuple<
+    torch::Tensor, torch::Tensor, torch::Tensor,
+    torch::Tensor, torch::Tensor, torch::Tensor
+> fusedAttentionCRPE_backward(
+    torch::Tensor queries,
+    torch::Tensor keys,
+    torch::Tensor values,
+    torch::Tensor queryKeyPairIndices,
+    torch::Tensor queryRelativeXYZTables,
+    torch::Tensor keyRelativeXYZTables,
+    torch::Tensor valueRelativeXYZTables,
+    torch::Tensor relativeXYZTableIndices,
+    torch::Tensor aggregatedValues,
+    torch::Tensor logSumExps,
+    torch::Tensor aggregatedValuesGradient
+);
+
+
+#endif
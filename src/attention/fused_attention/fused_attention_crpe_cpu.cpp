@@ -0,0 +1,311 @@
+#include <cmath>
+#include <limits>
+#include <vector>
+
+#include <ATen/OpMathType.h>
+
+#include "../../cpu_utils.h"
+#include "fused_attention_crpe_cpu.h"
+
+
+void fusedAttentionCRPE_forward_cpu(
+    torch::Tensor queries,
+    torch::Tensor keys,
+    torch::Tensor values,
+    torch::Tensor queryKeyPairIndices,
+    torch::Tensor queryOffsets,
+    torch::Tensor queryRelativeXYZTables,
+    torch::Tensor keyRelativeXYZTables,
+    torch::Tensor valueRelativeXYZTables,
+    torch::Tensor relativeXYZTableIndices,
+    torch::Tensor aggregatedValues,
+    torch::Tensor logSumExps
+) {
+    AT_DISPATCH_FLOATING_TYPES_AND_HALF(queries.scalar_type(), "fusedAttentionCRPE_forward_cpu", ([&] {
+        using acc_t = at::opmath_type<scalar_t>;
+
+        const auto queriesAcc = queries.accessor<scalar_t, 3>();
+        const auto keysAcc = keys.accessor<scalar_t, 3>();
+        const auto valuesAcc = values.accessor<scalar_t, 3>();
+        const auto queryKeyPairIndicesAcc = queryKeyPairIndices.accessor<int64_t, 2>();
+        const auto queryOffsetsAcc = queryOffsets.accessor<int64_t, 1>();
+        const auto queryRelativeXYZTablesAcc = queryRelativeXYZTables.accessor<scalar_t, 4>();
+        const auto keyRelativeXYZTablesAcc = keyRelativeXYZTables.accessor<scalar_t, 4>();
+        const auto valueRelativeXYZTablesAcc = valueRelativeXYZTables.accessor<scalar_t, 4>();
+        const auto relativeXYZTableIndicesAcc = relativeXYZTableIndices.accessor<int, 2>();
+        auto aggregatedValuesAcc = aggregatedValues.accessor<scalar_t, 3>();
+        auto logSumExpsAcc = logSumExps.accessor<scalar_t, 2>();
+
+        const int numHeads = queries.size(1);
+        const int numHeadChannels = queries.size(2);
+
+        at::parallel_for(0, queries.size(0), SMALL_GRAIN_SIZE, [&](int64_t begin, int64_t end) {
+            std::vector<acc_t> aggregatedValue(numHeads * numHeadChannels);
+            std::vector<acc_t> maxLogits(numHeads);
+            std::vector<acc_t> sumExps(numHeads);
+
+            for (int64_t qi = begin; qi < end; qi++) {  // query index
+                const int64_t startIdx = qi == 0 ? 0 : queryOffsetsAcc[qi - 1];
+                const int64_t endIdx = queryOffsetsAcc[qi];
+
+                std::fill(aggregatedValue.begin(), aggregatedValue.end(), 0);
+                std::fill(maxLogits.begin(), maxLogits.end(), -std::numeric_limits<acc_t>::infinity());
+                std::fill(sumExps.begin(), sumExps.end(), 0);
+                for (int64_t qki = startIdx; qki < endIdx; qki++) {  // query-key pair index
+                    const int64_t ki = queryKeyPairIndicesAcc[1][qki];  // key index
+
+                    const int relXTableIdx = relativeXYZTableIndicesAcc[qki][0];
+                    const int relYTableIdx = relativeXYZTableIndicesAcc[qki][1];
+                    const int relZTableIdx = relativeXYZTableIndicesAcc[qki][2];
+
+                    int hi, hci;  // head index, head channel index
+                    acc_t rpe_hci;  // element of relative position encoding at index hci
+                    for (hi = 0; hi < numHeads; hi++) {
+                        acc_t logit = 0;
+                        for (hci = 0; hci < numHeadChannels; hci++) {
+                            rpe_hci = queryRelativeXYZTablesAcc[0][relXTableIdx][hi][hci];
+                            rpe_hci += queryRelativeXYZTablesAcc[1][relYTableIdx][hi][hci];
+                            rpe_hci += queryRelativeXYZTablesAcc[2][relZTableIdx][hi][hci];
+                            logit += queriesAcc[qi][hi][hci] * (keysAcc[ki][hi][hci] + rpe_hci);
+
+                            rpe_hci = keyRelativeXYZTablesAcc[0][relXTableIdx][hi][hci];
+                            rpe_hci += keyRelativeXYZTablesAcc[1][relYTableIdx][hi][hci];
+                            rpe_hci += keyRelativeXYZTablesAcc[2][relZTableIdx][hi][hci];
+                            logit += keysAcc[ki][hi][hci] * rpe_hci;
+                        }
+
+                        // online softmax: rescale the running sums when the maximum logit increases
+                        acc_t* aggregatedValueHead = &aggregatedValue[hi * numHeadChannels];
+                        if (logit > maxLogits[hi]) {
+                            const acc_t scale = std::exp(maxLogits[hi] - logit);
+                            sumExps[hi] *= scale;
+                            for (hci = 0; hci < numHeadChannels; hci++) {
+                                aggregatedValueHead[hci] *= scale;
+                            }
+                            maxLogits[hi] = logit;
+                        }
+
+                        const acc_t attention = std::exp(logit - maxLogits[hi]);
+                        sumExps[hi] += attention;
+                        for (hci = 0; hci < numHeadChannels; hci++) {
+                            rpe_hci = valueRelativeXYZTablesAcc[0][relXTableIdx][hi][hci];
+                            rpe_hci += valueRelativeXYZTablesAcc[1][relYTableIdx][hi][hci];
+                            rpe_hci += valueRelativeXYZTablesAcc[2][relZTableIdx][hi][hci];
+                            aggregatedValueHead[hci] += attention * (valuesAcc[ki][hi][hci] + rpe_hci);
+                        }
+                    }
+                }
+
+                // queries without keys keep zero output and a log-sum-exp of -inf
+                for (int hi = 0; hi < numHeads; hi++) {
+                    if (sumExps[hi] == 0) {
+                        continue;
+                    }
+
+                    for (int hci = 0; hci < numHeadChannels; hci++) {
+                        aggregatedValuesAcc[qi][hi][hci] = aggregatedValue[hi * numHeadChannels + hci] / sumExps[hi];
+                    }
+                    logSumExpsAcc[qi][hi] = maxLogits[hi] + std::log(sumExps[hi]);
+                }
+            }
+        });
+    }));
+}
+
+
+void fusedAttentionCRPE_backward_cpu(
+    torch::Tensor queries,
+    torch::Tensor keys,
+    torch::Tensor values,
+    torch::Tensor queryKeyPairIndices,
+    torch::Tensor queryOffsets,
+    torch::Tensor queryRelativeXYZTables,
+    torch::Tensor keyRelativeXYZTables,
+    torch::Tensor valueRelativeXYZTables,
+    torch::Tensor relativeXYZTableIndices,
+    torch::Tensor logSumExps,
+    torch::Tensor outputGradientDotProducts,
+    torch::Tensor aggregatedValuesGradient,
+    torch::Tensor queriesGradient,
+    torch::Tensor keysGradient,
+    torch::Tensor valuesGradient,
+    torch::Tensor queryRelativeXYZTablesGradient,
+    torch::Tensor keyRelativeXYZTablesGradient,
+    torch::Tensor valueRelativeXYZTablesGradient
+) {
+    // visit query-key pairs grouped by key to accumulate key and value gradients without atomics
+    torch::Tensor keyOrder, keyOffsets;
+    std::tie(keyOrder, keyOffsets) = groupByIndex(queryKeyPairIndices[1], keys.size(0));
+
+    // the look-up tables are small, so every thread accumulates into its own copy
+    const int numThreads = at::get_num_threads();
+    torch::Tensor threadQueryRelativeXYZTablesGradient = queryRelativeXYZTablesGradient.unsqueeze(0).repeat({numThreads, 1, 1, 1, 1});
+    torch::Tensor threadKeyRelativeXYZTablesGradient = keyRelativeXYZTablesGradient.unsqueeze(0).repeat({numThreads, 1, 1, 1, 1});
+    torch::Tensor threadValueRelativeXYZTablesGradient = valueRelativeXYZTablesGradient.unsqueeze(0).repeat({numThreads, 1, 1, 1, 1});
+
+    AT_DISPATCH_FLOATING_TYPES_AND_HALF(queries.scalar_type(), "fusedAttentionCRPE_backward_cpu", ([&] {
+        using acc_t = at::opmath_type<scalar_t>;
+
+        const auto queriesAcc = queries.accessor<scalar_t, 3>();
+        const auto keysAcc = keys.accessor<scalar_t, 3>();
+        const auto valuesAcc = values.accessor<scalar_t, 3>();
+        const auto queryKeyPairIndicesAcc = queryKeyPairIndices.accessor<int64_t, 2>();
+        const auto queryOffsetsAcc = queryOffsets.accessor<int64_t, 1>();
+        const auto queryRelativeXYZTablesAcc = queryRelativeXYZTables.accessor<scalar_t, 4>();
+        const auto keyRelativeXYZTablesAcc = keyRelativeXYZTables.accessor<scalar_t, 4>();
+        const auto valueRelativeXYZTablesAcc = valueRelativeXYZTables.accessor<scalar_t, 4>();
+        const auto relativeXYZTableIndicesAcc = relativeXYZTableIndices.accessor<int, 2>();
+        const auto logSumExpsAcc = logSumExps.accessor<scalar_t, 2>();
+        const auto outputGradientDotProductsAcc = outputGradientDotProducts.accessor<scalar_t, 2>();
+        const auto aggregatedValuesGradientAcc = aggregatedValuesGradient.accessor<scalar_t, 3>();
+        const auto keyOrderAcc = keyOrder.accessor<int64_t, 1>();
+        const auto keyOffsetsAcc = keyOffsets.accessor<int64_t, 1>();
+        auto queriesGradientAcc = queriesGradient.accessor<scalar_t, 3>();
+        auto keysGradientAcc = keysGradient.accessor<scalar_t, 3>();
+        auto valuesGradientAcc = valuesGradient.accessor<scalar_t, 3>();
+        auto threadQueryRelativeXYZTablesGradientAcc = threadQueryRelativeXYZTablesGradient.accessor<scalar_t, 5>();
+        auto threadKeyRelativeXYZTablesGradientAcc = threadKeyRelativeXYZTablesGradient.accessor<scalar_t, 5>();
+        auto threadValueRelativeXYZTablesGradientAcc = threadValueRelativeXYZTablesGradient.accessor<scalar_t, 5>();
+
+        const int numHeads = queries.size(1);
+        const int numHeadChannels = queries.size(2);
+
+        // recompute attention and gradient wrt logit of query-key pair instead of storing them
+        auto attentionAndLogitGradient = [&](
+            const int64_t qi,
+            const int64_t ki,
+            const int64_t qki,
+            const int hi
+        ) {
+            const int relXTableIdx = relativeXYZTableIndicesAcc[qki][0];
+            const int relYTableIdx = relativeXYZTableIndicesAcc[qki][1];
+            const int relZTableIdx = relativeXYZTableIndicesAcc[qki][2];
+
+            acc_t logit = 0, attentionGradient = 0, rpe_hci;
+            for (int hci = 0; hci < numHeadChannels; hci++) {
+                rpe_hci = queryRelativeXYZTablesAcc[0][relXTableIdx][hi][hci];
+                rpe_hci += queryRelativeXYZTablesAcc[1][relYTableIdx][hi][hci];
+                rpe_hci += queryRelativeXYZTablesAcc[2][relZTableIdx][hi][hci];
+                logit += queriesAcc[qi][hi][hci] * (keysAcc[ki][hi][hci] + rpe_hci);
+
+                rpe_hci = keyRelativeXYZTablesAcc[0][relXTableIdx][hi][hci];
+                rpe_hci += keyRelativeXYZTablesAcc[1][relYTableIdx][hi][hci];
+                rpe_hci += keyRelativeXYZTablesAcc[2][relZTableIdx][hi][hci];
+                logit += keysAcc[ki][hi][hci] * rpe_hci;
+
+                rpe_hci = valueRelativeXYZTablesAcc[0][relXTableIdx][hi][hci];
+                rpe_hci += valueRelativeXYZTablesAcc[1][relYTableIdx][hi][hci];
+                rpe_hci += valueRelativeXYZTablesAcc[2][relZTableIdx][hi][hci];
+                attentionGradient += aggregatedValuesGradientAcc[qi][hi][hci] * (valuesAcc[ki][hi][hci] + rpe_hci);
+            }
+
+            const acc_t attention = std::exp(logit - static_cast<acc_t>(logSumExpsAcc[qi][hi]));
+            const acc_t logitGradient = attention * (attentionGradient - outputGradientDotProductsAcc[qi][hi]);
+
+            return std::make_pair(attention, logitGradient);
+        };
+
+        // gradients wrt queries and relative position encodings
+        at::parallel_for(0, queries.size(0), SMALL_GRAIN_SIZE, [&](int64_t begin, int64_t end) {
+            const int ti = at::get_thread_num();
+            std::vector<acc_t> queryGradient(numHeads * numHeadChannels);
+
+            for (int64_t qi = begin; qi < end; qi++) {  // query index
+                const int64_t startIdx = qi == 0 ? 0 : queryOffsetsAcc[qi - 1];
+                const int64_t endIdx = queryOffsetsAcc[qi];
+
+                std::fill(queryGradient.begin(), queryGradient.end(), 0);
+                for (int64_t qki = startIdx; qki < endIdx; qki++) {  // query-key pair index
+                    const int64_t ki = queryKeyPairIndicesAcc[1][qki];  // key index
+
+                    const int relXTableIdx = relativeXYZTableIndicesAcc[qki][0];
+                    const int relYTableIdx = relativeXYZTableIndicesAcc[qki][1];
+                    const int relZTableIdx = relativeXYZTableIndicesAcc[qki][2];
+
+                    int hi, hci;  // head index, head channel index
+                    acc_t dydx;  // partial derivative of output wrt input
+                    acc_t dLdx;  // partial derivative of loss wrt input
+                    for (hi = 0; hi < numHeads; hi++) {
+                        const auto [attention, dLdy] = attentionAndLogitGradient(qi, ki, qki, hi);
+                        for (hci = 0; hci < numHeadChannels; hci++) {
+                            dydx = keysAcc[ki][hi][hci];
+                            dydx += queryRelativeXYZTablesAcc[0][relXTableIdx][hi][hci];
+                            dydx += queryRelativeXYZTablesAcc[1][relYTableIdx][hi][hci];
+                            dydx += queryRelativeXYZTablesAcc[2][relZTableIdx][hi][hci];
+                            queryGradient[hi * numHeadChannels + hci] += dLdy * dydx;
+
+                            dLdx = dLdy * queriesAcc[qi][hi][hci];
+                            threadQueryRelativeXYZTablesGradientAcc[ti][0][relXTableIdx][hi][hci] += dLdx;
+                            threadQueryRelativeXYZTablesGradientAcc[ti][1][relYTableIdx][hi][hci] += dLdx;
+                            threadQueryRelativeXYZTablesGradientAcc[ti][2][relZTableIdx][hi][hci] += dLdx;
+
+                            dLdx = dLdy * keysAcc[ki][hi][hci];
+                            threadKeyRelativeXYZTablesGradientAcc[ti][0][relXTableIdx][hi][hci] += dLdx;
+                            threadKeyRelativeXYZTablesGradientAcc[ti][1][relYTableIdx][hi][hci] += dLdx;
+                            threadKeyRelativeXYZTablesGradientAcc[ti][2][relZTableIdx][hi][hci] += dLdx;
+
+                            dLdx = attention * aggregatedValuesGradientAcc[qi][hi][hci];
+                            threadValueRelativeXYZTablesGradientAcc[ti][0][relXTableIdx][hi][hci] += dLdx;
+                            threadValueRelativeXYZTablesGradientAcc[ti][1][relYTableIdx][hi][hci] += dLdx;
+                            threadValueRelativeXYZTablesGradientAcc[ti][2][relZTableIdx][hi][hci] += dLdx;
+                        }
+                    }
+                }
+
+                for (int hi = 0; hi < numHeads; hi++) {
+                    for (int hci = 0; hci < numHeadChannels; hci++) {
+                        queriesGradientAcc[qi][hi][hci] = queryGradient[hi * numHeadChannels + hci];
+                    }
+                }
+            }
+        });
+
+        // gradients wrt keys and values
+        at::parallel_for(0, keys.size(0), SMALL_GRAIN_SIZE, [&](int64_t begin, int64_t end) {
+            std::vector<acc_t> keyGradient(numHeads * numHeadChannels);
+            std::vector<acc_t> valueGradient(numHeads * numHeadChannels);
+
+            for (int64_t ki = begin; ki < end; ki++) {  // key index
+                const int64_t startIdx = ki == 0 ? 0 : keyOffsetsAcc[ki - 1];
+                const int64_t endIdx = keyOffsetsAcc[ki];
+
+                std::fill(keyGradient.begin(), keyGradient.end(), 0);
+                std::fill(valueGradient.begin(), valueGradient.end(), 0);
+                for (int64_t i = startIdx; i < endIdx; i++) {
+                    const int64_t qki = keyOrderAcc[i];  // query-key pair index
+                    const int64_t qi = queryKeyPairIndicesAcc[0][qki];  // query index
+
+                    const int relXTableIdx = relativeXYZTableIndicesAcc[qki][0];
+                    const int relYTableIdx = relativeXYZTableIndicesAcc[qki][1];
+                    const int relZTableIdx = relativeXYZTableIndicesAcc[qki][2];
+
+                    int hi, hci;  // head index, head channel index
+                    acc_t dydx;  // partial derivative of output wrt input
+                    for (hi = 0; hi < numHeads; hi++) {
+                        const auto [attention, dLdy] = attentionAndLogitGradient(qi, ki, qki, hi);
+                        for (hci = 0; hci < numHeadChannels; hci++) {
+                            dydx = queriesAcc[qi][hi][hci];
+                            dydx += keyRelativeXYZTablesAcc[0][relXTableIdx][hi][hci];
+                            dydx += keyRelativeXYZTablesAcc[1][relYTableIdx][hi][hci];
+                            dydx += keyRelativeXYZTablesAcc[2][relZTableIdx][hi][hci];
+                            keyGradient[hi * numHeadChannels + hci] += dLdy * dydx;
+
+                            valueGradient[hi * numHeadChannels + hci] += attention * aggregatedValuesGradientAcc[qi][hi][hci];
+                        }
+                    }
+                }
+
+                for (int hi = 0; hi < numHeads; hi++) {
+                    for (int hci = 0; hci < numHeadChannels; hci++) {
+                        keysGradientAcc[ki][hi][hci] = keyGradient[hi * numHeadChannels + hci];
+                        valuesGradientAcc[ki][hi][hci] = valueGradient[hi * numHeadChannels + hci];
+                    }
+                }
+            }
+        });
+    }));
+
+    queryRelativeXYZTablesGradient.copy_(threadQueryRelativeXYZTablesGradient.sum(/*dim=*/0));
+    keyRelativeXYZTablesGradient.copy_(threadKeyRelativeXYZTablesGradient.sum(/*dim=*/0));
+    valueRelativeXYZTablesGradient.copy_(threadValueRelativeXYZTablesGradient.sum(/*dim=*/0));
+}
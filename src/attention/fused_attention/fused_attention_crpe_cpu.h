@@ -0,0 +1,44 @@
+#ifndef FUSED_ATTENTION_CRPE_CPU_H
+#define FUSED_ATTENTION_CRPE_CPU_H
+
+#include <torch/extension.h>
+
+
+void fusedAttentionCRPE_forward_cpu(
+    torch::Tensor queries,
+    torch::Tensor keys,
+    torch::Tensor values,
+    torch::Tensor queryKeyPairIndices,
+    torch::Tensor queryOffsets,
+    torch::Tensor queryRelativeXYZTables,
+    torch::Tensor keyRelativeXYZTables,
+    torch::Tensor valueRelativeXYZTables,
+    torch::Tensor relativeXYZTableIndices,
+    torch::Tensor aggregatedValues,
+    torch::Tensor logSumExps
+);
+
+
+void fusedAttentionCRPE_backward_cpu(
+    torch::Tensor queries,
+    torch::Tensor keys,
+    torch::Tensor values,
+    torch::Tensor queryKeyPairIndices,
+    torch::Tensor queryOffsets,
+    torch::Tensor queryRelativeXYZTables,
+    torch::Tensor keyRelativeXYZTables,
+    torch::Tensor valueRelativeXYZTables,
+    torch::Tensor relativeXYZTableIndices,
+    torch::Tensor logSumExps,
+    torch::Tensor outputGradientDotProducts,
+    torch::Tensor aggregatedValuesGradient,
+    torch::Tensor queriesGradient,
+    torch::Tensor keysGradient,
+    torch::Tensor valuesGradient,
+    torch::Tensor queryRelativeXYZTablesGradient,
+    torch::Tensor keyRelativeXYZTablesGradient,
+    torch::Tensor valueRelativeXYZTablesGradient
+);
+
+
+#endif
@@ -1,6 +1,10 @@
-#include "../../cuda_utils.h"
+#include <algorithm>
+
 #include "stratified_qk_pairs.h"
+#include "stratified_qk_pairs_cpu.h"
+#ifdef WITH_CUDA
 #include "stratified_qk_pairs_cuda.h"
+#endif
 
 
 std::tuple<torch::Tensor, torch::Tensor> stratifiedQueryKeyPairs(
@@ -53,26 +57,40 @@ std::tuple<torch::Tensor, torch::Tensor> stratifiedQueryKeyPairs(
     torch::Tensor queryKeyPairIndices = torch::empty({2, totalPairCount}, torch::device(smallWindowIndices.device()).dtype(torch::kInt64));
 
 
-    const int maxWindowPointCount = max(maxSmallWindowPointCount, maxLargeWindowDownsamplePointCount);
-    const int threads = optThreads(maxWindowPointCount);
-    stratifiedQueryKeyPairIndices_cuda<<<numPoints, threads>>>(
-        smallWindowIndices.packed_accessor32<int64_t, 1, torch::RestrictPtrTraits>(),
-        smallWindowArgIndices.packed_accessor32<int64_t, 1, torch::RestrictPtrTraits>(),
-        largeWindowIndices.packed_accessor32<int64_t, 1, torch::RestrictPtrTraits>(),
-        largeWindowDownsampleArgIndices.packed_accessor32<int64_t, 1, torch::RestrictPtrTraits>(),
-        smallWindowPointOffsets.packed_accessor32<int64_t, 1, torch::RestrictPtrTraits>(),
-        largeWindowDownsamplePointOffsets.packed_accessor32<int64_t, 1, torch::RestrictPtrTraits>(),
-        smallWindowPairOffsets.packed_accessor32<int64_t, 1, torch::RestrictPtrTraits>(),
-        largeWindowPairOffsets.packed_accessor32<int64_t, 1, torch::RestrictPtrTraits>(),
-        downsampleIndices.packed_accessor32<int64_t, 1, torch::RestrictPtrTraits>(),
-        windowPairCount.packed_accessor32<int, 1, torch::RestrictPtrTraits>(),
-        queryKeyPairIndices.packed_accessor32<int64_t, 2, torch::RestrictPtrTraits>()
-    );
-
-#if DEBUG
-    gpuErrchk(cudaPeekAtLastError());
-    gpuErrchk(cudaDeviceSynchronize());
+    if (smallWindowIndices.is_cuda()) {
+#ifdef WITH_CUDA
+        const int maxWindowPointCount = std::max(maxSmallWindowPointCount, maxLargeWindowDownsamplePointCount);
+        stratifiedQueryKeyPairIndices_launcher(
+            maxWindowPointCount,
+            smallWindowIndices,
+            smallWindowArgIndices,
+            largeWindowIndices,
+            largeWindowDownsampleArgIndices,
+            smallWindowPointOffsets,
+            largeWindowDownsamplePointOffsets,
+            smallWindowPairOffsets,
+            largeWindowPairOffsets,
+            downsampleIndices,
+            windowPairCount,
+            queryKeyPairIndices
+        );
+#else
+        TORCH_CHECK(false, "pointops was compiled without CUDA support.");
 #endif
+    } else {
+        stratifiedQueryKeyPairIndices_cpu(
+            smallWindowIndices,
+            smallWindowArgIndices,
+            largeWindowIndices,
+            largeWindowDownsampleArgIndices,
+            smallWindowPointOffsets,
+            largeWindowDownsamplePointOffsets,
+            smallWindowPairOffsets,
+            largeWindowPairOffsets,
+            downsampleIndices,
+            queryKeyPairIndices
+        );
+    }
 
     torch::Tensor pairCounts;
     if (mergeDenseAndSparse) {
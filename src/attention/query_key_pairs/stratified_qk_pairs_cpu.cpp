@@ -0,0 +1,77 @@
+#include "../../cpu_utils.h"
+#include "stratified_qk_pairs_cpu.h"
+
+
+void stratifiedQueryKeyPairIndices_cpu(
+    torch::Tensor smallWindowIndices,
+    torch::Tensor smallWindowArgIndices,
+    torch::Tensor largeWindowIndices,
+    torch::Tensor largeWindowDownsampleArgIndices,
+    torch::Tensor smallWindowPointOffsets,
+    torch::Tensor largeWindowDownsamplePointOffsets,
+    torch::Tensor smallWindowPairOffsets,
+    torch::Tensor largeWindowPairOffsets,
+    torch::Tensor downsamplePointIdxToPointIdx,
+    torch::Tensor queryKeyPairIndices
+) {
+    const int smallWindowCount = smallWindowPointOffsets.size(0);
+    const int largeWindowCount = largeWindowPairOffsets.size(0);
+    const int64_t totalSmallWindowPairCount = smallWindowPairOffsets[smallWindowCount - 1].item<int64_t>();
+
+    // queries of a large window are all its points, not only the downsampled ones
+    torch::Tensor largeWindowArgIndices, largeWindowPointOffsets;
+    std::tie(largeWindowArgIndices, largeWindowPointOffsets) = groupByIndex(largeWindowIndices, largeWindowCount);
+
+    const auto smallWindowArgIndicesAcc = smallWindowArgIndices.accessor<int64_t, 1>();
+    const auto largeWindowArgIndicesAcc = largeWindowArgIndices.accessor<int64_t, 1>();
+    const auto largeWindowDownsampleArgIndicesAcc = largeWindowDownsampleArgIndices.accessor<int64_t, 1>();
+    const auto smallWindowPointOffsetsAcc = smallWindowPointOffsets.accessor<int64_t, 1>();
+    const auto largeWindowPointOffsetsAcc = largeWindowPointOffsets.accessor<int64_t, 1>();
+    const auto largeWindowDownsamplePointOffsetsAcc = largeWindowDownsamplePointOffsets.accessor<int64_t, 1>();
+    const auto smallWindowPairOffsetsAcc = smallWindowPairOffsets.accessor<int64_t, 1>();
+    const auto largeWindowPairOffsetsAcc = largeWindowPairOffsets.accessor<int64_t, 1>();
+    const auto downsamplePointIdxToPointIdxAcc = downsamplePointIdxToPointIdx.accessor<int64_t, 1>();
+    auto queryKeyPairIndicesAcc = queryKeyPairIndices.accessor<int64_t, 2>();
+
+    // each window writes its query-key pairs to its own contiguous block
+    at::parallel_for(0, smallWindowCount + largeWindowCount, SMALL_GRAIN_SIZE, [&](int64_t begin, int64_t end) {
+        int64_t wqi, wki;  // index of query and key point within window
+        int64_t qi, ki;  // index of query and key point in original point cloud
+        int64_t qki;  // index of query-key pair
+        for (int64_t wi = begin; wi < end; wi++) {
+            if (wi < smallWindowCount) {
+                const int64_t startPointIdx = wi == 0 ? 0 : smallWindowPointOffsetsAcc[wi - 1];
+                const int64_t endPointIdx = smallWindowPointOffsetsAcc[wi];
+                qki = wi == 0 ? 0 : smallWindowPairOffsetsAcc[wi - 1];
+
+                for (wqi = startPointIdx; wqi < endPointIdx; wqi++) {
+                    qi = smallWindowArgIndicesAcc[wqi];
+                    for (wki = startPointIdx; wki < endPointIdx; wki++, qki++) {
+                        ki = smallWindowArgIndicesAcc[wki];
+
+                        queryKeyPairIndicesAcc[0][qki] = qi;
+                        queryKeyPairIndicesAcc[1][qki] = ki;
+                    }
+                }
+            } else {
+                const int64_t lwi = wi - smallWindowCount;
+                const int64_t startPointIdx = lwi == 0 ? 0 : largeWindowPointOffsetsAcc[lwi - 1];
+                const int64_t endPointIdx = largeWindowPointOffsetsAcc[lwi];
+                const int64_t startKeyIdx = lwi == 0 ? 0 : largeWindowDownsamplePointOffsetsAcc[lwi - 1];
+                const int64_t endKeyIdx = largeWindowDownsamplePointOffsetsAcc[lwi];
+                qki = totalSmallWindowPairCount + (lwi == 0 ? 0 : largeWindowPairOffsetsAcc[lwi - 1]);
+
+                for (wqi = startPointIdx; wqi < endPointIdx; wqi++) {
+                    qi = largeWindowArgIndicesAcc[wqi];
+                    for (wki = startKeyIdx; wki < endKeyIdx; wki++, qki++) {
+                        ki = largeWindowDownsampleArgIndicesAcc[wki];
+                        ki = downsamplePointIdxToPointIdxAcc[ki];
+
+                        queryKeyPairIndicesAcc[0][qki] = qi;
+                        queryKeyPairIndicesAcc[1][qki] = ki;
+                    }
+                }
+            }
+        }
+    });
+}
@@ -0,0 +1,21 @@
+#ifndef STRATIFIED_QK_PAIRS_CPU_H
+#define STRATIFIED_QK_PAIRS_CPU_H
+
+#include <torch/extension.h>
+
+
+void stratifiedQueryKeyPairIndices_cpu(
+    torch::Tensor smallWindowIndices,
+    torch::Tensor smallWindowArgIndices,
+    torch::Tensor largeWindowIndices,
+    torch::Tensor largeWindowDownsampleArgIndices,
+    torch::Tensor smallWindowPointOffsets,
+    torch::Tensor largeWindowDownsamplePointOffsets,
+    torch::Tensor smallWindowPairOffsets,
+    torch::Tensor largeWindowPairOffsets,
+    torch::Tensor downsamplePointIdxToPointIdx,
+    torch::Tensor queryKeyPairIndices
+);
+
+
+#endif
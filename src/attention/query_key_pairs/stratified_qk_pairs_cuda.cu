@@ -1,6 +1,43 @@
+#include "../../cuda_utils.h"
 #include "stratified_qk_pairs_cuda.h"
 
 
+void stratifiedQueryKeyPairIndices_launcher(
+    const int maxWindowPointCount,
+    torch::Tensor smallWindowIndices,
+    torch::Tensor smallWindowArgIndices,
+    torch::Tensor largeWindowIndices,
+    torch::Tensor largeWindowDownsampleArgIndices,
+    torch::Tensor smallWindowPointOffsets,
+    torch::Tensor largeWindowDownsamplePointOffsets,
+    torch::Tensor smallWindowPairOffsets,
+    torch::Tensor largeWindowPairOffsets,
+    torch::Tensor downsamplePointIdxToPointIdx,
+    torch::Tensor windowPairCount,
+    torch::Tensor queryKeyPairIndices
+) {
+    const int threads = optThreads(maxWindowPointCount);
+    stratifiedQueryKeyPairIndices_cuda<<<smallWindowIndices.size(0), threads>>>(
+        smallWindowIndices.packed_accessor32<int64_t, 1, torch::RestrictPtrTraits>(),
+        smallWindowArgIndices.packed_accessor32<int64_t, 1, torch::RestrictPtrTraits>(),
+        largeWindowIndices.packed_accessor32<int64_t, 1, torch::RestrictPtrTraits>(),
+        largeWindowDownsampleArgIndices.packed_accessor32<int64_t, 1, torch::RestrictPtrTraits>(),
+        smallWindowPointOffsets.packed_accessor32<int64_t, 1, torch::RestrictPtrTraits>(),
+        largeWindowDownsamplePointOffsets.packed_accessor32<int64_t, 1, torch::RestrictPtrTraits>(),
+        smallWindowPairOffsets.packed_accessor32<int64_t, 1, torch::RestrictPtrTraits>(),
+        largeWindowPairOffsets.packed_accessor32<int64_t, 1, torch::RestrictPtrTraits>(),
+        downsamplePointIdxToPointIdx.packed_accessor32<int64_t, 1, torch::RestrictPtrTraits>(),
+        windowPairCount.packed_accessor32<int, 1, torch::RestrictPtrTraits>(),
+        queryKeyPairIndices.packed_accessor32<int64_t, 2, torch::RestrictPtrTraits>()
+    );
+
+#if DEBUG
+    gpuErrchk(cudaPeekAtLastError());
+    gpuErrchk(cudaDeviceSynchronize());
+#endif
+}
+
+
 __global__ void stratifiedQueryKeyPairIndices_cuda(
     const torch::PackedTensorAccessor32<int64_t, 1, torch::RestrictPtrTraits> smallWindowIndices,
     const torch::PackedTensorAccessor32<int64_t, 1, torch::RestrictPtrTraits> smallWindowArgIndices,
@@ -4,6 +4,23 @@
 #include <torch/extension.h>
 
 
+void stratifiedQueryKeyPairIndices_launcher(
+    const int maxWindowPointCount,
+    torch::Tensor smallWindowIndices,
+    torch::Tensor smallWindowArgIndices,
+    torch::Tensor largeWindowIndices,
+    torch::Tensor largeWindowDownsampleArgIndices,
+    torch::Tensor smallWindowPointOffsets,
+    torch::Tensor largeWindowDownsamplePointOffsets,
+    torch::Tensor smallWindowPairOffsets,
+    torch::Tensor largeWindowPairOffsets,
+    torch::Tensor downsamplePointIdxToPointIdx,
+    torch::Tensor windowPairCount,
+    torch::Tensor queryKeyPairIndices
+);
+
+
+#ifdef __CUDACC__
 __global__ void stratifiedQueryKeyPairIndices_cuda(
     const torch::PackedTensorAccessor32<int64_t, 1, torch::RestrictPtrTraits> smallWindowIndices,
     const torch::PackedTensorAccessor32<int64_t, 1, torch::RestrictPtrTraits> smallWindowArgIndices,
@@ -17,6 +34,7 @@ __global__ void stratifiedQueryKeyPairIndices_cuda(
     torch::PackedTensorAccessor32<int, 1, torch::RestrictPtrTraits> windowPairCount,
     torch::PackedTensorAccessor32<int64_t, 2, torch::RestrictPtrTraits> queryKeyPairIndices
 );
+#endif
 
 
 #endif
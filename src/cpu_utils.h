@@ -0,0 +1,26 @@
+#ifndef CPU_UTILS_H
+#define CPU_UTILS_H
+
+#include <tuple>
+
+#include <ATen/Parallel.h>
+#include <torch/extension.h>
+
+
+#define GRAIN_SIZE 1024
+#define SMALL_GRAIN_SIZE 16
+
+
+// order of elements and offsets to iterate over elements grouped by index
+inline std::tuple<torch::Tensor, torch::Tensor> groupByIndex(
+    torch::Tensor indices,
+    const int64_t numGroups
+) {
+    torch::Tensor order = indices.argsort(/*stable=*/true);
+    torch::Tensor offsets = torch::bincount(indices, /*weights=*/{}, /*minlength=*/numGroups).cumsum(/*dim=*/-1);
+
+    return std::make_tuple(order, offsets);
+}
+
+
+#endif
@@ -1,6 +1,8 @@
-#include "../cuda_utils.h"
 #include "fps.h"
+#include "fps_cpu.h"
+#ifdef WITH_CUDA
 #include "fps_cuda.h"
+#endif
 
 
 std::tuple<torch::Tensor, torch::Tensor> farthestPointSampling(
@@ -18,20 +20,30 @@ std::tuple<torch::Tensor, torch::Tensor> farthestPointSampling(
     torch::Tensor distancesToSample = torch::full(coordinates.size(0), 1e10, coordinates.device());
     torch::Tensor sampleIndices = torch::empty(sampleBatchOffsets[-1].item<int>(), torch::device(coordinates.device()).dtype(torch::kInt64));
 
-    const int threads = optThreads(coordinates.size(0));
-    farthestPointSampling_cuda<<<batchCounts.size(0), threads, threads * (sizeof(int) + sizeof(float))>>>(
-        coordinates.packed_accessor32<float, 2, torch::RestrictPtrTraits>(),
-        batchOffsets.packed_accessor32<int, 1, torch::RestrictPtrTraits>(),
-        sampleBatchOffsets.packed_accessor32<int, 1, torch::RestrictPtrTraits>(),
-        seeds.packed_accessor32<int, 1, torch::RestrictPtrTraits>(),
-        distancesToSample.packed_accessor32<float, 1, torch::RestrictPtrTraits>(),
-        sampleIndices.packed_accessor32<int64_t, 1, torch::RestrictPtrTraits>()
-    );
-
-#if DEBUG
-    gpuErrchk(cudaPeekAtLastError());
-    gpuErrchk(cudaDeviceSynchronize());
+    if (coordinates.is_cuda()) {
+#ifdef WITH_CUDA
+        farthestPointSampling_launcher(
+            coordinates,
+            batchCounts,
+            batchOffsets,
+            sampleBatchOffsets,
+            seeds,
+            distancesToSample,
+            sampleIndices
+        );
+#else
+        TORCH_CHECK(false, "pointops was compiled without CUDA support.");
 #endif
+    } else {
+        farthestPointSampling_cpu(
+            coordinates,
+            batchOffsets,
+            sampleBatchOffsets,
+            seeds,
+            distancesToSample,
+            sampleIndices
+        );
+    }
 
     return std::make_tuple(sampleIndices, sampleBatchCounts);
 }
@@ -0,0 +1,86 @@
+#include <vector>
+
+#include "../cpu_utils.h"
+#include "fps_cpu.h"
+
+
+void farthestPointSampling_cpu(
+    torch::Tensor coordinates,
+    torch::Tensor batchOffsets,
+    torch::Tensor sampleBatchOffsets,
+    torch::Tensor seeds,
+    torch::Tensor distancesToSample,
+    torch::Tensor sampleIndices
+) {
+    const auto coordinatesAcc = coordinates.accessor<float, 2>();
+    const auto batchOffsetsAcc = batchOffsets.accessor<int, 1>();
+    const auto sampleBatchOffsetsAcc = sampleBatchOffsets.accessor<int, 1>();
+    const auto seedsAcc = seeds.accessor<int, 1>();
+    auto distancesToSampleAcc = distancesToSample.accessor<float, 1>();
+    auto sampleIndicesAcc = sampleIndices.accessor<int64_t, 1>();
+
+    const int numThreads = at::get_num_threads();
+
+    // parallelize over batch elements, the loop over vertices within a batch
+    // element is only run in parallel if there are fewer batch elements than threads
+    const int64_t batchGrainSize = batchOffsets.size(0) >= numThreads ? 1 : batchOffsets.size(0);
+    at::parallel_for(0, batchOffsets.size(0), batchGrainSize, [&](int64_t batchBegin, int64_t batchEnd) {
+        std::vector<int> threadVertexIndices(numThreads);
+        std::vector<float> threadVertexDistances(numThreads);
+
+        for (int64_t batchIdx = batchBegin; batchIdx < batchEnd; batchIdx++) {
+            const int startIdx = batchIdx == 0 ? 0 : batchOffsetsAcc[batchIdx - 1];
+            const int endIdx = batchOffsetsAcc[batchIdx];
+            const int sampleStartIdx = batchIdx == 0 ? 0 : sampleBatchOffsetsAcc[batchIdx - 1];
+            const int sampleEndIdx = sampleBatchOffsetsAcc[batchIdx];
+
+            if (sampleStartIdx == sampleEndIdx) continue;
+            sampleIndicesAcc[sampleStartIdx] = seedsAcc[batchIdx];
+
+            for (int j = sampleStartIdx + 1; j < sampleEndIdx; j++) {
+                const float x1 = coordinatesAcc[sampleIndicesAcc[j - 1]][0];
+                const float y1 = coordinatesAcc[sampleIndicesAcc[j - 1]][1];
+                const float z1 = coordinatesAcc[sampleIndicesAcc[j - 1]][2];
+
+                std::fill(threadVertexIndices.begin(), threadVertexIndices.end(), startIdx);
+                std::fill(threadVertexDistances.begin(), threadVertexDistances.end(), -1);
+                at::parallel_for(startIdx, endIdx, GRAIN_SIZE, [&](int64_t begin, int64_t end) {
+                    const int ti = at::get_thread_num();
+
+                    float x2, y2, z2, v1v2d;
+                    for (int64_t v2i = begin; v2i < end; v2i++) {
+                        x2 = coordinatesAcc[v2i][0];
+                        y2 = coordinatesAcc[v2i][1];
+                        z2 = coordinatesAcc[v2i][2];
+
+                        v1v2d = (x2 - x1) * (x2 - x1) + (y2 - y1) * (y2 - y1) + (z2 - z1) * (z2 - z1);
+
+                        distancesToSampleAcc[v2i] = std::min(v1v2d, distancesToSampleAcc[v2i]);
+                        if (distancesToSampleAcc[v2i] > threadVertexDistances[ti]) {
+                            threadVertexIndices[ti] = v2i;
+                            threadVertexDistances[ti] = distancesToSampleAcc[v2i];
+                        }
+                    }
+                });
+
+                // reduce to farthest vertex, ties are broken by lowest index
+                int farthestIdx = threadVertexIndices[0];
+                float farthestDistance = threadVertexDistances[0];
+                for (int ti = 1; ti < numThreads; ti++) {
+                    if (
+                        threadVertexDistances[ti] > farthestDistance
+                        || (
+                            threadVertexDistances[ti] == farthestDistance
+                            && threadVertexIndices[ti] < farthestIdx
+                        )
+                    ) {
+                        farthestIdx = threadVertexIndices[ti];
+                        farthestDistance = threadVertexDistances[ti];
+                    }
+                }
+
+                sampleIndicesAcc[j] = farthestIdx;
+            }
+        }
+    });
+}
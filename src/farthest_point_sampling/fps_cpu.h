@@ -0,0 +1,17 @@
+#ifndef FPS_CPU_H
+#define FPS_CPU_H
+
+#include <torch/extension.h>
+
+
+void farthestPointSampling_cpu(
+    torch::Tensor coordinates,
+    torch::Tensor batchOffsets,
+    torch::Tensor sampleBatchOffsets,
+    torch::Tensor seeds,
+    torch::Tensor distancesToSample,
+    torch::Tensor sampleIndices
+);
+
+
+#endif
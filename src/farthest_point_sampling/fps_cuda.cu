@@ -1,6 +1,33 @@
+#include "../cuda_utils.h"
 #include "fps_cuda.h"
 
 
+void farthestPointSampling_launcher(
+    torch::Tensor coordinates,
+    torch::Tensor batchCounts,
+    torch::Tensor batchOffsets,
+    torch::Tensor sampleBatchOffsets,
+    torch::Tensor seeds,
+    torch::Tensor distancesToSample,
+    torch::Tensor sampleIndices
+) {
+    const int threads = optThreads(coordinates.size(0));
+    farthestPointSampling_cuda<<<batchCounts.size(0), threads, threads * (sizeof(int) + sizeof(float))>>>(
+        coordinates.packed_accessor32<float, 2, torch::RestrictPtrTraits>(),
+        batchOffsets.packed_accessor32<int, 1, torch::RestrictPtrTraits>(),
+        sampleBatchOffsets.packed_accessor32<int, 1, torch::RestrictPtrTraits>(),
+        seeds.packed_accessor32<int, 1, torch::RestrictPtrTraits>(),
+        distancesToSample.packed_accessor32<float, 1, torch::RestrictPtrTraits>(),
+        sampleIndices.packed_accessor32<int64_t, 1, torch::RestrictPtrTraits>()
+    );
+
+#if DEBUG
+    gpuErrchk(cudaPeekAtLastError());
+    gpuErrchk(cudaDeviceSynchronize());
+#endif
+}
+
+
 __global__ void farthestPointSampling_cuda(
     const torch::PackedTensorAccessor32<float, 2, torch::RestrictPtrTraits> coordinates,
     const torch::PackedTensorAccessor32<int, 1, torch::RestrictPtrTraits> batchOffsets,
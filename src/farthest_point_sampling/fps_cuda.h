@@ -4,6 +4,18 @@
 #include <torch/extension.h>
 
 
+void farthestPointSampling_launcher(
+    torch::Tensor coordinates,
+    torch::Tensor batchCounts,
+    torch::Tensor batchOffsets,
+    torch::Tensor sampleBatchOffsets,
+    torch::Tensor seeds,
+    torch::Tensor distancesToSample,
+    torch::Tensor sampleIndices
+);
+
+
+#ifdef __CUDACC__
 __global__ void farthestPointSampling_cuda(
     const torch::PackedTensorAccessor32<float, 2, torch::RestrictPtrTraits> coordinates,
     const torch::PackedTensorAccessor32<int, 1, torch::RestrictPtrTraits> batchOffsets,
@@ -12,6 +24,7 @@ __global__ void farthestPointSampling_cuda(
     torch::PackedTensorAccessor32<float, 1, torch::RestrictPtrTraits> distancesToSample,
     torch::PackedTensorAccessor32<int64_t, 1, torch::RestrictPtrTraits> sampleIndices
 );
+#endif
 
 
 #endif
@@ -1,6 +1,8 @@
-#include "../../cuda_utils.h"
 #include "ball_query.h"
+#include "ball_query_cpu.h"
+#ifdef WITH_CUDA
 #include "ball_query_cuda.h"
+#endif
 
 
 std::tuple<torch::Tensor, torch::Tensor> ballQuery(
@@ -18,22 +20,33 @@ std::tuple<torch::Tensor, torch::Tensor> ballQuery(
     torch::Tensor sampleIndices = torch::full(totalNeighbors, -1, torch::device(selfCoordinates.device()).dtype(torch::kInt64));
     torch::Tensor sampleDistances = torch::empty(totalNeighbors, selfCoordinates.device());
 
-    const int blocks = DIVUP(otherCoordinates.size(0), THREADS_PER_BLOCK);
-    ballQuery_cuda<<<blocks, THREADS_PER_BLOCK>>>(
-        selfCoordinates.packed_accessor32<float, 2, torch::RestrictPtrTraits>(),
-        otherCoordinates.packed_accessor32<float, 2, torch::RestrictPtrTraits>(),
-        selfBatchOffsets.packed_accessor32<int, 1, torch::RestrictPtrTraits>(),
-        otherBatchIndices.packed_accessor32<int16_t, 1, torch::RestrictPtrTraits>(),
-        neighborOffsets.packed_accessor32<int, 1, torch::RestrictPtrTraits>(),
-        radius * radius,
-        sampleIndices.packed_accessor32<int64_t, 1, torch::RestrictPtrTraits>(),
-        sampleDistances.packed_accessor32<float, 1, torch::RestrictPtrTraits>()
-    );
-
-#if DEBUG
-    gpuErrchk(cudaPeekAtLastError());
-    gpuErrchk(cudaDeviceSynchronize());
+    if (otherCoordinates.is_cuda()) {
+#ifdef WITH_CUDA
+        ballQuery_launcher(
+            selfCoordinates,
+            otherCoordinates,
+            selfBatchOffsets,
+            otherBatchIndices,
+            neighborOffsets,
+            radius * radius,
+            sampleIndices,
+            sampleDistances
+        );
+#else
+        TORCH_CHECK(false, "pointops was compiled without CUDA support.");
 #endif
+    } else {
+        ballQuery_cpu(
+            selfCoordinates,
+            otherCoordinates,
+            selfBatchOffsets,
+            otherBatchIndices,
+            neighborOffsets,
+            radius * radius,
+            sampleIndices,
+            sampleDistances
+        );
+    }
 
     return std::make_tuple(sampleIndices, sampleDistances);
 }
@@ -0,0 +1,52 @@
+#include "../../cpu_utils.h"
+#include "ball_query_cpu.h"
+
+
+void ballQuery_cpu(
+    torch::Tensor selfCoordinates,
+    torch::Tensor otherCoordinates,
+    torch::Tensor selfBatchOffsets,
+    torch::Tensor otherBatchIndices,
+    torch::Tensor neighborOffsets,
+    const float radius,
+    torch::Tensor sampleIndices,
+    torch::Tensor sampleDistances
+) {
+    const auto selfCoordinatesAcc = selfCoordinates.accessor<float, 2>();
+    const auto otherCoordinatesAcc = otherCoordinates.accessor<float, 2>();
+    const auto selfBatchOffsetsAcc = selfBatchOffsets.accessor<int, 1>();
+    const auto otherBatchIndicesAcc = otherBatchIndices.accessor<int16_t, 1>();
+    const auto neighborOffsetsAcc = neighborOffsets.accessor<int, 1>();
+    auto sampleIndicesAcc = sampleIndices.accessor<int64_t, 1>();
+    auto sampleDistancesAcc = sampleDistances.accessor<float, 1>();
+
+    at::parallel_for(0, otherCoordinates.size(0), SMALL_GRAIN_SIZE, [&](int64_t begin, int64_t end) {
+        for (int64_t otherIdx = begin; otherIdx < end; otherIdx++) {
+            const int batchIdx = otherBatchIndicesAcc[otherIdx];
+            const int selfStartIdx = batchIdx == 0 ? 0 : selfBatchOffsetsAcc[batchIdx - 1];
+            const int selfEndIdx = selfBatchOffsetsAcc[batchIdx];
+            int neighborIdx = otherIdx == 0 ? 0 : neighborOffsetsAcc[otherIdx - 1];
+            const int neighborEndIdx = neighborOffsetsAcc[otherIdx];
+            if (neighborIdx == neighborEndIdx) continue;
+
+            const float x1 = otherCoordinatesAcc[otherIdx][0];
+            const float y1 = otherCoordinatesAcc[otherIdx][1];
+            const float z1 = otherCoordinatesAcc[otherIdx][2];
+
+            float x2, y2, z2, v1v2d;
+            for (int i = selfStartIdx; i < selfEndIdx; i++) {
+                x2 = selfCoordinatesAcc[i][0];
+                y2 = selfCoordinatesAcc[i][1];
+                z2 = selfCoordinatesAcc[i][2];
+
+                v1v2d = (x2 - x1) * (x2 - x1) + (y2 - y1) * (y2 - y1) + (z2 - z1) * (z2 - z1);
+                if (v1v2d <= radius) {
+                    sampleIndicesAcc[neighborIdx] = i;
+                    sampleDistancesAcc[neighborIdx] = v1v2d;
+
+                    if (++neighborIdx == neighborEndIdx) break;
+                }
+            }
+        }
+    });
+}
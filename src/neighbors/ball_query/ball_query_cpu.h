@@ -0,0 +1,19 @@
+#ifndef BALL_QUERY_CPU_H
+#define BALL_QUERY_CPU_H
+
+#include <torch/extension.h>
+
+
+void ballQuery_cpu(
+    torch::Tensor selfCoordinates,
+    torch::Tensor otherCoordinates,
+    torch::Tensor selfBatchOffsets,
+    torch::Tensor otherBatchIndices,
+    torch::Tensor neighborOffsets,
+    const float radius,
+    torch::Tensor sampleIndices,
+    torch::Tensor sampleDistances
+);
+
+
+#endif
@@ -1,6 +1,36 @@
+#include "../../cuda_utils.h"
 #include "ball_query_cuda.h"
 
 
+void ballQuery_launcher(
+    torch::Tensor selfCoordinates,
+    torch::Tensor otherCoordinates,
+    torch::Tensor selfBatchOffsets,
+    torch::Tensor otherBatchIndices,
+    torch::Tensor neighborOffsets,
+    const float radius,
+    torch::Tensor sampleIndices,
+    torch::Tensor sampleDistances
+) {
+    const int blocks = DIVUP(otherCoordinates.size(0), THREADS_PER_BLOCK);
+    ballQuery_cuda<<<blocks, THREADS_PER_BLOCK>>>(
+        selfCoordinates.packed_accessor32<float, 2, torch::RestrictPtrTraits>(),
+        otherCoordinates.packed_accessor32<float, 2, torch::RestrictPtrTraits>(),
+        selfBatchOffsets.packed_accessor32<int, 1, torch::RestrictPtrTraits>(),
+        otherBatchIndices.packed_accessor32<int16_t, 1, torch::RestrictPtrTraits>(),
+        neighborOffsets.packed_accessor32<int, 1, torch::RestrictPtrTraits>(),
+        radius,
+        sampleIndices.packed_accessor32<int64_t, 1, torch::RestrictPtrTraits>(),
+        sampleDistances.packed_accessor32<float, 1, torch::RestrictPtrTraits>()
+    );
+
+#if DEBUG
+    gpuErrchk(cudaPeekAtLastError());
+    gpuErrchk(cudaDeviceSynchronize());
+#endif
+}
+
+
 __global__ void ballQuery_cuda(
     const torch::PackedTensorAccessor32<float, 2, torch::RestrictPtrTraits> selfCoordinates,
     const torch::PackedTensorAccessor32<float, 2, torch::RestrictPtrTraits> otherCoordinates,
@@ -4,6 +4,19 @@
 #include <torch/extension.h>
 
 
+void ballQuery_launcher(
+    torch::Tensor selfCoordinates,
+    torch::Tensor otherCoordinates,
+    torch::Tensor selfBatchOffsets,
+    torch::Tensor otherBatchIndices,
+    torch::Tensor neighborOffsets,
+    const float radius,
+    torch::Tensor sampleIndices,
+    torch::Tensor sampleDistances
+);
+
+
+#ifdef __CUDACC__
 __global__ void ballQuery_cuda(
     const torch::PackedTensorAccessor32<float, 2, torch::RestrictPtrTraits> selfCoordinates,
     const torch::PackedTensorAccessor32<float, 2, torch::RestrictPtrTraits> otherCoordinates,
@@ -14,6 +27,7 @@ __global__ void ballQuery_cuda(
     torch::PackedTensorAccessor32<int64_t, 1, torch::RestrictPtrTraits> sampleIndices,
     torch::PackedTensorAccessor32<float, 1, torch::RestrictPtrTraits> sampleDistances
 );
+#endif
 
 
 #endif
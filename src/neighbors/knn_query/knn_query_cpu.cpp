@@ -0,0 +1,96 @@
+#include <utility>
+
+#include "../../cpu_utils.h"
+#include "knn_query_cpu.h"
+
+
+inline void reheap_cpu(
+    int64_t* indices,
+    float* values,
+    const int startIdx, const int endIdx
+) {
+    int root = startIdx, child = startIdx + 1;
+    while (child < endIdx)
+    {
+        if (
+            child + 1 < endIdx
+            && values[child + 1] > values[child]
+        )
+            child++;
+
+        if (values[root] > values[child])
+            return;
+
+        std::swap(indices[root], indices[child]);
+        std::swap(values[root], values[child]);
+        root = child;
+        child = startIdx + ((root - startIdx) << 1) + 1;
+    }
+}
+
+
+inline void heapSort_cpu(
+    int64_t* indices,
+    float* values,
+    const int startIdx, const int endIdx
+) {
+    for (int i = endIdx - 1; i > startIdx; i--)
+    {
+        std::swap(indices[startIdx], indices[i]);
+        std::swap(values[startIdx], values[i]);
+        reheap_cpu(indices, values, startIdx, i);
+    }
+}
+
+
+void kNNQuery_cpu(
+    torch::Tensor selfCoordinates,
+    torch::Tensor otherCoordinates,
+    torch::Tensor selfBatchOffsets,
+    torch::Tensor otherBatchIndices,
+    torch::Tensor neighborOffsets,
+    const bool sorted,
+    torch::Tensor sampleIndices,
+    torch::Tensor sampleDistances
+) {
+    const auto selfCoordinatesAcc = selfCoordinates.accessor<float, 2>();
+    const auto otherCoordinatesAcc = otherCoordinates.accessor<float, 2>();
+    const auto selfBatchOffsetsAcc = selfBatchOffsets.accessor<int, 1>();
+    const auto otherBatchIndicesAcc = otherBatchIndices.accessor<int16_t, 1>();
+    const auto neighborOffsetsAcc = neighborOffsets.accessor<int, 1>();
+    int64_t* sampleIndicesPtr = sampleIndices.data_ptr<int64_t>();
+    float* sampleDistancesPtr = sampleDistances.data_ptr<float>();
+
+    at::parallel_for(0, otherCoordinates.size(0), SMALL_GRAIN_SIZE, [&](int64_t begin, int64_t end) {
+        for (int64_t otherIdx = begin; otherIdx < end; otherIdx++) {
+            const int batchIdx = otherBatchIndicesAcc[otherIdx];
+            const int selfStartIdx = batchIdx == 0 ? 0 : selfBatchOffsetsAcc[batchIdx - 1];
+            const int selfEndIdx = selfBatchOffsetsAcc[batchIdx];
+            const int neighborStartIdx = otherIdx == 0 ? 0 : neighborOffsetsAcc[otherIdx - 1];
+            const int neighborEndIdx = neighborOffsetsAcc[otherIdx];
+            if (neighborStartIdx == neighborEndIdx) continue;
+
+            const float x1 = otherCoordinatesAcc[otherIdx][0];
+            const float y1 = otherCoordinatesAcc[otherIdx][1];
+            const float z1 = otherCoordinatesAcc[otherIdx][2];
+
+            float x2, y2, z2, v1v2d;
+            for (int i = selfStartIdx; i < selfEndIdx; i++) {
+                x2 = selfCoordinatesAcc[i][0];
+                y2 = selfCoordinatesAcc[i][1];
+                z2 = selfCoordinatesAcc[i][2];
+
+                v1v2d = (x2 - x1) * (x2 - x1) + (y2 - y1) * (y2 - y1) + (z2 - z1) * (z2 - z1);
+                if (v1v2d < sampleDistancesPtr[neighborStartIdx]) {
+                    sampleDistancesPtr[neighborStartIdx] = v1v2d;
+                    sampleIndicesPtr[neighborStartIdx] = i;
+                    reheap_cpu(sampleIndicesPtr, sampleDistancesPtr, neighborStartIdx, neighborEndIdx);
+                }
+            }
+
+            if (sorted) {
+                heapSort_cpu(sampleIndicesPtr, sampleDistancesPtr, neighborStartIdx, neighborEndIdx);
+            }
+        }
+    });
+}
@@ -0,0 +1,19 @@
+#ifndef KNN_QUERY_CPU_H
+#define KNN_QUERY_CPU_H
+
+#include <torch/extension.h>
+
+
+void kNNQuery_cpu(
+    torch::Tensor selfCoordinates,
+    torch::Tensor otherCoordinates,
+    torch::Tensor selfBatchOffsets,
+    torch::Tensor otherBatchIndices,
+    torch::Tensor neighborOffsets,
+    const bool sorted,
+    torch::Tensor sampleIndices,
+    torch::Tensor sampleDistances
+);
+
+
+#endif
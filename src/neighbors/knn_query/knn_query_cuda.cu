@@ -1,4 +1,34 @@
-#include "knn_query.h"
+#include "../../cuda_utils.h"
+#include "knn_query_cuda.h"
+
+
+void kNNQuery_launcher(
+    torch::Tensor selfCoordinates,
+    torch::Tensor otherCoordinates,
+    torch::Tensor selfBatchOffsets,
+    torch::Tensor otherBatchIndices,
+    torch::Tensor neighborOffsets,
+    const bool sorted,
+    torch::Tensor sampleIndices,
+    torch::Tensor sampleDistances
+) {
+    const int blocks = DIVUP(otherCoordinates.size(0), THREADS_PER_BLOCK);
+    kNNQuery_cuda<<<blocks, THREADS_PER_BLOCK>>>(
+        selfCoordinates.packed_accessor32<float, 2, torch::RestrictPtrTraits>(),
+        otherCoordinates.packed_accessor32<float, 2, torch::RestrictPtrTraits>(),
+        selfBatchOffsets.packed_accessor32<int, 1, torch::RestrictPtrTraits>(),
+        otherBatchIndices.packed_accessor32<int16_t, 1, torch::RestrictPtrTraits>(),
+        neighborOffsets.packed_accessor32<int, 1, torch::RestrictPtrTraits>(),
+        sorted,
+        sampleIndices.packed_accessor32<int64_t, 1, torch::RestrictPtrTraits>(),
+        sampleDistances.packed_accessor32<float, 1, torch::RestrictPtrTraits>()
+    );
+
+#if DEBUG
+    gpuErrchk(cudaPeekAtLastError());
+    gpuErrchk(cudaDeviceSynchronize());
+#endif
+}
 
 
 template <typename scalar_t>
@@ -4,6 +4,19 @@
 #include <torch/extension.h>
 
 
+void kNNQuery_launcher(
+    torch::Tensor selfCoordinates,
+    torch::Tensor otherCoordinates,
+    torch::Tensor selfBatchOffsets,
+    torch::Tensor otherBatchIndices,
+    torch::Tensor neighborOffsets,
+    const bool sorted,
+    torch::Tensor sampleIndices,
+    torch::Tensor sampleDistances
+);
+
+
+#ifdef __CUDACC__
 template <typename scalar_t>
 __device__ void swap(
     torch::PackedTensorAccessor32<scalar_t, 1, torch::RestrictPtrTraits> scalars,
@@ -35,6 +48,7 @@ __global__ void kNNQuery_cuda(
     torch::PackedTensorAccessor32<int64_t, 1, torch::RestrictPtrTraits> sampleIndices,
     torch::PackedTensorAccessor32<float, 1, torch::RestrictPtrTraits> sampleDistances
 );
+#endif
 
 
 #endif
@@ -1,7 +1,92 @@
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import KDTree
 import torch
 from torchtyping import TensorType
 
 
+def _region_proposals(
+    spatial_embeds: TensorType['N', 3, torch.float32],
+    sigmas: TensorType['N', 'D', torch.float32],
+    foreground: TensorType['N', torch.bool],
+    seed_idxs: TensorType['S', torch.int64],
+) -> TensorType['N', 'S', torch.bool]:
+    probs = torch.exp(-1 * torch.sum(
+        sigmas[seed_idxs] * torch.pow(spatial_embeds[:, None] - spatial_embeds[seed_idxs], 2),
+        dim=2,
+    ))
+
+    return foreground[:, None] & (probs >= 0.7)
+
+
+def _batched_region_cluster(
+    clusters: TensorType['N', torch.int64],
+    spatial_embeds: TensorType['N', 3, torch.float32],
+    sigmas: TensorType['N', 'D', torch.float32],
+    seeds: TensorType['N', torch.float32],
+    instance_idx: int,
+    min_seed_score: float,
+    min_cluster_size: int,
+    min_unclustered: float,
+    num_seeds: int,
+) -> int:
+    foreground = seeds >= 0.5
+    mask = foreground.clone()
+
+    # candidate seeds in the order in which the sequential loop visits them
+    order = torch.sort(seeds, descending=True, stable=True)[1]
+    candidates = order[seeds[order] >= min_seed_score]
+    while True:
+        candidates = candidates[mask[candidates]]
+        if candidates.shape[0] == 0:
+            break
+        chunk, candidates = candidates[:num_seeds], candidates[num_seeds:]
+
+        # greedily skip seeds covered by the proposal of a better seed
+        cover = _region_proposals(
+            spatial_embeds[chunk], sigmas[chunk], foreground[chunk],
+            torch.arange(chunk.shape[0], device=chunk.device),
+        ).T.cpu().numpy()
+        alive = np.ones(chunk.shape[0], dtype=bool)
+        visited = []
+        for i in range(chunk.shape[0]):
+            if alive[i]:
+                visited.append(i)
+                alive &= ~cover[i]
+        proposals = _region_proposals(
+            spatial_embeds, sigmas, foreground, chunk[visited],
+        )
+
+        # unclustered points of a proposal are those not covered by earlier proposals
+        first_proposal = proposals.byte().argmax(dim=1)
+        unclustered = mask & torch.any(proposals, dim=1)
+        num_unclustered = torch.bincount(
+            first_proposal[unclustered], minlength=proposals.shape[1],
+        )
+        num_points = proposals.sum(dim=0)
+
+        # stop where the sequential loop would have run out of unclustered points
+        num_remaining = mask.sum() - (torch.cumsum(num_unclustered, dim=0) - num_unclustered)
+        keep = torch.cumprod(num_remaining >= min_cluster_size, dim=0).bool()
+        accept = (
+            keep
+            & (num_points >= min_cluster_size)
+            & (num_unclustered / num_points >= min_unclustered)
+        )
+
+        instance_idxs = instance_idx + torch.cumsum(accept, dim=0) - 1
+        point_mask = unclustered & accept[first_proposal]
+        clusters[point_mask] = instance_idxs[first_proposal[point_mask]]
+        instance_idx += int(accept.sum())
+
+        if not torch.all(keep):
+            break
+        mask[unclustered] = False
+
+    return instance_idx
+
+
 def learned_region_cluster(
     offsets,
     sigmas,
@@ -9,6 +94,8 @@ def learned_region_cluster(
     min_seed_score: float=0.9,
     min_cluster_size: int=16,
     min_unclustered: float=0.4,
+    batched: bool=False,
+    num_seeds: int=256,
 ):
     clusters = [torch.full((n,1), -1).to(seeds.F).long() for n in seeds.batch_counts]
 
@@ -23,6 +110,14 @@ def learned_region_cluster(
 
         # determine instances by clustering
         spatial_embeds = offsets_b + offsets.batch(b).C
+        if batched:
+            instance_idx = _batched_region_cluster(
+                clusters[b][:, 0], spatial_embeds, sigmas_b, seeds_b[:, 0],
+                instance_idx, min_seed_score, min_cluster_size, min_unclustered,
+                num_seeds,
+            )
+            continue
+
         while mask_b.sum() >= min_cluster_size:
             voxel_idx = (seeds_b * mask_b).argmax()
             if seeds_b[voxel_idx] < min_seed_score:
@@ -117,3 +212,86 @@ def wdbscan(
         noisy = (status == -1)
         status[noisy] = torch.arange(cluster_id, cluster_id + noisy.sum()).to(status)
     return status
+
+
+def sparse_wdbscan(
+    coordinates: TensorType['K', 'D', torch.float32],
+    epsilon: float,
+    mu: float,
+    weights=None,
+    noise=True,
+):
+    """
+    Generates the same clustering as wdbscan from a sparse epsilon-
+    neighborhood graph instead of a dense dissimilarity matrix. Clusters
+    are connected components of core observations and border observations
+    are assigned in the order in which wdbscan visits them.
+    
+    Positional arguments:
+    coordinates -- coordinates of observations, dissimilarity is Euclidean.
+    epsilon     -- maximum reachability distance.
+    mu          -- minimum reachability weight.
+    
+    Keyword arguments:
+    weights -- weight array (if None, weights default to 1).
+    noise   -- Boolean indicating whether objects that do not belong to any
+               cluster should be considered as noise (if True) or assigned to
+               clusters of their own (if False).
+    """
+    n = coordinates.shape[0]
+    if weights is None:
+        weights = torch.ones(n, dtype=torch.int64, device=coordinates.device)
+
+    # candidate pairs from KD-tree, distances are recomputed as in wdbscan
+    tree = KDTree(coordinates.detach().cpu().numpy())
+    pairs = tree.query_pairs(r=1.0001 * epsilon, output_type='ndarray')
+    pairs = torch.from_numpy(pairs).to(coordinates.device)
+    dists = torch.linalg.norm(
+        coordinates[pairs[:, 1]] - coordinates[pairs[:, 0]], dim=-1,
+    )
+    pairs = pairs[dists <= epsilon].cpu().numpy()
+    src = np.concatenate((pairs[:, 0], pairs[:, 1]))
+    dst = np.concatenate((pairs[:, 1], pairs[:, 0]))
+
+    # core observations have a dense neighborhood, including themselves
+    weights = weights.cpu().numpy()
+    weight_sums = weights.copy()
+    np.add.at(weight_sums, dst, weights[src])
+    core = weight_sums >= mu
+
+    # clusters are numbered by the lowest index of their core observations
+    core_edges = core[src] & core[dst]
+    graph = coo_matrix(
+        (np.ones(core_edges.sum()), (src[core_edges], dst[core_edges])),
+        shape=(n, n),
+    )
+    num_components, components = connected_components(graph, directed=False)
+    core_idxs = np.nonzero(core)[0]
+    _, first_idxs = np.unique(components[core_idxs], return_index=True)
+    start_idxs = np.sort(core_idxs[first_idxs])
+    cluster_ids = np.zeros(num_components, dtype=np.int64)
+    cluster_ids[components[start_idxs]] = np.arange(1, start_idxs.shape[0] + 1)
+    status = np.full(n, -1, dtype=np.int64)
+    status[core] = cluster_ids[components[core]]
+
+    # border observations join the first cluster that reaches them, unless
+    # they neighbor the first core observation of a later cluster
+    border_edges = core[src] & ~core[dst]
+    first_cluster = np.full(n, start_idxs.shape[0] + 1, dtype=np.int64)
+    np.minimum.at(first_cluster, dst[border_edges], status[src[border_edges]])
+    is_start = np.zeros(n, dtype=bool)
+    is_start[start_idxs] = True
+    start_edges = border_edges & is_start[src]
+    last_cluster = np.zeros(n, dtype=np.int64)
+    np.maximum.at(last_cluster, dst[start_edges], status[src[start_edges]])
+    border = first_cluster <= start_idxs.shape[0]
+    status[border] = np.where(
+        last_cluster[border] > 0, last_cluster[border], first_cluster[border],
+    )
+
+    status = torch.from_numpy(status).to(coordinates.device)
+    if not noise: # Assign cluster ids to noise
+        cluster_id = start_idxs.shape[0] + 1
+        noisy = (status == -1)
+        status[noisy] = torch.arange(cluster_id, cluster_id + noisy.sum()).to(status)
+    return status
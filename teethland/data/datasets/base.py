@@ -28,7 +28,7 @@ class MeshDataset(Dataset):
         self.transform = transform
         self.cache = DatasetCache(
             dataset=self,
-            cache_path=Path(str(hash(self))).with_suffix('.pkl'),
+            cache_path=Path('dataset_cache') / str(hash(self)),
             disable=stage == 'predict',
         )
 
@@ -1,13 +1,22 @@
-import copy
+import json
+import os
 from pathlib import Path
 import pickle
-from typing import Any
+import shutil
+from typing import Any, Dict
 
+import numpy as np
 from torch.utils.data import Dataset
 
 
-class DatasetCache(dict):
-    """Implements cache to load and store preprocessed dataset from storage."""
+class DatasetCache:
+    """Implements cache to load and store preprocessed dataset from storage.
+
+    Every item is stored in its own directory with one .npy file per array,
+    which is memory-mapped read-only when loaded. DataLoader workers thus
+    share pages of the cached arrays and a partial cache survives restarts.
+    Transforms copy an array only before modifying it, see T.Compose.
+    """
 
     def __init__(
         self,
@@ -15,36 +24,88 @@ class DatasetCache(dict):
         cache_path: Path,
         disable: bool=False,
     ) -> None:
-        super().__init__()
-
-        if not disable and cache_path.exists():
-            print(f'Loading dataset from {cache_path}.')
-            with open(cache_path, 'rb') as f:
-                cache = pickle.load(f)
-
-            for key, value in cache.items():
-                super().__setitem__(key, value)
-        
         self.dataset = dataset
         self.cache_path = cache_path
         self.disable = disable
 
-    def __getitem__(self, key: int) -> Any:
-        value = super().__getitem__(key)
-        value = copy.deepcopy(value)
+        if disable:
+            return
+
+        legacy_path = Path(cache_path.name).with_suffix('.pkl')
+        if legacy_path.exists():
+            print(f'Ignoring {legacy_path}, dataset caches are now stored in {cache_path.parent}.')
+
+        manifest = {
+            'hash': cache_path.name,
+            'num_items': len(dataset),
+        }
+        manifest_path = cache_path / 'manifest.json'
+        if manifest_path.exists():
+            with open(manifest_path, 'r') as f:
+                cached_manifest = json.load(f)
+
+            if cached_manifest == manifest:
+                num_cached = len(self)
+                print(f'Loading dataset from {cache_path}, {num_cached} items cached.')
+                if num_cached < manifest['num_items']:
+                    print(f'Cache is incomplete, storing the remaining {manifest["num_items"] - num_cached} items.')
+                return
+
+            print(f'Rebuilding {cache_path}, manifest {cached_manifest} does not match {manifest}.')
+            shutil.rmtree(cache_path)
+
+        cache_path.mkdir(parents=True, exist_ok=True)
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+    def item_path(self, key: int) -> Path:
+        return self.cache_path / str(key)
+
+    def __contains__(self, key: int) -> bool:
+        return not self.disable and self.item_path(key).exists()
+
+    def __len__(self) -> int:
+        if self.disable or not self.cache_path.exists():
+            return 0
+
+        return sum(1 for path in self.cache_path.iterdir() if path.name.isdigit())
+
+    def __getitem__(self, key: int) -> Dict[str, Any]:
+        if key not in self:
+            raise KeyError(key)
+
+        item_path = self.item_path(key)
+        with open(item_path / 'values.pkl', 'rb') as f:
+            keys, values = pickle.load(f)
+
+        value = {}
+        for k in keys:
+            if k in values:
+                value[k] = values[k]
+                continue
+
+            value[k] = np.load(item_path / f'{k}.npy', mmap_mode='r')
 
         return value
 
-    def __setitem__(self, key: int, value: Any) -> None:
-        if self.disable:
+    def __setitem__(self, key: int, value: Dict[str, Any]) -> None:
+        if self.disable or key in self:
             return
 
-        super().__setitem__(key, copy.deepcopy(value))
+        # write to temporary directory first, so other workers never see partial items
+        tmp_path = self.cache_path / f'{key}.{os.getpid()}.tmp'
+        tmp_path.mkdir(parents=True, exist_ok=True)
+
+        values = {}
+        for k, v in value.items():
+            if isinstance(v, np.ndarray) and v.dtype != object:
+                np.save(tmp_path / f'{k}.npy', v)
+            else:
+                values[k] = v
+        with open(tmp_path / 'values.pkl', 'wb') as f:
+            pickle.dump((list(value.keys()), values), f)
 
-        if (
-            not self.cache_path.exists()
-            and len(self) == len(self.dataset)
-        ):
-            print(f'Storing dataset as {self.cache_path}.')
-            with open(self.cache_path, 'wb') as f:
-                pickle.dump(dict(self), f)
+        try:
+            os.rename(tmp_path, self.item_path(key))
+        except OSError:  # stored by another worker in the meantime
+            shutil.rmtree(tmp_path)
@@ -7,6 +7,7 @@ from numpy.typing import NDArray
 import pymeshlab
 
 from teethland.data.datasets.base import MeshDataset
+from teethland.data.mesh import MeshContext
 import teethland.data.transforms as T
 
 
@@ -57,7 +58,18 @@ class TeethSegDataset(MeshDataset):
         mesh = ms.current_mesh()
         mesh.compact()
 
+        # keep original mesh for post-processing of predictions
+        if self.stage == 'predict':
+            mesh_dict = {'mesh': MeshContext(
+                file=self.root / file,
+                vertices=mesh.vertex_matrix(),
+                faces=mesh.face_matrix(),
+            )}
+        else:
+            mesh_dict = {}
+
         return {
+            **mesh_dict,
             'scan_file': file.as_posix(),
             'affine': np.eye(4),
             'is_lower': self.load_jaw(file) in ['lower', 'mandible'],
@@ -0,0 +1,70 @@
+import os
+from pathlib import Path
+import shutil
+from typing import Any, Dict
+
+import numpy as np
+from numpy.typing import NDArray
+import open3d
+
+
+class MeshContext:
+    """Original mesh of a scan, loaded once and shared by post-processing.
+
+    The vertices and faces are kept as stored, before any normalization.
+    The raycasting scene to project points onto the mesh is only built when
+    it is first needed and is not sent between processes.
+    """
+
+    def __init__(
+        self,
+        file: Path,
+        vertices: NDArray[np.float64],
+        faces: NDArray[np.int64],
+    ) -> None:
+        self.file = file
+        self.vertices = vertices
+        self.faces = faces
+        self._scene = None
+
+    @property
+    def scene(self) -> open3d.t.geometry.RaycastingScene:
+        if self._scene is None:
+            mesh = open3d.t.geometry.TriangleMesh()
+            mesh.vertex.positions = open3d.core.Tensor(self.vertices.astype(np.float32))
+            mesh.triangle.indices = open3d.core.Tensor(self.faces.astype(np.int32))
+
+            self._scene = open3d.t.geometry.RaycastingScene()
+            _ = self._scene.add_triangles(mesh)  # we do not need the geometry ID for mesh
+
+        return self._scene
+
+    def closest_points(
+        self,
+        points: NDArray[np.float32],
+    ) -> NDArray[np.float32]:
+        closest_points = self.scene.compute_closest_points(points.astype(np.float32))
+
+        return closest_points['points'].numpy()
+
+    def copy_to(self, path: Path) -> None:
+        """Copy the mesh file to path, as a hard link if possible."""
+        if path.exists():
+            if path.samefile(self.file):
+                return
+
+            path.unlink()
+
+        try:
+            os.link(self.file, path)
+        except OSError:  # e.g. different file systems
+            shutil.copyfile(self.file, path)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {**self.__dict__, '_scene': None}
+
+    def __repr__(self) -> str:
+        return (
+            f'{self.__class__.__name__}(file={self.file}, '
+            f'vertices={self.vertices.shape[0]}, faces={self.faces.shape[0]})'
+        )
@@ -1,4 +1,3 @@
-import copy
 from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 import numpy as np
@@ -12,8 +11,16 @@ import torch
 from torch_scatter import scatter_mean, scatter_min, scatter_max
 from torchtyping import TensorType
 
+from teethland.data.mesh import MeshContext
+
 
 class Compose:
+    """Implements chain of transforms with copy-on-write of read-only arrays.
+
+    Arrays loaded from the dataset cache are read-only memory maps. They are
+    only copied right before a transform that modifies them in place, which
+    each transform declares with its mutates attribute.
+    """
 
     def __init__(
         self,
@@ -26,6 +33,11 @@ class Compose:
         **data_dict: Dict[str, Any],
     ) -> Dict[str, Any]:
         for t in self.transforms:
+            for key in getattr(t, 'mutates', ()):
+                value = data_dict.get(key)
+                if isinstance(value, np.ndarray) and not value.flags.writeable:
+                    data_dict[key] = value.copy()
+
             data_dict = t(**data_dict)
         
         return data_dict
@@ -53,6 +65,20 @@ class ToTensor:
         self.int_dtypes = int_dtypes
         self.float_dtypes = float_dtypes
 
+    def as_tensor(
+        self,
+        value: Any,
+        dtype: torch.dtype,
+    ) -> TensorType[..., Any]:
+        if not isinstance(value, np.ndarray):
+            return torch.tensor(value, dtype=dtype)
+
+        # share memory with writable arrays, copy read-only or reversed arrays
+        if not value.flags.writeable or any(s < 0 for s in value.strides):
+            value = value.copy()
+
+        return torch.from_numpy(value).to(dtype)
+
     def __call__(
         self,
         **data_dict: Dict[str, Any],
@@ -60,12 +86,12 @@ class ToTensor:
         for k, v in data_dict.items():
             dtype = v.dtype if isinstance(v, np.ndarray) else type(v)
             if dtype in self.bool_dtypes:
-                data_dict[k] = torch.tensor(copy.copy(v), dtype=torch.bool)
+                data_dict[k] = self.as_tensor(v, torch.bool)
             elif dtype in self.int_dtypes:
-                data_dict[k] = torch.tensor(copy.copy(v), dtype=torch.int64)            
+                data_dict[k] = self.as_tensor(v, torch.int64)
             elif dtype in self.float_dtypes:
-                data_dict[k] = torch.tensor(copy.copy(v), dtype=torch.float32)
-            elif dtype == str:
+                data_dict[k] = self.as_tensor(v, torch.float32)
+            elif dtype in [str, MeshContext]:
                 data_dict[k] = v
             else:
                 raise ValueError(
@@ -197,6 +223,8 @@ class RandomJitter(object):
 
 class RandomXAxisFlip(object):
 
+    mutates = ('points', 'normals', 'landmark_coords', 'instance_centroids')
+
     def __init__(
         self,
         prob: float=0.5,
@@ -800,11 +828,36 @@ class GenerateProposals:
         max_proposals: int,
         rng: Optional[np.random.Generator]=None,
         label_as_instance: bool=False,
+        max_chunk_elements: int=2**20,
     ):
         self.proposal_points = proposal_points
         self.max_proposals = max_proposals
         self.rng = rng if rng is not None else np.random.default_rng()
         self.label_as_instance = label_as_instance
+        self.max_chunk_elements = max_chunk_elements
+
+    def nearest_points(
+        self,
+        points: NDArray[Any],
+        centroids: NDArray[Any],
+    ) -> NDArray[np.int64]:
+        """Indices of closest points to each centroid, sorted by distance.
+
+        The centroids are processed in chunks to bound the distance matrix and
+        only the closest points are selected and sorted with np.argpartition.
+        """
+        k = min(self.proposal_points, points.shape[0])
+        chunk_size = max(1, self.max_chunk_elements // points.shape[0])
+
+        point_idxs = np.empty((centroids.shape[0], k), dtype=np.int64)
+        for start in range(0, centroids.shape[0], chunk_size):
+            chunk = slice(start, start + chunk_size)
+            dists = np.linalg.norm(points[None] - centroids[chunk, None], axis=-1)
+            idxs = np.argpartition(dists, k - 1, axis=1)[:, :k]
+            order = np.argsort(np.take_along_axis(dists, idxs, axis=1), axis=1)
+            point_idxs[chunk] = np.take_along_axis(idxs, order, axis=1)
+
+        return point_idxs
 
     def __call__(
         self,
@@ -847,8 +900,7 @@ class GenerateProposals:
             ))
             data_dict['landmarks'] = landmarks
 
-        dists = np.linalg.norm(points[None] - centroids[:, None], axis=-1)
-        point_idxs = np.argsort(dists, axis=1)[:, :self.proposal_points]
+        point_idxs = self.nearest_points(points, centroids)
         labels = (data_dict['instances'][point_idxs] == instance_idxs[:, None]).astype(int)
         if self.label_as_instance:
             fg_mask = data_dict['labels'][point_idxs] == instance_idxs[:, None]
@@ -27,9 +27,11 @@ class TeethInstFullDataModule(TeethInstSegDataModule):
             T.UniformDensityDownsample(uniform_density_voxel_size[0]),
             self.default_transforms,
         )
+        self.pred_files = None  # predict all files in root if None
 
     def _min_graph_cut(
         self,
+        scan: Dict[str, Any],
         instances: PointTensor,
         max_probs: TensorType['N', torch.float32],
         round_factor: float=100.0,
@@ -38,9 +40,9 @@ class TeethInstFullDataModule(TeethInstSegDataModule):
     ) -> TensorType['N', torch.bool]:
         """Use minimum cut to derive foreground points."""
         edge_idxs = torch.cat((
-            self.triangles[:, [0, 1]],
-            self.triangles[:, [0, 2]],
-            self.triangles[:, [1, 2]],
+            scan['triangles'][:, [0, 1]],
+            scan['triangles'][:, [0, 2]],
+            scan['triangles'][:, [1, 2]],
         )).int()
         edge_idxs = torch.unique(torch.sort(edge_idxs, dim=-1)[0], dim=0)
 
@@ -54,7 +56,7 @@ class TeethInstFullDataModule(TeethInstSegDataModule):
         pairwise = 1 - torch.eye(2).to(unaries)
 
         # edge weights
-        cos_theta = torch.einsum('ni,ni->n', self.normals[edge_idxs[:, 0]], self.normals[edge_idxs[:, 1]])
+        cos_theta = torch.einsum('ni,ni->n', scan['normals'][edge_idxs[:, 0]], scan['normals'][edge_idxs[:, 1]])
         cos_theta = cos_theta.clip(-1 + eps, 1 - eps)
         theta = torch.arccos(cos_theta)
         phi = torch.linalg.norm(instances.C[edge_idxs[:, 0]] - instances.C[edge_idxs[:, 1]], dim=-1)
@@ -80,6 +82,7 @@ class TeethInstFullDataModule(TeethInstSegDataModule):
     
     def _fill_background_triangles(
         self,
+        scan: Dict[str, Any],
         instances: PointTensor,
         max_probs: TensorType['N', torch.float32],
         score_thresh: float=0.4,
@@ -87,7 +90,7 @@ class TeethInstFullDataModule(TeethInstSegDataModule):
         # determine mesh of background triangles
         bg_mask = instances.F == -1
 
-        bg_triangles = self.triangles[torch.any(bg_mask[self.triangles], dim=-1)]
+        bg_triangles = scan['triangles'][torch.any(bg_mask[scan['triangles']], dim=-1)]
         
         vertex_mask = torch.zeros_like(bg_mask)
         vertex_mask[bg_triangles.flatten()] = True
@@ -155,39 +158,37 @@ class TeethInstFullDataModule(TeethInstSegDataModule):
 
     def process_instances(
         self,
+        scan: Dict[str, Any],
         instances: PointTensor,
         max_probs: TensorType['N', torch.float32],
     ) -> PointTensor:
         # determine and label foreground points
-        foreground = self._min_graph_cut(instances, max_probs)
+        foreground = self._min_graph_cut(scan, instances, max_probs)
         instances.F = torch.where(foreground, instances.F, -1)
 
         # fill surrounded background patches and remove small foreground patches
-        instances.F = self._fill_background_triangles(instances, max_probs)
+        instances.F = self._fill_background_triangles(scan, instances, max_probs)
         instances.F = self._remove_small_instances(instances)
                 
         return instances
 
     def process_landmarks(
         self,
+        scan: Dict[str, Any],
         labels: PointTensor,
         affine: TensorType[4, 4, torch.float32],
         landmarks: PointTensor,
     ) -> PointTensor:
         # apply inverse affine transformation to undo preprocessing
-        affine = affine @ self.affine[0]
+        affine = affine @ scan['affine']
         landmarks_hom = torch.column_stack((
             landmarks.C, torch.ones_like(landmarks.C[:, 0]),
         ))
         landmarks_coords = (landmarks_hom @ torch.linalg.inv(affine.T))[:, :3]
 
         # project landmarks to scan surface
-        mesh = open3d.io.read_triangle_mesh(str(self.root / self.scan_file))
-        mesh = open3d.t.geometry.TriangleMesh.from_legacy(mesh)
-        scene = open3d.t.geometry.RaycastingScene()
-        _ = scene.add_triangles(mesh)  # we do not need the geometry ID for mesh
-        closest_points = scene.compute_closest_points(landmarks_coords.cpu().numpy())
-        landmarks_coords = torch.from_numpy(closest_points['points'].numpy()).to(landmarks_coords)
+        closest_points = scan['mesh'].closest_points(landmarks_coords.cpu().numpy())
+        landmarks_coords = torch.from_numpy(closest_points).to(landmarks_coords)
 
         # separate mesial and distal landmarks
         mesial_and_distal = landmarks[landmarks.F[:, -1] == 0]
@@ -244,8 +245,11 @@ class TeethInstFullDataModule(TeethInstSegDataModule):
 
     def setup(self, stage: Optional[str]=None):
         if stage is None or stage == 'predict':
-            files = self._files('predict', exclude=[])
-            _, files = self._split(files)
+            if self.pred_files is None:
+                files = self._files('predict', exclude=[])
+                _, files = self._split(files)
+            else:
+                files = self.pred_files
             print('Total number of files:', len(files))
             self.pred_dataset = TeethSegDataset(
                 stage='predict',
@@ -259,20 +263,18 @@ class TeethInstFullDataModule(TeethInstSegDataModule):
     def collate_fn(
         self,
         batch: List[Dict[str, TensorType[..., Any]]],
-    ) -> Tuple[
-        str,
-        TensorType['B', torch.bool],
-        TensorType['T', 3, torch.float32],
-        TensorType['B', 4, 4, torch.float32],
-        PointTensor,
-    ]:
+    ) -> Tuple[List[Dict[str, Any]], PointTensor]:
         batch_dict = {key: [d[key] for d in batch] for key in batch[0]}
 
-        scan_file = batch_dict['scan_file'][0]
-        is_lower = torch.stack(batch_dict['is_lower'])
-        triangles = torch.cat(batch_dict['triangles'])
-        normals = torch.cat(batch_dict['normals'])
-        affine = torch.stack(batch_dict['affine'])
+        # keep metadata of each scan for post-processing
+        scans = [{
+            'scan_file': data_dict['scan_file'],
+            'mesh': data_dict['mesh'],
+            'is_lower': data_dict['is_lower'],
+            'triangles': data_dict['triangles'],
+            'normals': data_dict['normals'],
+            'affine': data_dict['affine'],
+        } for data_dict in batch]
 
         # collate input points and features
         point_counts = torch.stack(batch_dict['point_count'])
@@ -293,21 +295,21 @@ class TeethInstFullDataModule(TeethInstSegDataModule):
             batch_dict['ud_downsample_count_2'],
         )
 
-        return scan_file, is_lower, triangles, normals, affine, x
+        return scans, x
 
     def transfer_batch_to_device(
         self,
         batch,
         device: torch.device,
         dataloader_idx: int,
-    ) -> PointTensor:
-        self.scan_file = batch[0]
-        self.is_lower = batch[1].to(device)
-        self.triangles = batch[2].to(device)
-        self.normals = batch[3].to(device)
-        self.affine = batch[4].to(device)
-
-        return batch[5].to(device)
+    ) -> Tuple[List[Dict[str, Any]], PointTensor]:
+        scans, x = batch
+        scans = [{
+            k: v.to(device) if isinstance(v, torch.Tensor) else v
+            for k, v in scan.items()
+        } for scan in scans]
+
+        return scans, x.to(device)
     
 
 class TeethMixedFullDataModule(TeethInstFullDataModule):
@@ -319,6 +321,7 @@ class TeethMixedFullDataModule(TeethInstFullDataModule):
     def teeth_classes_to_labels(
         self,
         classes: PointTensor,
+        is_lower: TensorType[torch.bool],
     ) -> PointTensor:
         # determine tooth instances on the right side of the arch
         right_mask = torch.zeros(0, dtype=torch.bool, device=classes.C.device)
@@ -355,7 +358,7 @@ class TeethMixedFullDataModule(TeethInstFullDataModule):
                 raise NotImplementedError()
             else:
                 labels.F += 40 * primary_mask * (labels.F < 5)
-                labels.F += 20 * self.is_lower[0]
+                labels.F += 20 * is_lower
                 
             labels.F += 11 + 10 * right_mask
         
@@ -1,3 +1,4 @@
+from functools import lru_cache
 import json
 from time import perf_counter
 from typing import Any, Dict, List, Literal, Optional, Tuple, Union
@@ -17,6 +18,27 @@ import teethland.data.transforms as T
 from teethland.visualization import draw_point_clouds
 
 
+@lru_cache(maxsize=None)
+def fdi_pair_normals(
+    is_lower: bool,
+    path: str='fdi_pair_distrs.json',
+) -> MultivariateNormal:
+    """Gaussians of 2D offsets between pairs of teeth in one arch on the CPU.
+
+    The distributions are loaded and factorized once per process and jaw.
+    """
+    with open(path, 'r') as f:
+        pair_normals = json.load(f)
+    means = torch.tensor(pair_normals['means'])
+    covs = torch.tensor(pair_normals['covs'])
+
+    offset = 16 * is_lower
+    return MultivariateNormal(
+        loc=means[offset:offset + 16, offset:offset + 16, :2],
+        covariance_matrix=covs[offset:offset + 16, offset:offset + 16, :2, :2],
+    )
+
+
 class TeethInstSegDataModule(TeethSegDataModule):
     """Data module to load intraoral scans with teeth instances."""
 
@@ -179,41 +201,40 @@ class TeethInstSegDataModule(TeethSegDataModule):
         return R
     
     def determine_seqence(self, classes):
-        directions = classes.C / torch.linalg.norm(classes.C, dim=-1, keepdim=True)
-        cos_angles = torch.einsum('ni,mi->nm', directions, directions)
+        # greedy chain on CPU, as indexing on the device syncs for every tooth
+        coords = classes.C.cpu()
+        directions = coords / torch.linalg.norm(coords, dim=-1, keepdim=True)
+        cos_angles = torch.einsum('ni,mi->nm', directions, directions).numpy()
+
+        # candidates from most to least similar direction, lowest index first
+        ranks = np.argsort(-cos_angles, axis=-1, kind='stable')
 
-        idxs = torch.full((classes.C.shape[0],), -1).to(classes.C.device)
-        inverse = torch.full_like(idxs, -1)
-        idxs[0] = classes.C[:, 1].argmax()  # most posterior
+        idxs = np.full(coords.shape[0], -1)
+        inverse = np.full_like(idxs, -1)
+        idxs[0] = coords[:, 1].argmax()  # most posterior
         inverse[idxs[0]] = 0
         for i in range(1, idxs.shape[0]):
-            dots = cos_angles[idxs[i - 1], inverse == -1]
-            next_idx = torch.nonzero(inverse == -1)[dots.argmax(), 0]
+            candidates = ranks[idxs[i - 1]]
+            next_idx = candidates[inverse[candidates] == -1][0]
             idxs[i] = next_idx
             inverse[next_idx] = i
 
+        idxs = torch.from_numpy(idxs).to(classes.C.device)
+        inverse = torch.from_numpy(inverse).to(classes.C.device)
+
         return idxs, inverse
     
     def determine_transition_probabilities(
         self,
         classes,
         idxs,
+        is_lower,
     ):
-        with open('fdi_pair_distrs.json', 'r') as f:
-            pair_normals = json.load(f)
-        means = torch.tensor(pair_normals['means']).to(classes.F.device)
-        covs = torch.tensor(pair_normals['covs']).to(classes.F.device)
-
-        offset = 16 * self.is_lower[0]
-        normals = MultivariateNormal(
-            loc=means[offset:offset + 16, offset:offset + 16, :2],
-            covariance_matrix=covs[offset:offset + 16, offset:offset + 16, :2, :2],
-        )
+        normals = fdi_pair_normals(bool(is_lower))
 
-        trans_log_probs = torch.zeros(idxs.shape[0] - 1, 16, 16).to(classes.F)
-        for i, (idx1, idx2) in enumerate(zip(idxs[:-1], idxs[1:])):
-            offsets = classes.C[idx2] - classes.C[idx1]
-            trans_log_probs[i] = normals.log_prob(offsets[:2])
+        offsets = classes.C[idxs[1:]] - classes.C[idxs[:-1]]
+        offsets = offsets[:, None, None, :2].cpu()
+        trans_log_probs = normals.log_prob(offsets)
 
         return trans_log_probs
     
@@ -224,35 +245,36 @@ class TeethInstSegDataModule(TeethSegDataModule):
         trans_log_probs,
         tooth_factor: float=4.0,
     ):
-        log_probs = torch.log(classes.F.softmax(dim=-1))
+        # Viterbi on CPU, as kernel launches dominate for 16 classes
+        log_probs = torch.log(classes.F.softmax(dim=-1)).cpu()
+        unary_costs = -tooth_factor * log_probs[idxs.cpu()]
 
-        q = torch.zeros_like(log_probs)
-        q[0] = -tooth_factor * log_probs[idxs[0]]
+        # transition costs from class in rows to class in columns
+        trans_costs = -trans_log_probs.cpu()
+        trans_costs[:, torch.arange(16), torch.arange(16)] = 40
 
-        up = torch.arange(16).to(classes.F.device)
-        p = torch.zeros_like(q).long()
-        p[0] = up
+        q = torch.zeros_like(unary_costs)
+        q[0] = unary_costs[0]
 
-        for i in range(1, classes.F.shape[0]):
-            for j in range(16):
-                prev_costs = q[i - 1]
-                trans_costs = -trans_log_probs[i - 1, :, j]
-                trans_costs[j] = 40
+        p = torch.zeros_like(q).long()
+        p[0] = torch.arange(16)
 
-                costs = prev_costs + trans_costs
-                m = costs.amin()
-                q[i, j] = m - tooth_factor * log_probs[idxs[i], j]
-                p[i, j] = costs.argmin()
+        for i in range(1, q.shape[0]):
+            costs = q[i - 1, :, None] + trans_costs[i - 1]
+            m, p[i] = costs.min(dim=0)
+            q[i] = m + unary_costs[i]
 
-        path = q[-1].argmin(keepdim=True)
-        for i in range(p.shape[0] - 1):
-            path = torch.cat((p[None, -1 - i, path[0]], path))
+        path = [q[-1].argmin().item()]
+        for i in range(p.shape[0] - 1, 0, -1):
+            path.insert(0, p[i, path[0]].item())
+        path = torch.tensor(path).to(classes.F.device)
 
         return path, q[-1].min()
     
     def teeth_classes_to_labels(
         self,
         classes: PointTensor,
+        is_lower: TensorType[torch.bool],
         method: Literal['argmax', 'mincost']='mincost',
     ):
         labels = torch.zeros(0, dtype=torch.int64).to(classes.F.device)
@@ -261,11 +283,11 @@ class TeethInstSegDataModule(TeethSegDataModule):
                 numbers = torch.argmax(classes.batch(b).F, axis=-1)
             elif method == 'mincost':
                 idxs, inverse = self.determine_seqence(classes.batch(b))
-                trans_log_probs = self.determine_transition_probabilities(classes.batch(b), idxs)
+                trans_log_probs = self.determine_transition_probabilities(classes.batch(b), idxs, is_lower)
                 path, min_cost = self.dynamic_programming(classes.batch(b), idxs, trans_log_probs)
                 numbers = path[inverse]
 
-            fdis = 11 + 20 * self.is_lower[0] + 10 * (numbers // 8) + (numbers % 8)
+            fdis = 11 + 20 * is_lower + 10 * (numbers // 8) + (numbers % 8)
             labels = torch.cat((labels, fdis))
             
         return classes.new_tensor(features=labels)
@@ -1,7 +1,5 @@
 from typing import Dict, List
 
-import numpy as np
-from scipy.optimize import linear_sum_assignment
 import torch
 from torchmetrics import Metric
 from torchmetrics.utilities import dim_zero_cat
@@ -49,87 +47,71 @@ class LandmarkMeanAveragePrecision(Metric):
         self.gt_batch_counts.append(torch.tensor(landmarks.C.shape[0]).to(landmarks.F))
 
     def voc_ap(self, rec, prec):
-        rec = rec.cpu().numpy()
-        prec = prec.cpu().numpy()
+        """Area under precision-recall curves along the last dimension."""
+        rec = rec.double()
+        prec = prec.double()
 
         # correct AP calculation
         # first append sentinel values at the end
-        mrec = np.concatenate(([0.], rec, [1.]))
-        mpre = np.concatenate(([0.], prec, [0.]))
+        zeros, ones = torch.zeros_like(rec[..., :1]), torch.ones_like(rec[..., :1])
+        mrec = torch.cat((zeros, rec, ones), dim=-1)
+        mpre = torch.cat((zeros, prec, zeros), dim=-1)
 
         # compute the precision envelope
-        for i in range(mpre.size - 1, 0, -1):
-            mpre[i - 1] = np.maximum(mpre[i - 1], mpre[i])
+        mpre = torch.flip(torch.cummax(torch.flip(mpre, [-1]), dim=-1)[0], [-1])
 
-        # to calculate area under PR curve, look for points
-        # where X axis (recall) changes value
-        i = np.where(mrec[1:] != mrec[:-1])[0]
+        # and sum (\Delta recall) * prec, which is zero where recall is constant
+        ap = torch.sum((mrec[..., 1:] - mrec[..., :-1]) * mpre[..., 1:], dim=-1)
 
-        # and sum (\Delta recall) * prec
-        ap = np.sum((mrec[i + 1] - mrec[i]) * mpre[i + 1])
-
-        return torch.tensor(ap)
+        return ap
 
     def eval_ap(
         self,
-        pred_coords,
-        pred_batch_idxs,
-        gt_coords,
-        gt_batch_idxs,
-        dist_thresh,
-    ):
-        batch_idxs = torch.unique(torch.cat((pred_batch_idxs, gt_batch_idxs)))
-
-        # construct gt objects
-        class_recs = {}  # {mesh idx: {'kp': kp list, 'det': matched list}}
-        npos = 0
-        for i in batch_idxs:
-            keypoints = gt_coords[gt_batch_idxs == i]
-            det = [False] * keypoints.shape[0]
-            npos += keypoints.shape[0]
-            class_recs[i.item()] = {'kp': keypoints, 'det': det}
-
-        # construct dets
-        mesh_idxs = []
-        confidence = []
-        KP = []
-        for i in batch_idxs:
-            for kp in pred_coords[pred_batch_idxs == i]:
-                mesh_idxs.append(i)
-                confidence.append(1.0)
-                KP.append(kp)
-        confidence = torch.tensor(confidence).to(pred_coords)
-        KP = torch.stack(KP)
-
-        # go down dets and mark TPs and FPs
+        pred_coords: TensorType['P', 3, torch.float32],
+        pred_batch_idxs: TensorType['P', torch.int64],
+        gt_coords: TensorType['G', 3, torch.float32],
+        gt_batch_idxs: TensorType['G', torch.int64],
+        num_batches: int,
+        dist_threshs: TensorType['T', torch.float32],
+    ) -> TensorType['T', torch.float64]:
+        # pad keypoints of each mesh to compute all distances at once
+        padded = []
+        for coords, batch_idxs in [
+            (pred_coords, pred_batch_idxs),
+            (gt_coords, gt_batch_idxs),
+        ]:
+            counts = torch.bincount(batch_idxs, minlength=num_batches)
+            offsets = torch.cumsum(counts, dim=0) - counts
+            mesh_idxs = torch.arange(batch_idxs.shape[0]).to(batch_idxs) - offsets[batch_idxs]
+            pad = torch.zeros(num_batches, max(1, counts.amax()), 3).to(coords)
+            pad[batch_idxs, mesh_idxs] = coords
+            padded.append((pad, mesh_idxs, counts))
+        (pred_pad, pred_mesh_idxs, _), (gt_pad, _, gt_counts) = padded
+
+        # determine closest gt keypoint of each detection
+        dists = torch.cdist(pred_pad, gt_pad, compute_mode='donot_use_mm_for_euclid_dist')
+        dists = dists[pred_batch_idxs, pred_mesh_idxs]
+        gt_mask = torch.arange(gt_pad.shape[1]).to(gt_counts) < gt_counts[pred_batch_idxs, None]
+        dists = torch.where(gt_mask, dists, torch.inf)
+        dmin, jmin = dists.min(dim=1)
+
+        # mark first detection in order of each gt keypoint within threshold as TP
         nd = pred_coords.shape[0]
-        tp = torch.zeros(nd)
-        fp = torch.zeros(nd)
-        for d in range(nd):
-            R = class_recs[pred_batch_idxs[d].item()]
-            kp = KP[d]
-            dmin = torch.inf
-            KPGT = R['kp']
-
-            if KPGT.numel() > 0:
-                distance = torch.linalg.norm(kp.reshape(-1, 3) - KPGT, axis=1)
-                dmin = min(distance)
-                jmin = torch.argmin(distance)
-
-            # print dmin
-            if dmin < dist_thresh:
-                if not R['det'][jmin]:
-                    tp[d] = 1.
-                    R['det'][jmin] = 1
-                else:
-                    fp[d] = 1.
-            else:
-                fp[d] = 1.
+        det_idxs = torch.arange(nd).to(pred_batch_idxs)
+        within = dmin[None] < dist_threshs[:, None]
+        keys = (pred_batch_idxs * gt_pad.shape[1] + jmin).expand(dist_threshs.shape[0], -1)
+        first_det_idxs = torch.full(
+            (dist_threshs.shape[0], num_batches * gt_pad.shape[1]), nd,
+        ).to(det_idxs).scatter_reduce(
+            dim=1, index=keys, src=torch.where(within, det_idxs, nd), reduce='amin',
+        )
+        tp = within & (torch.gather(first_det_idxs, 1, keys) == det_idxs)
+        fp = ~tp
 
         # compute precision recall
-        fp = torch.cumsum(fp, dim=0)
-        tp = torch.cumsum(tp, dim=0)
-        rec = tp / float(npos)
+        fp = torch.cumsum(fp.float(), dim=1)
+        tp = torch.cumsum(tp.float(), dim=1)
+        rec = tp / float(gt_coords.shape[0])
         
         prec = tp / torch.maximum(tp + fp, torch.tensor(1e-9))
         ap = self.voc_ap(rec, prec)
@@ -138,41 +120,44 @@ class LandmarkMeanAveragePrecision(Metric):
 
     def eval_map(
         self,
-        dist_thresh: float,
-    ):
-        aps = []
-        for cls in torch.unique(self.gt_classes):
-            pred_coords = self.pred_coords[self.pred_classes == cls]            
-            pred_batch_idxs = torch.arange(self.pred_batch_counts.shape[0]).to(self.pred_classes)
-            pred_batch_idxs = pred_batch_idxs.repeat_interleave(self.pred_batch_counts)
-            pred_batch_idxs = pred_batch_idxs[self.pred_classes == cls]
-
-            gt_coords = self.gt_coords[self.gt_classes == cls]            
-            gt_batch_idxs = torch.arange(self.gt_batch_counts.shape[0]).to(self.gt_classes)
-            gt_batch_idxs = gt_batch_idxs.repeat_interleave(self.gt_batch_counts)
-            gt_batch_idxs = gt_batch_idxs[self.gt_classes == cls]
-
+        pred_coords: TensorType['P', 3, torch.float32],
+        pred_classes: TensorType['P', torch.int64],
+        pred_batch_counts: TensorType['B', torch.int64],
+        gt_coords: TensorType['G', 3, torch.float32],
+        gt_classes: TensorType['G', torch.int64],
+        gt_batch_counts: TensorType['B', torch.int64],
+    ) -> TensorType['T', 'C', torch.float64]:
+        dist_threshs = torch.tensor(self.dist_threshs).to(pred_coords)
+        pred_batch_idxs = torch.arange(pred_batch_counts.shape[0]).to(pred_classes)
+        pred_batch_idxs = pred_batch_idxs.repeat_interleave(pred_batch_counts)
+        gt_batch_idxs = torch.arange(gt_batch_counts.shape[0]).to(gt_classes)
+        gt_batch_idxs = gt_batch_idxs.repeat_interleave(gt_batch_counts)
+
+        aps = torch.zeros(dist_threshs.shape[0], 0).to(pred_coords.device, torch.float64)
+        for cls in torch.unique(gt_classes):
             ap = self.eval_ap(
-                pred_coords, pred_batch_idxs, gt_coords, gt_batch_idxs, dist_thresh,
+                pred_coords[pred_classes == cls],
+                pred_batch_idxs[pred_classes == cls],
+                gt_coords[gt_classes == cls],
+                gt_batch_idxs[gt_classes == cls],
+                gt_batch_counts.shape[0],
+                dist_threshs,
             )
-            aps.append(ap)
-
-        return torch.stack(aps)
-
-    def compute(self) -> Dict[str, TensorType[torch.float32]]:
-        self.pred_coords = dim_zero_cat(self.pred_coords)
-        self.pred_classes = dim_zero_cat(self.pred_classes)
-        self.pred_batch_counts = dim_zero_cat(self.pred_batch_counts)
-        self.gt_coords = dim_zero_cat(self.gt_coords)
-        self.gt_classes = dim_zero_cat(self.gt_classes)
-        self.gt_batch_counts = dim_zero_cat(self.gt_batch_counts)
-
-        out_dict = {}
-        for dist_thresh in self.dist_threshs:
-            aps = self.eval_map(dist_thresh)
-            print(dist_thresh, ':', aps.mean(), aps)
-            out_dict[f'mAP_{dist_thresh:.2f}'] = aps.mean()
-        
+            aps = torch.column_stack((aps, ap))
+
+        return aps
+
+    def compute(self) -> TensorType[torch.float64]:
+        aps = self.eval_map(
+            dim_zero_cat(self.pred_coords),
+            dim_zero_cat(self.pred_classes),
+            dim_zero_cat(self.pred_batch_counts),
+            dim_zero_cat(self.gt_coords),
+            dim_zero_cat(self.gt_classes),
+            dim_zero_cat(self.gt_batch_counts),
+        )
+
+        for dist_thresh, thresh_aps in zip(self.dist_threshs, aps):
+            print(dist_thresh, ':', thresh_aps.mean(), thresh_aps)
         
-        return torch.tensor(sum(out_dict.values()) / len(out_dict))
- 
\ No newline at end of file
+        return aps.mean(dim=1).mean()
@@ -39,25 +39,31 @@ class ToothF1Score(Metric):
             self.tooth_fdi_fn += num_true
             return
 
-        ious = torch.zeros((num_pred, num_true)).to(instances.F.device, torch.float32)
-        tp_idxs = set()
-        for i in range(num_pred):
-            for j in range(num_true):
-                if j in tp_idxs:
-                    continue
+        # determine intersections of all instance pairs in one contingency table
+        table = torch.bincount(
+            (pred_instances.F + 1) * (num_true + 1) + (instances.F + 1),
+            minlength=(num_pred + 1) * (num_true + 1),
+        ).reshape(num_pred + 1, num_true + 1)
+        inter = table[1:, 1:]
+        union = table[1:].sum(1, keepdim=True) + table[:, 1:].sum(0, keepdim=True) - inter
+        all_ious = (inter / union).to(torch.float32)
 
-                pred_pos = pred_instances.F == i
-                target_pos = instances.F == j
-                tp = (pred_pos & target_pos).sum()
-                fp = (pred_pos & ~target_pos).sum()
-                fn = (~pred_pos & target_pos).sum()
-                
-                iou = tp / (tp + fp + fn)
-                ious[i, j] = iou
+        # greedily match each prediction with first unmatched target
+        candidates = (all_ious >= self.iou_thresh).cpu()
+        matched = torch.zeros(candidates.shape[1], dtype=torch.bool)
+        match_idxs = []
+        for i in range(candidates.shape[0]):
+            js = torch.nonzero(candidates[i] & ~matched)[:, 0]
+            if js.shape[0] == 0:
+                continue
 
-                if iou >= self.iou_thresh:
-                    tp_idxs.add(j)
-                    break                    
+            matched[js[0]] = True
+            match_idxs.append((i, js[0].item()))
+
+        ious = torch.zeros_like(all_ious)
+        if match_idxs:
+            match_idxs = torch.tensor(match_idxs).to(ious.device)
+            ious[match_idxs[:, 0], match_idxs[:, 1]] = all_ious[match_idxs[:, 0], match_idxs[:, 1]]
         
         fp = (ious.amax(1) < self.iou_thresh).sum()
         fn = (ious.amax(0) < self.iou_thresh).sum()
@@ -0,0 +1,109 @@
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Union
+
+import torch
+
+
+class CheckpointRegistry:
+    """Loads every checkpoint once and hands out state dicts of submodules.
+
+    Besides PyTorch Lightning checkpoints, packed checkpoints are supported,
+    which store the state dict of each submodule of a model under its
+    attribute name, so no filtering of parameters is needed when loading.
+
+    Each user of a checkpoint acquires it first and releases it when done,
+    such that a checkpoint shared by several stages is freed after the last.
+    """
+
+    packed_key = 'packed_state_dicts'
+
+    def __init__(
+        self,
+        mmap: bool=False,
+    ):
+        self.mmap = mmap
+        self.checkpoints = {}
+        self.groups = {}
+        self.stripped = {}
+        self.users = Counter()
+
+    def load(self, path: Union[str, Path]) -> Dict[str, Any]:
+        path = str(path)
+        if path not in self.checkpoints:
+            self.checkpoints[path] = torch.load(
+                path, map_location='cpu', mmap=self.mmap,
+            )
+
+        return self.checkpoints[path]
+
+    def is_packed(self, path: Union[str, Path]) -> bool:
+        return self.packed_key in self.load(path)
+
+    def packed(
+        self,
+        path: Union[str, Path],
+        name: str,
+    ) -> Dict[str, torch.Tensor]:
+        return self.load(path)[self.packed_key][name]
+
+    def submodule(
+        self,
+        path: Union[str, Path],
+        name: str,
+    ) -> Dict[str, torch.Tensor]:
+        """Parameters of top-level submodule with given name, prefix removed."""
+        path = str(path)
+        if path not in self.groups:
+            groups = {}
+            for k, v in self.load(path)['state_dict'].items():
+                module, key = k.split('.', 1)
+                groups.setdefault(module, {})[key] = v
+            self.groups[path] = groups
+
+        return self.groups[path].get(name, {})
+
+    def strip(
+        self,
+        path: Union[str, Path],
+    ) -> Dict[str, torch.Tensor]:
+        """All parameters with the name of their top-level submodule removed."""
+        path = str(path)
+        if path not in self.stripped:
+            self.stripped[path] = {
+                k.split('.', 1)[1]: v
+                for k, v in self.load(path)['state_dict'].items()
+            }
+
+        return self.stripped[path]
+
+    def acquire(self, path: Union[str, Path]):
+        self.users[str(path)] += 1
+
+    def release(self, path: Union[str, Path]):
+        """Frees the checkpoint at path once all its users released it."""
+        path = str(path)
+        self.users[path] -= 1
+        if self.users[path] > 0:
+            return
+
+        del self.users[path]
+        self.checkpoints.pop(path, None)
+        self.groups.pop(path, None)
+        self.stripped.pop(path, None)
+
+    def clear(self):
+        self.users.clear()
+        self.checkpoints.clear()
+        self.groups.clear()
+        self.stripped.clear()
+
+    @classmethod
+    def save_packed(
+        cls,
+        model: torch.nn.Module,
+        path: Union[str, Path],
+    ):
+        torch.save({cls.packed_key: {
+            name: module.state_dict() for name, module in model.named_children()
+        }}, path)
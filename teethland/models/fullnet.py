@@ -1,8 +1,8 @@
 import json
 from pathlib import Path
-from typing import Any, Dict, Optional, Tuple, Union
+import traceback
+from typing import Any, Dict, List, Optional, Tuple, Union
 
-import pymeshlab
 import pytorch_lightning as pl
 import torch
 from torch_scatter import scatter_mean
@@ -12,35 +12,71 @@ import teethland
 from teethland import PointTensor
 import teethland.data.transforms as T
 from teethland.cluster import learned_region_cluster
+from teethland.models.checkpoints import CheckpointRegistry
 import teethland.nn as nn
 
 
+def mask_intersections(
+    instance_idxs: TensorType['M', torch.int64],
+    point_idxs: TensorType['M', torch.int64],
+    num_instances: int,
+) -> Tuple[TensorType['K', 'K', torch.int64], TensorType['K', torch.int64]]:
+    # sparse (instance x point) incidence matrix without duplicate entries
+    num_points = point_idxs.amax() + 1 if point_idxs.numel() else 1
+    pairs = torch.unique(instance_idxs * num_points + point_idxs)
+    incidence = torch.sparse_coo_tensor(
+        indices=torch.stack((pairs // num_points, pairs % num_points)),
+        values=torch.ones_like(pairs, dtype=torch.float64),
+        size=(num_instances, int(num_points)),
+        is_coalesced=True,
+    )
+
+    # number of shared points of each instance pair with one matmul
+    inters = torch.sparse.mm(incidence, incidence.t()).to_dense().long()
+    counts = torch.bincount(pairs // num_points, minlength=num_instances)
+
+    return inters, counts
+
+
+def greedy_suppression(
+    ious: TensorType['K', 'K', torch.float32],
+    keep: TensorType['K', torch.bool],
+    iou_thresh: float,
+) -> TensorType['K', torch.bool]:
+    suppress = (ious >= iou_thresh).cpu().numpy()
+    keep_np = keep.cpu().numpy().copy()
+    for index in range(keep_np.shape[0]):
+        if keep_np[index]:
+            keep_np &= ~suppress[index]
+
+    return torch.from_numpy(keep_np).to(keep.device)
+
+
 def tta_nms(
     clusters: PointTensor,
     labels: PointTensor,
     iou_thresh: float=0.8,
 ):
-    clusters1, clusters2 = clusters.batch(0), clusters.batch(1)
-
     num_instances = labels.batch_counts.sum()
-    ious = torch.zeros(num_instances, num_instances).to(clusters.F.device)
-    for i in range(labels.batch_counts[0]):
-        mask1 = clusters1.F == i
-        for j in range(labels.batch_counts[1]):
-            mask2 = clusters2.F == (labels.batch_counts[0] + j)
-
-            inter = (mask1 & mask2).sum()
-            union = (mask1 | mask2).sum()
-            iou = inter / (union + 1e-6)
-            ious[i, labels.batch_counts[0] + j] = iou
-
-    keep = torch.ones(labels.batch_counts.sum()).bool().to(clusters.F.device)
-    for index, iou in enumerate(ious):
-        if not keep[index]:
-            continue
-
-        condition = iou >= iou_thresh
-        keep = keep & ~condition
+    num_instances1 = labels.batch_counts[0]
+
+    # point index within the batch element of each clustered point
+    batch_offsets = clusters.batch_counts.cumsum(dim=0) - clusters.batch_counts
+    point_idxs = torch.arange(clusters.num_points).to(clusters.F.device)
+    point_idxs -= batch_offsets[clusters.batch_indices]
+    mask = clusters.F >= 0
+    inters, counts = mask_intersections(
+        clusters.F[mask], point_idxs[mask], int(num_instances),
+    )
+
+    # only compare instances of the first to instances of the second batch
+    unions = counts[:, None] + counts[None] - inters
+    ious = inters.float() / (unions.float() + 1e-6)
+    ious[num_instances1:] = 0
+    ious[:, :num_instances1] = 0
+
+    keep = torch.ones(num_instances).bool().to(clusters.F.device)
+    keep = greedy_suppression(ious, keep, iou_thresh)
 
     return torch.nonzero(keep)[:, 0]
 
@@ -52,37 +88,56 @@ def instance_nms(
     iou_thresh: float=0.3,
     score_thresh: float=0.5,
 ):
-    fg_point_idxs, scores = [], torch.empty(0).to(probs.F)
-    for i in range(probs.batch_size):
-        fg_mask = probs.batch(i).F >= conf_thresh
-        fg_idxs = point_idxs[i][fg_mask]
-        fg_point_idxs.append(set(fg_idxs.cpu().tolist()))
-
-        score = probs.batch(i).F[fg_mask].mean()
-        scores = torch.cat((scores, score[None]))
-
+    fg_mask = probs.F.reshape(point_idxs.shape) >= conf_thresh
+    fg_probs = torch.where(fg_mask, probs.F.reshape(point_idxs.shape), 0)
+    scores = fg_probs.sum(dim=1) / fg_mask.sum(dim=1)
     sort_index = torch.argsort(scores, descending=True)
-    fg_point_idxs = [fg_point_idxs[idx.item()] for idx in sort_index]
-    
-    ious = torch.zeros(probs.batch_size, probs.batch_size).to(probs.F)
-    for i in range(probs.batch_size):
-        for j in range(i + 1, probs.batch_size):
-            inter = len(fg_point_idxs[i] & fg_point_idxs[j])
-            union = len(fg_point_idxs[i] | fg_point_idxs[j])
-            iou = inter / (union + 1e-6)
-            ious[i, j] = iou
 
-    keep = scores[sort_index] >= score_thresh
-    for index, iou in enumerate(ious):
-        if not keep[index]:
-            continue
+    # IoUs of foreground points between proposals in descending score order
+    instance_idxs = torch.argsort(sort_index)[:, None].expand(-1, point_idxs.shape[1])
+    inters, counts = mask_intersections(
+        instance_idxs[fg_mask], point_idxs[fg_mask], probs.batch_size,
+    )
+    unions = counts[:, None] + counts[None] - inters
+    ious = (inters.double() / (unions.double() + 1e-6)).to(probs.F)
+    ious = torch.triu(ious, diagonal=1)
 
-        condition = iou >= iou_thresh
-        keep = keep & ~condition
+    keep = scores[sort_index] >= score_thresh
+    keep = greedy_suppression(ious, keep, iou_thresh)
 
     return sort_index[keep].unique()
 
 
+def split_scans(
+    pt: PointTensor,
+    scan_counts: List[int],
+) -> List[PointTensor]:
+    """Split batch elements of PointTensor into consecutive groups per scan."""
+    batch_counts = pt.batch_counts.split(scan_counts)
+    point_counts = [counts.sum().item() for counts in batch_counts]
+
+    return [
+        PointTensor(coordinates=coords, features=feats, batch_counts=counts)
+        for coords, feats, counts in zip(
+            pt.C.split(point_counts), pt.F.split(point_counts), batch_counts,
+        )
+    ]
+
+
+def scan_points(
+    x: PointTensor,
+    batch_idx: int,
+) -> PointTensor:
+    """Select points of one scan, keeping its downsampling indices."""
+    x_scan = x.batch(batch_idx)
+    offset = x.batch_counts[:batch_idx].sum()
+    for key in ['instseg_downsample_idxs', 'landmarks_downsample_idxs']:
+        idxs = x.cache[key]
+        x_scan.cache[key] = idxs[x.batch_indices[idxs] == batch_idx] - offset
+
+    return x_scan
+
+
 class FullNet(pl.LightningModule):
 
     def __init__(
@@ -100,10 +155,16 @@ class FullNet(pl.LightningModule):
         post_process_seg: bool,
         post_process_labels: bool,
         out_dir: Path,
+        mmap_checkpoints: bool=False,
         **kwargs,
     ) -> None:
         super().__init__()
 
+        self.checkpoints = CheckpointRegistry(mmap=mmap_checkpoints)
+        # a checkpoint shared by stages is released after the last stage
+        for cfg in ([align] if do_align else []) + [instseg, single_tooth]:
+            self.checkpoints.acquire(cfg['checkpoint_path'])
+
         # align stage
         if do_align:
             ckpt = align.pop('checkpoint_path')
@@ -116,6 +177,7 @@ class FullNet(pl.LightningModule):
 
             self.align_head = nn.MLP(self.align_backbone.enc_channels, 256, 9)
             self.load_ckpt(self.align_head, ckpt)
+            self.checkpoints.release(ckpt)
             
         # instance segmentation stage
         ckpt = instseg.pop('checkpoint_path')
@@ -140,6 +202,7 @@ class FullNet(pl.LightningModule):
                 out_channels=4,
             )
             self.load_ckpt('type_model', ckpt)
+        self.checkpoints.release(ckpt)
         
         # landmark prediction stage
         ckpt = single_tooth.pop('checkpoint_path')
@@ -157,6 +220,7 @@ class FullNet(pl.LightningModule):
                 out_channels=4,
             )
             self.load_ckpt(self.attribute_model, ckpt)
+        self.checkpoints.release(ckpt)
 
         self.gen_proposals = T.GenerateProposals(proposal_points, max_proposals=100)
         self.do_align = do_align
@@ -177,20 +241,27 @@ class FullNet(pl.LightningModule):
     def load_ckpt(self, model, ckpt: str):
         if not ckpt:
             return
-        
-        ckpt = torch.load(ckpt)['state_dict']
-        
+
         if isinstance(model, str):
-            state_dict = self.__getattr__(model).state_dict()
-            ckpt = {k.split('.', 1)[1]: v for k, v in ckpt.items() if model in k}
-            self.__getattr__(model).load_state_dict(ckpt)
-            self.__getattr__(model).requires_grad_(False)
+            name = model
         else:
-            state_dict = model.state_dict()            
-            ckpt = {k.split('.', 1)[1]: v for k, v in ckpt.items()}
-            ckpt = {k: v for k, v in ckpt.items() if k in state_dict}
-            model.load_state_dict(ckpt)
-            model.requires_grad_(False)
+            name = next(n for n, m in self.named_children() if m is model)
+        module = self.__getattr__(name)
+        
+        if self.checkpoints.is_packed(ckpt):
+            state_dict = self.checkpoints.packed(ckpt, name)
+        elif isinstance(model, str):
+            state_dict = self.checkpoints.submodule(ckpt, name)
+        else:
+            keys = module.state_dict().keys()
+            state_dict = self.checkpoints.strip(ckpt)
+            state_dict = {k: v for k, v in state_dict.items() if k in keys}
+
+        module.load_state_dict(state_dict)
+        module.requires_grad_(False)
+
+    def save_packed(self, path: Path):
+        CheckpointRegistry.save_packed(self, path)
 
     def align_stage(
         self,
@@ -255,42 +326,75 @@ class FullNet(pl.LightningModule):
 
     def instances_stage(
         self,
-        x: PointTensor,
+        xs: List[PointTensor],
+        scans: List[Dict[str, Any]],
     ) -> Tuple[
-        PointTensor, 
-        Union[PointTensor, Tuple[PointTensor, PointTensor]],
-        PointTensor,
+        List[PointTensor],
+        List[Union[PointTensor, Tuple[PointTensor, PointTensor]]],
+        List[PointTensor],
     ]:
-        # downsample
-        x_down = x[x.cache['instseg_downsample_idxs']]
-        x_down = x_down.new_tensor(features=x_down.F[:, :6])
-
-        # test-time augmentation by horizontally flipping
-        if self.tta:
-            x_down_flip = x_down.clone()
-            x_down_flip._coordinates[:, 0] *= -1
-            x_down_flip.F[:, 0] *= -1
-            x_down_flip.F[:, 3] *= -1
-
-            x_down = teethland.stack((x_down, x_down_flip))
+        # downsample and test-time augmentation by horizontally flipping
+        x_downs = []
+        for x in xs:
+            x_down = x[x.cache['instseg_downsample_idxs']]
+            x_down = x_down.new_tensor(features=x_down.F[:, :6])
+            x_downs.append(x_down)
+
+            if self.tta:
+                x_down_flip = x_down.clone()
+                x_down_flip._coordinates[:, 0] *= -1
+                x_down_flip.F[:, 0] *= -1
+                x_down_flip.F[:, 3] *= -1
+                x_downs.append(x_down_flip)
         
-        # forward pass
+        # forward pass of all scans at once
+        x_down = teethland.stack(x_downs)
         if self.is_panoptic:
             _, (spatial_embeds, seeds, features, features2) = self.instances_model(x_down)
         else:
             _, (spatial_embeds, seeds, features) = self.instances_model(x_down)
 
+        # post-process each scan
+        scan_counts = [1 + self.tta] * len(xs)
+        spatial_embeds = split_scans(spatial_embeds, scan_counts)
+        seeds = split_scans(seeds, scan_counts)
+        features = split_scans(features, scan_counts)
+        if self.is_panoptic:
+            features = list(zip(features, split_scans(features2, scan_counts)))
+
+        instances, labels = [], []
+        for b, (x, scan) in enumerate(zip(xs, scans)):
+            scan_instances, scan_labels = self.instances_process(
+                x, scan, spatial_embeds[b], seeds[b], features[b],
+            )
+            instances.append(scan_instances)
+            labels.append(scan_labels)
+
+        return instances, features, labels
+
+    def instances_process(
+        self,
+        x: PointTensor,
+        scan: Dict[str, Any],
+        spatial_embeds: PointTensor,
+        seeds: PointTensor,
+        features: Union[PointTensor, Tuple[PointTensor, PointTensor]],
+    ) -> Tuple[PointTensor, PointTensor]:
+        if self.is_panoptic:
+            features = features[0]
+
         # cluster
         offsets = spatial_embeds.new_tensor(features=spatial_embeds.F[:, :3])
         sigmas = spatial_embeds.new_tensor(features=spatial_embeds.F[:, 3:])
         clusters = learned_region_cluster(
-            offsets, sigmas, seeds,
+            offsets, sigmas, seeds, batched=seeds.F.is_cuda,
         )
         clusters._coordinates[clusters.batch_counts[0]:, 0] *= -1
 
         _, classes = self.fdi_model(features, clusters)
         labels = self.trainer.datamodule.teeth_classes_to_labels(
-            classes, method='mincost' if self.post_process_labels else 'argmax',
+            classes, scan['is_lower'],
+            method='mincost' if self.post_process_labels else 'argmax',
         )
 
         if self.tta:
@@ -303,29 +407,26 @@ class FullNet(pl.LightningModule):
                     features=torch.maximum(clusters.batch(0).F, clusters.batch(1).F),
                 )
                 labels._batch_counts = labels.batch_counts.sum()[None]
+                labels._batch_indices = torch.zeros_like(labels.batch_indices)
 
             clusters.F = torch.unique(clusters.F, return_inverse=True)[1] - 1
 
-        if self.is_panoptic:
-            features = features, features2
-
         # interpolate clusters back to original scan
         instances = clusters.interpolate(teethland.stack([x for _ in labels.batch_counts]))
 
-        return instances, features, labels
+        return instances, labels
     
     def landmarks_process(
         self,
+        scan: Dict[str, Any],
         proposals,
-        point_offsets,
+        points_offsets,
         keep_idxs,
         labels,
         affine,
     ):        
-        print('start landmarks')
         # apply NMS selection
         proposals = proposals.batch(keep_idxs)
-        points_offsets = preds[1:]
         points_offsets = [offsets.batch(keep_idxs) for offsets in points_offsets]
 
         # process point-level landmarks
@@ -350,83 +451,136 @@ class FullNet(pl.LightningModule):
             landmarks_list.append(landmarks)
         landmarks = teethland.cat(landmarks_list)
 
-        landmarks = self.trainer.datamodule.process_landmarks(labels, affine, landmarks)
+        landmarks = self.trainer.datamodule.process_landmarks(scan, labels, affine, landmarks)
 
         return landmarks
-    
-    def single_tooth_stage(
+
+    def generate_proposals(
         self,
-        x: PointTensor,
+        x_down: PointTensor,
         instances: PointTensor,
-        features: Union[PointTensor, Tuple[PointTensor, PointTensor]],
         labels: PointTensor,
-        affine: TensorType[4, 4, torch.float32],
-    ) -> Tuple[PointTensor, PointTensor, Optional[PointTensor]]:
-        x_down = x[x.cache['landmarks_downsample_idxs']]
-        instances = teethland.stack(([
-            instances.batch(i)[x.cache['landmarks_downsample_idxs']]
-            for i in range(instances.batch_size)
-        ]))
+    ) -> Tuple[PointTensor, TensorType['B', 'P', torch.int64]]:
+        data_dict = {
+            'points': x_down.C.cpu().numpy(),
+            'instances': instances.F.cpu().numpy(),
+            'instance_centroids': labels.C.cpu().numpy(),
+            'normals': x_down.F[:, 3:6].cpu().numpy(),
+            'colors': x_down.F[:, 6:].cpu().numpy(),
+        }
+        data_dict = self.gen_proposals(**data_dict)
+        points = torch.from_numpy(data_dict['points']).to(x_down.C)
+        normals = torch.from_numpy(data_dict['normals']).to(x_down.C)
+        colors = torch.from_numpy(data_dict['colors']).to(x_down.C)
+        centroids = torch.from_numpy(data_dict['instance_centroids']).to(x_down.C)
+        proposals = PointTensor(
+            coordinates=points.reshape(-1, 3),
+            features=torch.column_stack((
+                points.reshape(-1, 3),
+                normals.reshape(-1, 3),
+                colors.reshape(-1, 3) if colors.numel() else points.reshape(-1, 3)[:, :0],
+                (points - centroids[:, None]).reshape(-1, 3),
+            )),
+            batch_counts=torch.tensor([points.shape[1]]*points.shape[0]).to(x_down.C.device),
+        )
+        point_idxs = torch.from_numpy(data_dict['point_idxs']).to(x_down.C.device)
+
+        return proposals, point_idxs
+    
+    def single_tooth_stage(
+        self,
+        xs: List[PointTensor],
+        scans: List[Dict[str, Any]],
+        instances: List[PointTensor],
+        features: List[Union[PointTensor, Tuple[PointTensor, PointTensor]]],
+        labels: List[PointTensor],
+        affines: List[TensorType[4, 4, torch.float32]],
+    ) -> List[Tuple[PointTensor, PointTensor, Optional[PointTensor]]]:
+        x_downs = [x[x.cache['landmarks_downsample_idxs']] for x in xs]
+        instances = [teethland.stack(([
+            scan_instances.batch(i)[x.cache['landmarks_downsample_idxs']]
+            for i in range(scan_instances.batch_size)
+        ])) for x, scan_instances in zip(xs, instances)]
         
-        # generate proposals based on predicted instances
         for _ in range(self.stage2_iters):
-            data_dict = {
-                'points': x_down.C.cpu().numpy(),
-                'instances': instances.F.cpu().numpy(),
-                'instance_centroids': labels.C.cpu().numpy(),
-                'normals': x_down.F[:, 3:6].cpu().numpy(),
-                'colors': x_down.F[:, 6:].cpu().numpy(),
-            }
-            data_dict = self.gen_proposals(**data_dict)
-            points = torch.from_numpy(data_dict['points']).to(x.C)
-            normals = torch.from_numpy(data_dict['normals']).to(x.C)
-            colors = torch.from_numpy(data_dict['colors']).to(x.C)
-            centroids = torch.from_numpy(data_dict['instance_centroids']).to(x.C)
-            proposals = PointTensor(
-                coordinates=points.reshape(-1, 3),
-                features=torch.column_stack((
-                    points.reshape(-1, 3),
-                    normals.reshape(-1, 3),
-                    colors.reshape(-1, 3) if colors.numel() else points.reshape(-1, 3)[:, :0],
-                    (points - centroids[:, None]).reshape(-1, 3),
-                )),
-                batch_counts=torch.tensor([points.shape[1]]*points.shape[0]).to(x.C.device),
-            )
-
-            # run the proposals through the models
-            _, preds = self.single_tooth_model(proposals)
-            seg = preds[0] if isinstance(preds, list) else preds
-
-            if seg.F.shape[1] == 1:
-                probs = seg.new_tensor(features=torch.sigmoid(seg.F[:, 0]))
+            # generate proposals based on predicted instances
+            proposals, point_idxs = zip(*[
+                self.generate_proposals(x_down, scan_instances, scan_labels)
+                for x_down, scan_instances, scan_labels in zip(x_downs, instances, labels)
+            ])
+
+            # run the proposals of all scans through the models at once
+            _, preds = self.single_tooth_model(teethland.stack(proposals))
+            scan_counts = [scan_proposals.batch_size for scan_proposals in proposals]
+            if isinstance(preds, list):
+                preds = [split_scans(pred, scan_counts) for pred in preds]
+                preds = [list(scan_preds) for scan_preds in zip(*preds)]
             else:
-                probs = seg.new_tensor(features=1 - torch.softmax(seg.F, dim=-1)[:, 0])
+                preds = split_scans(preds, scan_counts)
+
+            keep_idxs, probs = [], []
+            for b in range(len(xs)):
+                seg = preds[b][0] if isinstance(preds[b], list) else preds[b]
+
+                if seg.F.shape[1] == 1:
+                    scan_probs = seg.new_tensor(features=torch.sigmoid(seg.F[:, 0]))
+                else:
+                    scan_probs = seg.new_tensor(features=1 - torch.softmax(seg.F, dim=-1)[:, 0])
+
+                # apply non-maximum suppression to remove redundant instances
+                scan_keep_idxs = instance_nms(scan_probs, point_idxs[b])
+                instances[b].F[~torch.any(instances[b].F == scan_keep_idxs[:, None], dim=0)] = -1
+                instances[b].F = torch.unique(instances[b].F, return_inverse=True)[1] - 1
+                labels[b] = labels[b][scan_keep_idxs]
+                scan_probs = scan_probs.batch(scan_keep_idxs)
+
+                # update the centroids for the second run
+                labels[b]._coordinates = scatter_mean(
+                    src=scan_probs.C[scan_probs.F >= 0.5],
+                    index=scan_probs.batch_indices[scan_probs.F >= 0.5],
+                    dim=0,
+                )
 
-            # apply non-maximum suppression to remove redundant instances
-            point_idxs = torch.from_numpy(data_dict['point_idxs']).to(seg.F.device)
-            keep_idxs = instance_nms(probs, point_idxs)
-            instances.F[~torch.any(instances.F == keep_idxs[:, None], dim=0)] = -1
-            instances.F = torch.unique(instances.F, return_inverse=True)[1] - 1
-            labels = labels[keep_idxs]
-            probs = probs.batch(keep_idxs)
+                keep_idxs.append(scan_keep_idxs)
+                probs.append(scan_probs)
 
-            # update the centroids for the second run
-            labels._coordinates = scatter_mean(
-                src=probs.C[probs.F >= 0.5],
-                index=probs.batch_indices[probs.F >= 0.5],
-                dim=0,
+        return [
+            self.single_tooth_process(*args) for args in zip(
+                xs, scans, features, labels, affines, proposals, preds, probs, keep_idxs,
             )
+        ]
+
+    def single_tooth_process(
+        self,
+        x: PointTensor,
+        scan: Dict[str, Any],
+        features: Union[PointTensor, Tuple[PointTensor, PointTensor]],
+        labels: PointTensor,
+        affine: TensorType[4, 4, torch.float32],
+        proposals: PointTensor,
+        preds: Union[PointTensor, List[PointTensor]],
+        probs: PointTensor,
+        keep_idxs: TensorType['K', torch.int64],
+    ) -> Tuple[PointTensor, PointTensor, Optional[PointTensor]]:
+        seg = preds[0] if isinstance(preds, list) else preds
+
+        # index proposals once, so all heads share KD-trees and interpolation weights
+        seg.cache.spatial_index = seg.spatial_index
+        sources = [seg.batch(b) for b in range(seg.batch_size)]
+        kept_sources = [sources[b] for b in keep_idxs.tolist()]
 
         # interpolate segmentations to original points
         instances = torch.full_like(x.F[:, 0], -1).long()
         max_probs = torch.zeros_like(instances).float()
-        for b in range(probs.batch_size):
-            interp = probs.batch(b).interpolate(x, dist_thresh=0.03).F
+        for b, source in enumerate(kept_sources):
+            interp = source.new_tensor(features=probs.batch(b).F).interpolate(
+                x, dist_thresh=0.03, index=True, cache=True,
+            ).F
             instances = torch.where(interp > max_probs, b, instances)
             max_probs = torch.maximum(max_probs, interp)
         instances = x.new_tensor(features=instances)
         if self.post_process_seg:
-            instances = self.trainer.datamodule.process_instances(instances, max_probs)
+            instances = self.trainer.datamodule.process_instances(scan, instances, max_probs)
         else:
             instances.F = torch.where(max_probs >= 0.5, instances.F, -1)
         
@@ -440,16 +594,17 @@ class FullNet(pl.LightningModule):
         clusters = instances[x.cache['instseg_downsample_idxs']]
         _, classes = self.fdi_model(features.batch(0), clusters)
         fdis = self.trainer.datamodule.teeth_classes_to_labels(
-            classes, method='mincost' if self.post_process_labels else 'argmax',
+            classes, scan['is_lower'],
+            method='mincost' if self.post_process_labels else 'argmax',
         )
 
         if seg.F.shape[1] > 1:  # multi-class semantic segmentation
-            seg = seg.batch(keep_idxs)
-
             max_probs = torch.zeros((instances.F.shape[0], seg.F.shape[1])).to(x.C)
-            for b in range(seg.batch_size):
-                probs = torch.softmax(seg.batch(b).F, axis=1)
-                interp = seg.batch(b).new_tensor(features=probs).interpolate(x, dist_thresh=0.03).F
+            for source in kept_sources:
+                class_probs = torch.softmax(source.F, axis=1)
+                interp = source.new_tensor(features=class_probs).interpolate(
+                    x, dist_thresh=0.03, index=True, cache=True,
+                ).F
                 max_probs = torch.maximum(max_probs, interp)
 
             instances = instances.new_tensor(features=torch.column_stack(
@@ -470,8 +625,10 @@ class FullNet(pl.LightningModule):
             seg_probs = seg_probs.batch(keep_idxs)
             
             max_probs = torch.zeros_like(instances.F).float()
-            for b in range(seg_probs.batch_size):
-                interp = seg_probs.batch(b).interpolate(x, dist_thresh=0.03).F
+            for b, source in enumerate(kept_sources):
+                interp = source.new_tensor(features=seg_probs.batch(b).F).interpolate(
+                    x, dist_thresh=0.03, index=True, cache=True,
+                ).F
                 max_probs = torch.maximum(max_probs, interp)
 
             instances = instances.new_tensor(features=torch.column_stack(
@@ -479,7 +636,7 @@ class FullNet(pl.LightningModule):
             ))
 
         if len(preds) > 3:  # landmark detection        
-            landmarks = self.landmarks_process(proposals, preds[1:], keep_idxs, labels, affine)
+            landmarks = self.landmarks_process(scan, proposals, preds[1:], keep_idxs, labels, affine)
 
             return instances, labels, landmarks
 
@@ -505,15 +662,15 @@ class FullNet(pl.LightningModule):
                 inst_classes = inst_classes.new_tensor(features=inst_classes.F.argmax(-1))
                 
                 point_classes = torch.where(cluster_idxs >= 0, inst_classes.F[cluster_idxs], -1)
-                point_classes = caries.new_tensor(features=point_classes)
+                point_classes = sources[b].new_tensor(features=point_classes)
                 caries_classes = torch.maximum(
-                    caries_classes, point_classes.interpolate(x, dist_thresh=0.03).F,
+                    caries_classes, point_classes.interpolate(x, dist_thresh=0.03, index=True, cache=True).F,
                 )
                 
                 cluster_idxs[cluster_idxs >= 0] += caries_clusters.max() + 1
-                cluster_idxs = caries.new_tensor(features=cluster_idxs)
+                cluster_idxs = sources[b].new_tensor(features=cluster_idxs)
                 caries_clusters = torch.maximum(
-                    caries_clusters, cluster_idxs.interpolate(x, dist_thresh=0.03).F,
+                    caries_clusters, cluster_idxs.interpolate(x, dist_thresh=0.03, index=True, cache=True).F,
                 )
             
             instances = instances.new_tensor(features=torch.column_stack(
@@ -524,59 +681,86 @@ class FullNet(pl.LightningModule):
 
     def forward(
         self,
-        x: PointTensor,
-    ) -> Tuple[TensorType['N', torch.float32], PointTensor, PointTensor, PointTensor]:
+        batch: Tuple[List[Dict[str, Any]], PointTensor],
+    ) -> List[Tuple[PointTensor, PointTensor, Optional[PointTensor]]]:
+        scans, x = batch
+        xs = [scan_points(x, b) for b in range(x.batch_size)]
+
         # stage 1
-        if self.do_align:
-            x, affine = self.align_stage(x)
-        else:
-            affine = torch.eye(4).to(x.C)
+        affines = []
+        for b in range(len(xs)):
+            if self.do_align:
+                xs[b], affine = self.align_stage(xs[b])
+            else:
+                affine = torch.eye(4).to(x.C)
+            affines.append(affine)
 
         # stage 2
-        instances, features, labels = self.instances_stage(x)
-        if torch.all(instances.F == -1) or self.only_dentalnet:
-            return torch.zeros_like(x.C), instances, labels, None
+        instances, features, labels = self.instances_stage(xs, scans)
+        outputs = [
+            (scan_instances.batch(0), scan_labels.batch(0), None)
+            for scan_instances, scan_labels in zip(instances, labels)
+        ]
+        if self.only_dentalnet:
+            return outputs
         
-        # stage 3
-        instances, labels, landmarks = self.single_tooth_stage(x, instances, features, labels, affine)
-
-        return instances.batch(0), labels.batch(0), landmarks
+        # stage 3, only for scans with teeth
+        idxs = [b for b in range(len(xs)) if torch.any(instances[b].F >= 0)]
+        if not idxs:
+            return outputs
+
+        stage3_outputs = self.single_tooth_stage(*[
+            [values[b] for b in idxs]
+            for values in [xs, scans, instances, features, labels, affines]
+        ])
+        for b, (scan_instances, scan_labels, landmarks) in zip(idxs, stage3_outputs):
+            outputs[b] = scan_instances.batch(0), scan_labels.batch(0), landmarks
+
+        return outputs
     
     def predict_step(
         self,
-        batch: Tuple[
-            TensorType['B', 'C', 'D', 'H', 'W', torch.float32],
-            Path,
-            TensorType[4, 4, torch.float32],
-            TensorType[3, torch.int64],
-        ],
+        batch: Tuple[List[Dict[str, Any]], PointTensor],
         batch_idx: int,
-    ):
+    ) -> List[Optional[Dict[str, Any]]]:
+        scans, x = batch
         try:
-            instances, classes, landmarks = self(batch)
-
-            self.save_segmentation(instances, classes)
-            self.save_landmarks(landmarks)
-        except Exception as e:
-            return
+            return [
+                {
+                    'segmentation': self.save_segmentation(scan, instances, classes),
+                    'landmarks': self.save_landmarks(scan, landmarks),
+                }
+                for scan, (instances, classes, landmarks) in zip(scans, self(batch))
+            ]
+        except (AssertionError, IndexError, RuntimeError, ValueError):
+            # errors raised by a scan that cannot be processed, e.g. without teeth
+            print(f'Prediction failed for {[scan["scan_file"] for scan in scans]}:')
+            traceback.print_exc()
+            if len(scans) == 1:
+                return [None]
+
+            # predict scans separately, so a failing scan does not affect the others
+            return [
+                self.predict_step(([scan], scan_points(x, b)), batch_idx)[0]
+                for b, scan in enumerate(scans)
+            ]
 
     def save_segmentation(
         self,
+        scan: Dict[str, Any],
         points: PointTensor,
         labels: PointTensor,
     ):
         # make output directory
-        path = Path(self.trainer.datamodule.scan_file)
+        path = Path(scan['scan_file'])
         if self.out_dir.name:
             out_file = self.out_dir / path.with_suffix('.json')
         else:
             out_file = self.trainer.datamodule.root / path.with_suffix('.json')
         out_file.parent.mkdir(parents=True, exist_ok=True)
 
-        # save transformed mesh
-        ms = pymeshlab.MeshSet()
-        ms.load_new_mesh(str(self.trainer.datamodule.root / path))
-        ms.save_current_mesh(str(out_file.parent / path.name))
+        # copy mesh next to predictions
+        scan['mesh'].copy_to(out_file.parent / path.name)
 
         # determine per-point labels and instances
         instances = points.F if points.F.ndim == 1 else points.F[:, 0].long()
@@ -602,14 +786,20 @@ class FullNet(pl.LightningModule):
         with open(out_file, 'w') as f:
             json.dump(out_dict, f)
 
-    def save_landmarks(self, landmarks: Optional[PointTensor]):
+        return out_dict
+
+    def save_landmarks(
+        self,
+        scan: Dict[str, Any],
+        landmarks: Optional[PointTensor],
+    ):
         if landmarks is None:
             return
         
         template = {
             'version': '1.1',
             'description': 'landmarks',
-            'key': self.trainer.datamodule.scan_file,
+            'key': scan['scan_file'],
             'objects': [],
         }
         for i, (coords, (score, cls), instance) in enumerate(zip(
@@ -631,3 +821,5 @@ class FullNet(pl.LightningModule):
             out_file = self.trainer.datamodule.root / out_name
         with open(out_file, 'w') as f:
             json.dump(template, f, indent=2)
+
+        return template
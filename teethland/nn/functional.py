@@ -1,172 +1,385 @@
-from typing import Tuple
+from typing import Any, Tuple
 
 import torch
-from torch.autograd.function import Function, FunctionCtx
 from torchtyping import TensorType
 
-from pointops import (
-    attentionLogitsCRPE_forward,
-    attentionLogitsCRPE_backward,
-    aggregateValuesCRPE_forward,
-    aggregateValuesCRPE_backward,
+import pointops  # registers the custom operators in torch.ops.pointops
+
+
+@torch.library.register_fake('pointops::attention_logits_crpe')
+def _attention_logits_crpe_fake(
+    queries: TensorType['N', 'heads', 'head_channels', torch.float32],
+    keys: TensorType['N', 'heads', 'head_channels', torch.float32],
+    query_key_pair_idxs: TensorType[2, 'M', torch.int64],
+    query_rel_xyz_tables: TensorType[
+        3, 'bins', 'heads', 'head_channels', torch.float32,
+    ],
+    key_rel_xyz_tables: TensorType[
+        3, 'bins', 'heads', 'head_channels', torch.float32,
+    ],
+    rel_xyz_table_idxs: TensorType['M', 3, torch.int32],
+) -> TensorType['M', 'heads', torch.float32]:
+    return queries.new_empty(query_key_pair_idxs.shape[1], queries.shape[1])
+
+
+@torch.library.register_fake('pointops::attention_logits_crpe_backward')
+def _attention_logits_crpe_backward_fake(
+    queries: TensorType['N', 'heads', 'head_channels', torch.float32],
+    keys: TensorType['N', 'heads', 'head_channels', torch.float32],
+    query_key_pair_idxs: TensorType[2, 'M', torch.int64],
+    query_rel_xyz_tables: TensorType[
+        3, 'bins', 'heads', 'head_channels', torch.float32,
+    ],
+    key_rel_xyz_tables: TensorType[
+        3, 'bins', 'heads', 'head_channels', torch.float32,
+    ],
+    rel_xyz_table_idxs: TensorType['M', 3, torch.int32],
+    attention_logits_grad: TensorType['M', 'heads', torch.float32],
+) -> Tuple[
+    TensorType['N', 'heads', 'head_channels', torch.float32],
+    TensorType['N', 'heads', 'head_channels', torch.float32],
+    TensorType[3, 'bins', 'heads', 'head_channels', torch.float32],
+    TensorType[3, 'bins', 'heads', 'head_channels', torch.float32],
+]:
+    return (
+        torch.empty_like(queries),
+        torch.empty_like(keys),
+        torch.empty_like(query_rel_xyz_tables),
+        torch.empty_like(key_rel_xyz_tables),
+    )
+
+
+def _attention_logits_crpe_setup_context(
+    ctx: Any,
+    inputs: Tuple[torch.Tensor, ...],
+    output: torch.Tensor,
+):
+    ctx.save_for_backward(*inputs)
+
+
+def _attention_logits_crpe_backward(
+    ctx: Any,
+    attention_logits_grad: TensorType['M', 'heads', torch.float32],
+) -> Tuple[
+    TensorType['N', 'heads', 'head_channels', torch.float32],
+    TensorType['N', 'heads', 'head_channels', torch.float32],
+    None,
+    TensorType[3, 'bins', 'heads', 'head_channels', torch.float32],
+    TensorType[3, 'bins', 'heads', 'head_channels', torch.float32],
+    None,
+]:
+    (
+        queries_grad,
+        keys_grad,
+        query_rel_xyz_tables_grad,
+        key_rel_xyz_tables_grad,
+    ) = torch.ops.pointops.attention_logits_crpe_backward(
+        *ctx.saved_tensors,
+        attention_logits_grad,
+    )
+
+    return (
+        queries_grad,
+        keys_grad,
+        None,
+        query_rel_xyz_tables_grad,
+        key_rel_xyz_tables_grad,
+        None,
+    )
+
+
+torch.library.register_autograd(
+    'pointops::attention_logits_crpe',
+    _attention_logits_crpe_backward,
+    setup_context=_attention_logits_crpe_setup_context,
 )
 
 
-class CRPEAttentionLogits(Function):
+def attention_logits_crpe(
+    queries: TensorType['N', 'heads', 'head_channels', torch.float32],
+    keys: TensorType['N', 'heads', 'head_channels', torch.float32],
+    query_key_pair_idxs: TensorType[2, 'M', torch.int64],
+    query_rel_xyz_tables: TensorType[
+        3, 'bins', 'heads', 'head_channels', torch.float32,
+    ],
+    key_rel_xyz_tables: TensorType[
+        3, 'bins', 'heads', 'head_channels', torch.float32,
+    ],
+    rel_xyz_table_idxs: TensorType['M', 3, torch.int32],
+) -> TensorType['M', 'heads', torch.float32]:
     """Computes attention logits using contextual relative position encoding."""
+    return torch.ops.pointops.attention_logits_crpe(
+        queries,
+        keys,
+        query_key_pair_idxs,
+        query_rel_xyz_tables,
+        key_rel_xyz_tables,
+        rel_xyz_table_idxs,
+    )
+
+
+@torch.library.register_fake('pointops::aggregate_values_crpe')
+def _aggregate_values_crpe_fake(
+    values: TensorType['N', 'heads', 'head_channels', torch.float32],
+    query_key_pair_idxs: TensorType[2, 'M', torch.int64],
+    attention_distrs: TensorType['M', 'heads', torch.float32],
+    values_rel_xyz_tables: TensorType[
+        3, 'bins', 'heads', 'head_channels', torch.float32,
+    ],
+    rel_xyz_table_idxs: TensorType['M', 3, torch.int32],
+) -> TensorType['N', 'heads', 'head_channels', torch.float32]:
+    return torch.empty_like(values)
+
+
+@torch.library.register_fake('pointops::aggregate_values_crpe_backward')
+def _aggregate_values_crpe_backward_fake(
+    values: TensorType['N', 'heads', 'head_channels', torch.float32],
+    query_key_pair_idxs: TensorType[2, 'M', torch.int64],
+    attention_distrs: TensorType['M', 'heads', torch.float32],
+    values_rel_xyz_tables: TensorType[
+        3, 'bins', 'heads', 'head_channels', torch.float32,
+    ],
+    rel_xyz_table_idxs: TensorType['M', 3, torch.int32],
+    agg_values_grad: TensorType['N', 'heads', 'head_channels', torch.float32],
+) -> Tuple[
+    TensorType['N', 'heads', 'head_channels', torch.float32],
+    TensorType['M', 'heads', torch.float32],
+    TensorType[3, 'bins', 'heads', 'head_channels', torch.float32],
+]:
+    return (
+        torch.empty_like(values),
+        torch.empty_like(attention_distrs),
+        torch.empty_like(values_rel_xyz_tables),
+    )
+
 
-    @staticmethod
-    def forward(
-        ctx: FunctionCtx,
-        queries: TensorType['N', 'heads', 'head_channels', torch.float32],
-        keys: TensorType['N', 'heads', 'head_channels', torch.float32],
-        query_key_pair_idxs: TensorType[2, 'M', torch.int64],
-        query_rel_xyz_tables: TensorType[
-            3, 'bins', 'heads', 'head_channels', torch.float32,
-        ],
-        key_rel_xyz_tables: TensorType[
-            3, 'bins', 'heads', 'head_channels', torch.float32,
-        ],
-        rel_xyz_table_idxs: TensorType['M', 3, torch.int32],
-    ) -> TensorType['M', 'heads', torch.float32]:
-        attention_logits = attentionLogitsCRPE_forward(
-            queries,
-            keys,
-            query_key_pair_idxs,
-            query_rel_xyz_tables,
-            key_rel_xyz_tables,
-            rel_xyz_table_idxs,
-        )
-
-        ctx.save_for_backward(
-            queries,
-            keys,
-            query_key_pair_idxs,
-            query_rel_xyz_tables,
-            key_rel_xyz_tables,
-            rel_xyz_table_idxs,
-        )
-
-        return attention_logits
-
-    @staticmethod
-    def backward(
-        ctx: FunctionCtx,
-        attention_logits_grad: TensorType['M', 'heads', torch.float32],
-    ) -> Tuple[
-        TensorType['N', 'heads', 'head_channels', torch.float32],
-        TensorType['N', 'heads', 'head_channels', torch.float32],
+def _aggregate_values_crpe_setup_context(
+    ctx: Any,
+    inputs: Tuple[torch.Tensor, ...],
+    output: torch.Tensor,
+):
+    ctx.save_for_backward(*inputs)
+
+
+def _aggregate_values_crpe_backward(
+    ctx: Any,
+    agg_values_grad: TensorType['N', 'heads', 'head_channels', torch.float32],
+) -> Tuple[
+    TensorType['N', 'heads', 'head_channels', torch.float32],
+    None,
+    TensorType['M', 'heads', torch.float32],
+    TensorType[3, 'bins', 'heads', 'head_channels', torch.float32],
+    None,
+]:
+    (
+        values_grad,
+        attention_distrs_grad,
+        values_rel_xyz_tables_grad,
+    ) = torch.ops.pointops.aggregate_values_crpe_backward(
+        *ctx.saved_tensors,
+        agg_values_grad,
+    )
+
+    return (
+        values_grad,
         None,
-        TensorType[3, 'bins', 'heads', 'head_channels', torch.float32],
-        TensorType[3, 'bins', 'heads', 'head_channels', torch.float32],
+        attention_distrs_grad,
+        values_rel_xyz_tables_grad,
         None,
-    ]:
-        (
-            queries_grad,
-            keys_grad,
-            query_rel_xyz_tables_grad,
-            key_rel_xyz_tables_grad,
-        ) = attentionLogitsCRPE_backward(
-            *ctx.saved_tensors,
-            attention_logits_grad,
-        )
-
-        return (
-            queries_grad,
-            keys_grad,
-            None,
-            query_rel_xyz_tables_grad,
-            key_rel_xyz_tables_grad,
-            None,
-        )
-
-attention_logits_crpe = CRPEAttentionLogits.apply
-
-
-class CRPEAggregateValues(Function):
+    )
+
+
+torch.library.register_autograd(
+    'pointops::aggregate_values_crpe',
+    _aggregate_values_crpe_backward,
+    setup_context=_aggregate_values_crpe_setup_context,
+)
+
+
+def aggregate_values_crpe(
+    values: TensorType['N', 'heads', 'head_channels', torch.float32],
+    query_key_pair_idxs: TensorType[2, 'M', torch.int64],
+    attention_distrs: TensorType['M', 'heads', torch.float32],
+    values_rel_xyz_tables: TensorType[
+        3, 'bins', 'heads', 'head_channels', torch.float32,
+    ],
+    rel_xyz_table_idxs: TensorType['M', 3, torch.int32],
+) -> TensorType['N', 'heads', 'head_channels', torch.float32]:
     """Aggregates values using contextual relative position encoding."""
+    return torch.ops.pointops.aggregate_values_crpe(
+        values,
+        query_key_pair_idxs,
+        attention_distrs,
+        values_rel_xyz_tables,
+        rel_xyz_table_idxs,
+    )
+
+
+@torch.library.register_fake('pointops::fused_attention_crpe')
+def _fused_attention_crpe_fake(
+    queries: TensorType['N', 'heads', 'head_channels', torch.float32],
+    keys: TensorType['N', 'heads', 'head_channels', torch.float32],
+    values: TensorType['N', 'heads', 'head_channels', torch.float32],
+    query_key_pair_idxs: TensorType[2, 'M', torch.int64],
+    query_rel_xyz_tables: TensorType[
+        3, 'bins', 'heads', 'head_channels', torch.float32,
+    ],
+    key_rel_xyz_tables: TensorType[
+        3, 'bins', 'heads', 'head_channels', torch.float32,
+    ],
+    value_rel_xyz_tables: TensorType[
+        3, 'bins', 'heads', 'head_channels', torch.float32,
+    ],
+    rel_xyz_table_idxs: TensorType['M', 3, torch.int32],
+) -> Tuple[
+    TensorType['N', 'heads', 'head_channels', torch.float32],
+    TensorType['N', 'heads', torch.float32],
+]:
+    return (
+        values.new_empty(values.shape),
+        queries.new_empty(queries.shape[:2]),
+    )
+
+
+@torch.library.register_fake('pointops::fused_attention_crpe_backward')
+def _fused_attention_crpe_backward_fake(
+    queries: TensorType['N', 'heads', 'head_channels', torch.float32],
+    keys: TensorType['N', 'heads', 'head_channels', torch.float32],
+    values: TensorType['N', 'heads', 'head_channels', torch.float32],
+    query_key_pair_idxs: TensorType[2, 'M', torch.int64],
+    query_rel_xyz_tables: TensorType[
+        3, 'bins', 'heads', 'head_channels', torch.float32,
+    ],
+    key_rel_xyz_tables: TensorType[
+        3, 'bins', 'heads', 'head_channels', torch.float32,
+    ],
+    value_rel_xyz_tables: TensorType[
+        3, 'bins', 'heads', 'head_channels', torch.float32,
+    ],
+    rel_xyz_table_idxs: TensorType['M', 3, torch.int32],
+    agg_values: TensorType['N', 'heads', 'head_channels', torch.float32],
+    log_sum_exps: TensorType['N', 'heads', torch.float32],
+    agg_values_grad: TensorType['N', 'heads', 'head_channels', torch.float32],
+) -> Tuple[
+    TensorType['N', 'heads', 'head_channels', torch.float32],
+    TensorType['N', 'heads', 'head_channels', torch.float32],
+    TensorType['N', 'heads', 'head_channels', torch.float32],
+    TensorType[3, 'bins', 'heads', 'head_channels', torch.float32],
+    TensorType[3, 'bins', 'heads', 'head_channels', torch.float32],
+    TensorType[3, 'bins', 'heads', 'head_channels', torch.float32],
+]:
+    return (
+        torch.empty_like(queries),
+        torch.empty_like(keys),
+        torch.empty_like(values),
+        torch.empty_like(query_rel_xyz_tables),
+        torch.empty_like(key_rel_xyz_tables),
+        torch.empty_like(value_rel_xyz_tables),
+    )
+
+
+def _fused_attention_crpe_setup_context(
+    ctx: Any,
+    inputs: Tuple[torch.Tensor, ...],
+    output: Tuple[torch.Tensor, torch.Tensor],
+):
+    ctx.mark_non_differentiable(output[1])
+    ctx.save_for_backward(*inputs, *output)
+
+
+def _fused_attention_crpe_backward(
+    ctx: Any,
+    agg_values_grad: TensorType['N', 'heads', 'head_channels', torch.float32],
+    log_sum_exps_grad: None,
+) -> Tuple[
+    TensorType['N', 'heads', 'head_channels', torch.float32],
+    TensorType['N', 'heads', 'head_channels', torch.float32],
+    TensorType['N', 'heads', 'head_channels', torch.float32],
+    None,
+    TensorType[3, 'bins', 'heads', 'head_channels', torch.float32],
+    TensorType[3, 'bins', 'heads', 'head_channels', torch.float32],
+    TensorType[3, 'bins', 'heads', 'head_channels', torch.float32],
+    None,
+]:
+    (
+        queries_grad,
+        keys_grad,
+        values_grad,
+        query_rel_xyz_tables_grad,
+        key_rel_xyz_tables_grad,
+        value_rel_xyz_tables_grad,
+    ) = torch.ops.pointops.fused_attention_crpe_backward(
+        *ctx.saved_tensors,
+        agg_values_grad,
+    )
 
-    @staticmethod
-    def forward(
-        ctx: FunctionCtx,
-        values: TensorType['N', 'heads', 'head_channels', torch.float32],
-        query_key_pair_idxs: TensorType[2, 'M', torch.int64],
-        attention_distrs: TensorType['M', 'heads', torch.float32],
-        values_rel_xyz_tables: TensorType[
-            3, 'bins', 'heads', 'head_channels', torch.float32,
-        ],
-        rel_xyz_table_idxs: TensorType['M', 3, torch.int32],
-    ) -> TensorType['N', 'heads', 'head_channels', torch.float32]:        
-        _, query_key_counts = torch.unique_consecutive(
-            query_key_pair_idxs[0], return_counts=True,
-        )
-        query_key_offsets = query_key_counts.cumsum(dim=-1, dtype=torch.int32)
-        max_key_count = query_key_counts.amax().item()
-
-        agg_values = aggregateValuesCRPE_forward(
-            values,
-            query_key_pair_idxs,
-            query_key_offsets,
-            max_key_count,
-            attention_distrs,
-            values_rel_xyz_tables,
-            rel_xyz_table_idxs,
-        )
-
-        ctx.query_key_offsets = query_key_offsets
-        ctx.max_key_count = max_key_count
-        ctx.save_for_backward(
-            values,
-            query_key_pair_idxs,
-            attention_distrs,
-            values_rel_xyz_tables,
-            rel_xyz_table_idxs,
-        )
-
-        return agg_values
-
-    @staticmethod
-    def backward(
-        ctx: FunctionCtx,
-        agg_values_grad: TensorType[
-            'N', 'heads', 'head_channels', torch.float32,
-        ],
-    ) -> Tuple[
-        TensorType['N', 'heads', 'head_channels', torch.float32],
+    return (
+        queries_grad,
+        keys_grad,
+        values_grad,
         None,
-        TensorType['M', 'heads', torch.float32],
-        TensorType[3, 'bins', 'heads', 'head_channels', torch.float32],
+        query_rel_xyz_tables_grad,
+        key_rel_xyz_tables_grad,
+        value_rel_xyz_tables_grad,
         None,
-    ]:
-        (
-            values,
-            query_key_pair_idxs,
-            attention_distrs,
-            values_rel_xyz_tables,
-            rel_xyz_table_idxs,
-        ) = ctx.saved_tensors
-        
-        (
-            values_grad,
-            attention_distrs_grad,
-            values_rel_xyz_tables_grad,
-        ) = aggregateValuesCRPE_backward(
-            values,
-            query_key_pair_idxs,
-            ctx.query_key_offsets,
-            ctx.max_key_count,
-            attention_distrs,
-            values_rel_xyz_tables,
-            rel_xyz_table_idxs,
-            agg_values_grad,
-        )
-
-        return (
-            values_grad,
-            None,
-            attention_distrs_grad,
-            values_rel_xyz_tables_grad,
-            None,
-        )
-
-aggregate_values_crpe = CRPEAggregateValues.apply
+    )
+
+
+torch.library.register_autograd(
+    'pointops::fused_attention_crpe',
+    _fused_attention_crpe_backward,
+    setup_context=_fused_attention_crpe_setup_context,
+)
+
+
+def fused_attention_crpe(
+    queries: TensorType['N', 'heads', 'head_channels', torch.float32],
+    keys: TensorType['N', 'heads', 'head_channels', torch.float32],
+    values: TensorType['N', 'heads', 'head_channels', torch.float32],
+    query_key_pair_idxs: TensorType[2, 'M', torch.int64],
+    query_rel_xyz_tables: TensorType[
+        3, 'bins', 'heads', 'head_channels', torch.float32,
+    ],
+    key_rel_xyz_tables: TensorType[
+        3, 'bins', 'heads', 'head_channels', torch.float32,
+    ],
+    value_rel_xyz_tables: TensorType[
+        3, 'bins', 'heads', 'head_channels', torch.float32,
+    ],
+    rel_xyz_table_idxs: TensorType['M', 3, torch.int32],
+) -> TensorType['N', 'heads', 'head_channels', torch.float32]:
+    """Computes attention logits, softmax, and aggregated values in one pass.
+
+    The query-key pairs of each query are streamed with an online softmax, so
+    no tensors over all query-key pairs are stored, neither in the forward
+    nor in the backward pass. The query-key pairs must be sorted by query and
+    only CPU tensors are supported.
+    """
+    agg_values, _ = torch.ops.pointops.fused_attention_crpe(
+        queries,
+        keys,
+        values,
+        query_key_pair_idxs,
+        query_rel_xyz_tables,
+        key_rel_xyz_tables,
+        value_rel_xyz_tables,
+        rel_xyz_table_idxs,
+    )
+
+    return agg_values
+
+
+def segment_softmax(
+    src: TensorType['M', 'heads', torch.float32],
+    index: TensorType['M', torch.int64],
+    num_segments: int,
+) -> TensorType['M', 'heads', torch.float32]:
+    """Softmax over the rows of src with the same index, using native operators only."""
+    segment_idxs = index[:, None].expand_as(src)
+    max_values = src.new_full((num_segments, src.shape[1]), float('-inf'))
+    max_values = max_values.scatter_reduce(0, segment_idxs, src, reduce='amax')
+
+    exp = torch.exp(src - max_values[index])
+    sums = exp.new_zeros(num_segments, src.shape[1]).index_add(0, index, exp)
+
+    return exp / sums[index]
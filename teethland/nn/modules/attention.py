@@ -3,7 +3,6 @@ from typing import Any, Dict, Tuple, Union
 
 import torch
 import torch.nn as nn
-from torch_scatter import scatter_softmax
 from torchtyping import TensorType
 
 from teethland import PointTensor
@@ -85,18 +84,32 @@ class CRPEAttention(nn.Module):
 
         return rel_xyz_table_idxs
 
-    def forward(
+    def attend(
         self,
-        x: PointTensor,
+        features: TensorType['N', 'C', torch.float32],
         qk_pair_idxs: TensorType[2, 'M', torch.int64],
-    ) -> PointTensor:
+        rel_xyz_table_idxs: TensorType['M', 3, torch.int32],
+    ) -> TensorType['N', 'heads * head_channels', torch.float32]:
+        """Attention on plain tensors, which torch.compile traces in one graph."""
         # compute queries, keys, and values
-        qkv = self.qkv(x).F
+        qkv = self.qkv.linear(features)
         qkv = qkv.reshape(-1, 3, self.heads, self.head_channels)
         queries, keys, values = qkv.transpose(0, 1)
 
-        # compute indices into cRPE look-up tables
-        rel_xyz_table_idxs = self.relative_xyz_table_indices(x, qk_pair_idxs)
+        # stream query-key pairs without storing their logits on CPU
+        if features.device.type == 'cpu':
+            agg_values = F.fused_attention_crpe(
+                queries * self.query_scale,
+                keys,
+                values,
+                qk_pair_idxs,
+                self.query_rel_xyz_tables,
+                self.key_rel_xyz_tables,
+                self.value_rel_xyz_tables,
+                rel_xyz_table_idxs,
+            )
+
+            return agg_values.reshape(-1, self.heads * self.head_channels)
 
         # compute attention logits
         attention_logits = F.attention_logits_crpe(
@@ -109,10 +122,10 @@ class CRPEAttention(nn.Module):
         )
         
         # compute attention distribution for each query and head
-        attention_distrs = scatter_softmax(
+        attention_distrs = F.segment_softmax(
             src=attention_logits,
             index=qk_pair_idxs[0],
-            dim=0,
+            num_segments=features.shape[0],
         )
 
         # aggregate values given attention distributions
@@ -124,8 +137,18 @@ class CRPEAttention(nn.Module):
             rel_xyz_table_idxs,
         )
 
+        return agg_values.reshape(-1, self.heads * self.head_channels)
+
+    def forward(
+        self,
+        x: PointTensor,
+        qk_pair_idxs: TensorType[2, 'M', torch.int64],
+    ) -> PointTensor:
+        # compute indices into cRPE look-up tables
+        rel_xyz_table_idxs = self.relative_xyz_table_indices(x, qk_pair_idxs)
+
         # project aggregated values to final output
-        agg_values = agg_values.reshape(-1, self.heads * self.head_channels)
+        agg_values = self.attend(x.F, qk_pair_idxs, rel_xyz_table_idxs)
         x = x.new_tensor(features=agg_values)
 
         return x
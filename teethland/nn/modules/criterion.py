@@ -3,9 +3,10 @@ from typing import List, Optional
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
+from torch_scatter import scatter_mean, scatter_sum
 
 from teethland import PointTensor
-from teethland.nn.modules.loss import lovasz_hinge_flat
+from teethland.nn.modules.loss import lovasz_hinge_batch
 
 
 class SpatialEmbeddingLoss(nn.Module):
@@ -18,6 +19,7 @@ class SpatialEmbeddingLoss(nn.Module):
         w_instance: float=1.0,
         w_smooth: float=10.0,
         w_seed: float=10.0,
+        max_chunk_elements: int=2**24,
     ):
         super().__init__()
 
@@ -29,6 +31,9 @@ class SpatialEmbeddingLoss(nn.Module):
         self.w_smooth = w_smooth
         self.w_seed = w_seed
 
+        # maximum number of instance-point pairs of Gaussians in memory
+        self.max_chunk_elements = max_chunk_elements
+
     def forward(
         self,
         pred_offsets: PointTensor,
@@ -53,9 +58,11 @@ class SpatialEmbeddingLoss(nn.Module):
             smooth_loss = 0
             instance_loss = 0
             seed_loss = 0
-            obj_count = 0
 
-            instances = targets.batch(b).F
+            # consecutive instance index of each point, -1 for background
+            ids, instances = targets.batch(b).F.unique(return_inverse=True)
+            instances = instances - (ids[0] == -1).long()
+            obj_count = ids.shape[0] - (ids[0] == -1).long().item()
 
             # regress bg to zero
             bg_mask = instances == -1
@@ -63,46 +70,56 @@ class SpatialEmbeddingLoss(nn.Module):
                 seed_loss += torch.sum(
                     torch.pow(seed_map[bg_mask] - 0, 2))
 
-            for k in instances.unique()[1:]:
-                mask_k = instances == k  # 1 x d x h x w
+            if obj_count > 0:
+                fg_mask = ~bg_mask
+                fg_instances = instances[fg_mask]
 
-                # predict center of attraction (\hat{C}_k)
+                # predict centers of attraction (\hat{C}_k)
                 if self.learn_center:
-                    center_k = spatial_emb[mask_k].mean(0)
+                    centers = scatter_mean(spatial_emb[fg_mask], fg_instances, dim=0)
                 else:
-                    center_k = self.xyzm[mask_k.expand_as(self.xyzm)].view(
-                        3, -1).mean(1).view(3, 1, 1, 1)  # 3 x 1 x 1 x 1
+                    centers = scatter_mean(
+                        pred_offsets.batch(b).C[fg_mask], fg_instances, dim=0,
+                    )
 
-                # calculate sigma
-                sigmas_ki = sigma[mask_k]
-                sigma_k = sigmas_ki.mean(0)
+                # calculate sigmas
+                sigmas = scatter_mean(sigma[fg_mask], fg_instances, dim=0)
 
                 # calculate smooth loss before exp
-                smooth_loss = smooth_loss + torch.mean(
-                    torch.pow(sigmas_ki - sigma_k.detach(), 2),
+                sq_dists = torch.pow(sigma[fg_mask] - sigmas[fg_instances].detach(), 2)
+                counts = torch.bincount(fg_instances, minlength=obj_count)
+                smooth_loss = torch.sum(
+                    scatter_sum(sq_dists.sum(1), fg_instances, dim=0, dim_size=obj_count)
+                    / (counts * sigma.shape[1])
                 )
 
                 # exponential to effectively predict 1 / (2 * sigma_k**2)
-                sigma_k = torch.exp(sigma_k * 10)
-
-                # calculate gaussian
-                probs_i = torch.exp(-1 * torch.sum(
-                    sigma_k * torch.pow(spatial_emb - center_k, 2),
-                    dim=1,
-                ))
-
-                # apply lovasz-hinge loss
-                logits_i = 2 * probs_i - 1
-                instance_loss = instance_loss + lovasz_hinge_flat(logits_i, mask_k)
+                sigmas = torch.exp(sigmas * 10)
+
+                # calculate gaussians of chunks of instances
+                chunk_size = max(1, self.max_chunk_elements // max(1, spatial_emb.shape[0]))
+                for start in range(0, obj_count, chunk_size):
+                    ks = torch.arange(start, min(start + chunk_size, obj_count)).to(instances)
+                    probs = torch.exp(-1 * torch.sum(
+                        sigmas[ks, None] * torch.pow(spatial_emb[None] - centers[ks, None], 2),
+                        dim=2,
+                    ))
+
+                    # apply lovasz-hinge loss
+                    masks = instances[None] == ks[:, None]
+                    logits = 2 * probs - 1
+                    instance_loss = instance_loss + lovasz_hinge_batch(logits, masks).sum()
+
+                    # seed loss
+                    chunk_mask = (instances >= ks[0]) & (instances <= ks[-1])
+                    chunk_probs = probs[
+                        instances[chunk_mask] - start,
+                        torch.nonzero(chunk_mask)[:, 0],
+                    ]
+                    seed_loss += self.w_foreground * torch.sum(
+                        torch.pow(seed_map[chunk_mask] - chunk_probs[:, None].detach(), 2),
+                    )
 
-                # seed loss
-                seed_loss += self.w_foreground * torch.sum(
-                    torch.pow(seed_map[mask_k] - probs_i[mask_k, None].detach(), 2),
-                )
-
-                obj_count += 1
-
-            if obj_count > 0:
                 instance_loss /= obj_count
                 smooth_loss /= obj_count
 
@@ -159,15 +159,15 @@ def mean(l, ignore_nan=False, empty=0):
 def lovasz_grad(gt_sorted):
     """
     Computes gradient of the Lovasz extension w.r.t sorted errors
-    See Alg. 1 in paper
+    See Alg. 1 in paper, along the last dimension
     """
-    p = len(gt_sorted)
-    gts = gt_sorted.sum()
-    intersection = gts.float() - gt_sorted.float().cumsum(0)
-    union = gts.float() + (~gt_sorted).float().cumsum(0)
+    p = gt_sorted.shape[-1]
+    gts = gt_sorted.sum(-1, keepdim=True)
+    intersection = gts.float() - gt_sorted.float().cumsum(-1)
+    union = gts.float() + (~gt_sorted).float().cumsum(-1)
     jaccard = 1. - intersection / union
     if p > 1:  # cover 1-pixel case
-        jaccard[1:p] = jaccard[1:p] - jaccard[0:-1]
+        jaccard[..., 1:p] = jaccard[..., 1:p] - jaccard[..., 0:-1]
     return jaccard
 
 
@@ -204,3 +204,21 @@ def lovasz_hinge_flat(logits, labels):
     grad = lovasz_grad(gt_sorted)
     loss = torch.dot(F.relu(errors_sorted), grad)
     return loss
+
+
+def lovasz_hinge_batch(logits, labels):
+    """
+    Binary Lovasz hinge loss of each row
+      logits: [K, P] Variable, logits at each prediction (between -\infty and +\infty)
+      labels: [K, P] Tensor, binary ground truth labels (0 or 1)
+    """
+    if labels.shape[-1] == 0:
+        return logits.sum(-1) * 0.
+    signs = 2. * labels.float() - 1.
+    errors = (1. - logits * signs)
+    errors_sorted, perm = torch.sort(errors, dim=-1, descending=True)
+    perm = perm.data
+    gt_sorted = torch.gather(labels, -1, perm)
+    grad = lovasz_grad(gt_sorted)
+    loss = torch.sum(F.relu(errors_sorted) * grad, dim=-1)
+    return loss
@@ -1,6 +1,6 @@
+from functools import cached_property
 from typing import Any, Dict, List, Tuple
 
-import teethland
 import torch
 import torch.nn as nn
 from torch_scatter import scatter_max, scatter_mean
@@ -28,6 +28,43 @@ class GroupedMaxPool(nn.Module):
         return x
 
 
+class InstancePrototypes:
+    """Point features of each instance, only gathered when first accessed.
+
+    Attributes are forwarded to a PointTensor with the features of the
+    points of each instance as batch elements, in order of instance index.
+    """
+
+    def __init__(
+        self,
+        features: PointTensor,
+        instance_idxs: TensorType['N', torch.int64],
+        num_instances: int,
+    ):
+        self.features = features
+        self.instance_idxs = instance_idxs
+        self.num_instances = num_instances
+
+    @cached_property
+    def tensor(self) -> PointTensor:
+        fg_mask = self.instance_idxs >= 0
+        sort_idxs = torch.argsort(self.instance_idxs[fg_mask], stable=True)
+
+        return PointTensor(
+            coordinates=self.features.C[fg_mask][sort_idxs],
+            features=self.features.F[fg_mask][sort_idxs],
+            batch_counts=torch.bincount(
+                self.instance_idxs[fg_mask], minlength=self.num_instances,
+            ),
+        )
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith('__'):
+            raise AttributeError(name)
+
+        return getattr(self.tensor, name)
+
+
 class MaskedAveragePooling(nn.Module):
     """Masked average pooling per instance followed by MLP for predictions."""
 
@@ -68,7 +105,9 @@ class MaskedAveragePooling(nn.Module):
     ) -> Tuple[PointTensor, PointTensor]:
         assert torch.any(instances.F == -1)
         
-        ids = instances.F.unique()
+        # determine consecutive instance indices, -1 for background
+        ids, instance_idxs = instances.F.unique(return_inverse=True)
+        instance_idxs = instance_idxs - 1
         if ids.shape[0] == 1:
             out = PointTensor(
                 coordinates=features.C[:0],
@@ -78,33 +117,31 @@ class MaskedAveragePooling(nn.Module):
 
             return out, out
 
-        # apply instance masks to get prototypes
-        prototypes, embeddings = [], []
-        for id in ids[1:]:
-            prototype = features[instances.F == id]
-
-            prototypes.append(prototype)
-            embeddings.append(prototype.F.mean(0))
-
-        # get prototypes into single PointTensor
-        prototypes = teethland.stack(prototypes)
-        embeddings = torch.stack(embeddings)
-
-        # process prototypes for prediction
+        # average features and coordinates of all instances at once
+        fg_mask = instance_idxs >= 0
+        embeddings = scatter_mean(
+            features.F[fg_mask], instance_idxs[fg_mask],
+            dim=0, dim_size=ids.shape[0] - 1,
+        )
         centroids = scatter_mean(
-            instances.C[instances.F >= 0], 
-            instances.F[instances.F >= 0],
-            dim=0
+            instances.C[fg_mask], instance_idxs[fg_mask],
+            dim=0, dim_size=ids.shape[0] - 1,
         )
-        
-        batch_counts = []
-        for idx in torch.unique(instances.batch_indices):
-            count = torch.unique(instances.F[instances.batch_indices == idx]).shape[0] - 1
-            batch_counts.append(count)
+
+        # count instances in each batch element
+        instance_batch_idxs = scatter_max(
+            instances.batch_indices[fg_mask], instance_idxs[fg_mask],
+            dim=0, dim_size=ids.shape[0] - 1,
+        )[0]
+        batch_counts = torch.bincount(
+            instance_batch_idxs, minlength=instances.batch_size,
+        )
+
+        prototypes = InstancePrototypes(features, instance_idxs, ids.shape[0] - 1)
         out = PointTensor(
             coordinates=centroids,
             features=self.mlp(embeddings),
-            batch_counts=torch.tensor(batch_counts).to(instances.batch_indices),
+            batch_counts=batch_counts,
         )
 
         return prototypes, out
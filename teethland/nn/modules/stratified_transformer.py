@@ -38,6 +38,7 @@ class StratifiedTransformer(nn.Module):
         stratified_downsample_ratio: float,
         crpe_bins: int,
         transformer_lr_ratio: float,
+        grouped_decoding: bool=True,
         **kwargs,
     ):
         super().__init__()
@@ -91,6 +92,7 @@ class StratifiedTransformer(nn.Module):
             channels_list[point_embedding['use']] if chs is None else chs
             for chs in out_channels
         ]
+        self.grouped_decoding = grouped_decoding
 
     def init_point_embedding(
         self,
@@ -209,6 +211,46 @@ class StratifiedTransformer(nn.Module):
             }] if self.out_channels is not None else [])
         ]
 
+    def decode(
+        self,
+        encoding: PointTensor,
+        x_ups: List[PointTensor],
+    ) -> List[PointTensor]:
+        outs = []
+        for upsample_blocks, head in zip(self.upsample_blocks, self.heads):
+            x = encoding
+            for upsample_block, x_up in zip(upsample_blocks, x_ups):
+                x = upsample_block(x, x_up)
+            x = head(x)
+
+            outs.append(x)
+
+        return outs
+
+    def decode_grouped(
+        self,
+        encoding: PointTensor,
+        x_ups: List[PointTensor],
+    ) -> List[PointTensor]:
+        """Runs all decoder branches at once with concatenated channels."""
+        x = encoding
+        for i, x_up in enumerate(x_ups):
+            x = UpsampleBlock.forward_grouped(
+                blocks=[upsample_blocks[i] for upsample_blocks in self.upsample_blocks],
+                x=x,
+                x_up=x_up,
+                shared=i == 0,
+            )
+
+        # split concatenated channels and apply head of each branch
+        features = x.F.reshape(x.num_points, len(self.heads), -1).transpose(0, 1)
+        outs = []
+        for branch_features, head in zip(features, self.heads):
+            x = x.new_tensor(features=branch_features.contiguous())
+            outs.append(head(x))
+
+        return outs
+
     def forward(self, x: PointTensor) -> Union[
         Tuple[PointTensor, PointTensor],
         Tuple[PointTensor, List[PointTensor]],
@@ -239,14 +281,10 @@ class StratifiedTransformer(nn.Module):
         encoding = x
 
         # apply upsampling blocks with skip connections and heads
-        outs = []
-        for upsample_blocks, head in zip(self.upsample_blocks, self.heads):
-            x = encoding
-            for upsample_block, x_up in zip(upsample_blocks, x_ups):
-                x = upsample_block(x, x_up)
-            x = head(x)
-
-            outs.append(x)
+        if self.grouped_decoding and len(self.heads) > 1 and x_ups:
+            outs = self.decode_grouped(encoding, x_ups)
+        else:
+            outs = self.decode(encoding, x_ups)
 
         if len(outs) == 1:
             return encoding, outs[0]
@@ -1,4 +1,9 @@
+from typing import List
+
+import torch
 import torch.nn as nn
+import torch.nn.functional as F
+from torchtyping import TensorType
 
 from teethland import PointTensor
 from teethland.nn.modules.linear import Linear
@@ -36,4 +41,70 @@ class UpsampleBlock(nn.Module):
         x_up = self.norm_up(x_up)
         x_up = self.linear_up(x_up)
         
-        return x.interpolate(x_up, self.k) + x_up
+        return x.interpolate(x_up, self.k, cache=True) + x_up
+
+    @staticmethod
+    def grouped_norm_linear(
+        features: TensorType['N', 'C', torch.float32],
+        norms: List[LayerNorm],
+        linears: List[Linear],
+        shared: bool,
+    ) -> TensorType['N', 'B * out_channels', torch.float32]:
+        """Applies LayerNorm and Linear of B branches to shared features [N, C]
+        or to concatenated branch features [N, B * C]. The LayerNorm affine
+        parameters are folded into the Linear weights, so one (batched) matrix
+        multiplication computes the concatenated outputs [N, B * out_channels].
+        """
+        weights = torch.stack([
+            lin.linear.weight * norm.norm.weight
+            for norm, lin in zip(norms, linears)
+        ])
+        biases = torch.stack([
+            lin.linear.weight @ norm.norm.bias + lin.linear.bias
+            for norm, lin in zip(norms, linears)
+        ])
+        num_branches, out_channels, in_channels = weights.shape
+
+        if shared:
+            features = F.layer_norm(features, (in_channels,), eps=norms[0].norm.eps)
+            return F.linear(
+                features,
+                weights.reshape(-1, in_channels),
+                biases.flatten(),
+            )
+
+        features = features.reshape(-1, num_branches, in_channels)
+        features = F.layer_norm(features, (in_channels,), eps=norms[0].norm.eps)
+        features = torch.einsum('NBC,BOC->NBO', features, weights) + biases
+
+        return features.reshape(-1, num_branches * out_channels)
+
+    @staticmethod
+    def forward_grouped(
+        blocks: List['UpsampleBlock'],
+        x: PointTensor,
+        x_up: PointTensor,
+        shared: bool,
+    ) -> PointTensor:
+        """Applies upsampling blocks of B decoder branches at once, where x has
+        shared or concatenated branch features and x_up has shared features.
+        All branches are interpolated together with the same neighbors.
+        """
+        assert all(isinstance(block.norm, LayerNorm) for block in blocks), (
+            'Grouped upsampling is only implemented for LayerNorm.'
+        )
+
+        x = x.new_tensor(features=UpsampleBlock.grouped_norm_linear(
+            x.F,
+            [block.norm for block in blocks],
+            [block.linear for block in blocks],
+            shared,
+        ))
+        x_up = x_up.new_tensor(features=UpsampleBlock.grouped_norm_linear(
+            x_up.F,
+            [block.norm_up for block in blocks],
+            [block.linear_up for block in blocks],
+            shared=True,
+        ))
+
+        return x.interpolate(x_up, blocks[0].k, cache=True) + x_up
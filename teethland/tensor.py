@@ -1,5 +1,8 @@
-from typing import Any, List, Optional, Tuple, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
+import weakref
 
+import numpy as np
+from scipy.spatial import KDTree
 import sklearn.cluster
 import torch
 from torch_scatter import scatter
@@ -21,6 +24,8 @@ class TensorCache(dict):
         super().__init__()
 
         self.device = device
+        self.spatial_index = None
+        self.interpolations: Dict[Tuple, InterpolationWeights] = {}
 
     def __setitem__(self, key: str, value: torch.Tensor):
         assert isinstance(value, torch.Tensor), (
@@ -45,6 +50,167 @@ class TensorCache(dict):
         raise ValueError(f'{value} is not in cache.')
 
 
+class CoordinatesVersion:
+    """Implements identity and version of coordinates to detect changes."""
+
+    def __init__(self, coordinates: TensorType['N', 3, torch.float32]):
+        self.data_ptr = coordinates.data_ptr()
+        self.shape = coordinates.shape
+        if coordinates.is_inference():  # no version counter, keep copy instead
+            self.version, self.snapshot = None, coordinates.clone()
+        else:
+            self.version, self.snapshot = coordinates._version, None
+
+    def is_valid(self, coordinates: TensorType['N', 3, torch.float32]) -> bool:
+        if (
+            coordinates.data_ptr() != self.data_ptr
+            or coordinates.shape != self.shape
+        ):
+            return False
+
+        if self.snapshot is not None:
+            return torch.equal(coordinates, self.snapshot)
+
+        return coordinates._version == self.version
+
+
+class InterpolationWeights:
+    """Implements neighbors and inverse distance weights between point clouds."""
+
+    def __init__(
+        self,
+        coordinates: TensorType['N', 3, torch.float32],
+        other_coordinates: TensorType['M', 3, torch.float32],
+        neighbor_idxs: TensorType['M', 'k', torch.int64],
+        sq_dists: TensorType['M', 'k', torch.float32],
+        eps: float,
+    ):
+        # weak reference, such that new coordinates at the same address do not match
+        self.other_coordinates = weakref.ref(other_coordinates)
+        self.version = CoordinatesVersion(coordinates)
+        self.other_version = CoordinatesVersion(other_coordinates)
+
+        self.neighbor_idxs = neighbor_idxs
+        self.sq_dists = sq_dists
+        self.weights = 1 / (sq_dists + eps)
+
+    def is_valid(
+        self,
+        coordinates: TensorType['N', 3, torch.float32],
+        other_coordinates: TensorType['M', 3, torch.float32],
+    ) -> bool:
+        return (
+            self.other_coordinates() is other_coordinates
+            and self.version.is_valid(coordinates)
+            and self.other_version.is_valid(other_coordinates)
+        )
+
+
+class LazyKDTree:
+    """Implements KD-tree which is only built when it is first queried."""
+
+    def __init__(self, coordinates: TensorType['N', 3, torch.float32]):
+        self.coordinates = coordinates.detach()
+        self._tree = None
+
+    @property
+    def tree(self) -> KDTree:
+        if self._tree is None:
+            self._tree = KDTree(self.coordinates.cpu().numpy())
+
+        return self._tree
+
+
+class SpatialIndex:
+    """Implements persistent index of batched point cloud for neighbor queries.
+
+    Every batch element gets its own KD-tree, such that a subset of the batch
+    elements can reuse the KD-trees that were already built for the full batch.
+    """
+
+    def __init__(
+        self,
+        coordinates: TensorType['N', 3, torch.float32],
+        batch_counts: TensorType['B', torch.int64],
+        trees: Optional[List[LazyKDTree]]=None,
+    ):
+        self.version = CoordinatesVersion(coordinates)
+        self.batch_offsets = [0] + torch.cumsum(batch_counts, dim=0).tolist()
+
+        if trees is None:
+            trees = [
+                LazyKDTree(coordinates[start:end])
+                for start, end in zip(self.batch_offsets, self.batch_offsets[1:])
+            ]
+        self.trees = trees
+
+    def is_valid(self, coordinates: TensorType['N', 3, torch.float32]) -> bool:
+        return self.version.is_valid(coordinates)
+
+    def batch(
+        self,
+        index: TensorType['B', torch.int64],
+        coordinates: TensorType['N', 3, torch.float32],
+        batch_counts: TensorType['B', torch.int64],
+    ):
+        return SpatialIndex(
+            coordinates=coordinates,
+            batch_counts=batch_counts,
+            trees=[self.trees[b] for b in index.tolist()],
+        )
+
+    def query(
+        self,
+        coordinates: TensorType['M', 3, torch.float32],
+        batch_indices: TensorType['M', torch.int64],
+        k: int,
+        radius: Optional[float]=None,
+    ) -> Tuple[
+        TensorType['M', 'k', torch.int64],
+        TensorType['M', 'k', torch.float32],
+    ]:
+        """Neighbors of the query coordinates within their own batch element.
+        Missing neighbors have index -1 and squared distance inf.
+        """
+        coords = coordinates.detach().cpu().numpy()
+        batch_idxs = batch_indices.cpu().numpy()
+
+        neighbor_idxs = np.full((coords.shape[0], k), -1, dtype=np.int64)
+        sq_dists = np.full((coords.shape[0], k), np.inf, dtype=np.float32)
+        for b in np.unique(batch_idxs):
+            point_idxs = np.nonzero(batch_idxs == b)[0]
+            tree = self.trees[b].tree
+
+            if radius is None:  # k nearest neighbors
+                dists, idxs = tree.query(coords[point_idxs], k=k, workers=-1)
+                dists, idxs = dists.reshape(-1, k), idxs.reshape(-1, k)
+
+                # missing neighbors are padded with tree.n, keep these at -1
+                found = idxs < tree.n
+                rows, cols = np.nonzero(found)
+                rows = point_idxs[rows]
+                neighbor_idxs[rows, cols] = idxs[found] + self.batch_offsets[b]
+                sq_dists[rows, cols] = dists[found] ** 2
+                continue
+
+            # first k neighbors within radius, same as ballQuery
+            ball_idxs = tree.query_ball_point(
+                coords[point_idxs], r=radius, workers=-1, return_sorted=True,
+            )
+            ball_idxs = [idxs[:k] for idxs in ball_idxs]
+            counts = np.array([len(idxs) for idxs in ball_idxs], dtype=np.int64)
+            rows = np.repeat(point_idxs, counts)
+            cols = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            idxs = np.concatenate(ball_idxs + [[]]).astype(np.int64)
+            neighbor_idxs[rows, cols] = idxs + self.batch_offsets[b]
+            sq_dists[rows, cols] = np.sum((tree.data[idxs] - coords[rows]) ** 2, axis=-1)
+
+        return (
+            torch.from_numpy(neighbor_idxs).to(coordinates.device),
+            torch.from_numpy(sq_dists).to(coordinates.device),
+        )
+
+
 class PointTensor:
     """Implements abstraction of torch.Tensor for batched point cloud data."""
 
@@ -256,6 +422,15 @@ class PointTensor:
 
         self._features = value
 
+    @property
+    def spatial_index(self) -> SpatialIndex:
+        index = self.cache.spatial_index
+        if index is None or not index.is_valid(self._coordinates):
+            index = SpatialIndex(self._coordinates, self._batch_counts)
+            self.cache.spatial_index = index
+
+        return index
+
     @property
     def batch_size(self) -> int:
         return self._batch_counts.shape[0]
@@ -338,6 +513,13 @@ class PointTensor:
         pt._batch_counts = pt._batch_counts[index]
         _, pt._batch_indices = torch.unique_consecutive(pt.batch_indices, return_inverse=True)
 
+        # reuse KD-trees that were already built, otherwise build them lazily
+        spatial_index = self.cache.spatial_index
+        if spatial_index is not None and spatial_index.is_valid(self._coordinates):
+            pt.cache.spatial_index = spatial_index.batch(
+                index, pt._coordinates, pt._batch_counts,
+            )
+
         return pt
 
     def _fps(
@@ -475,9 +657,8 @@ class PointTensor:
             coordinates = torch.column_stack(
                 (self._coordinates, 2 * max_range * self._batch_indices)
             )
-            dists = torch.linalg.norm(coordinates[None] - coordinates[:, None], axis=-1)
-            cluster_idxs = teethland.cluster.wdbscan(
-                dmatrix=dists,
+            cluster_idxs = teethland.cluster.sparse_wdbscan(
+                coordinates=coordinates,
                 epsilon=max_neighbor_dist,
                 mu=min_points,
                 weights=self.F,
@@ -546,6 +727,7 @@ class PointTensor:
         other,
         k: Union[int, TensorType['M', torch.int64]],
         method: str,
+        index: bool=False,
         **kwargs,
     ) -> Union[
         Tuple[
@@ -585,6 +767,17 @@ class PointTensor:
         else:
             raise ValueError(f'Nearest neighbors method unknown, got {method}.')
 
+        if index:
+            assert isinstance(k, int), (
+                f'Spatial index requires k to be an int, got {type(k)}.'
+            )
+            return self.spatial_index.query(
+                other._coordinates,
+                other._batch_indices,
+                k,
+                kwargs['radius'] if method == 'ball' else None,
+            )
+
         neighbor_idxs, sq_dists = method_fn(
             self._coordinates,
             self._batch_counts,
@@ -606,6 +799,7 @@ class PointTensor:
         k: Union[int, TensorType['M', torch.int32]]=16,
         cache: bool=False,
         method: str='knn',
+        index: bool=False,
         **kwargs: dict,
     ) -> Union[
         Tuple[
@@ -632,7 +826,7 @@ class PointTensor:
             return tuple(self.cache[key] for key in cache_keys)
 
         other = self if other is None else other
-        neighbor_idxs, sq_dists = self._neighbors(other, k, method, **kwargs)
+        neighbor_idxs, sq_dists = self._neighbors(other, k, method, index, **kwargs)
 
         if other is self and cache:
             self.cache[cache_keys[0]] = neighbor_idxs
@@ -647,7 +841,9 @@ class PointTensor:
                     other._coordinates.repeat_interleave(k, dim=0)
                 )
             )
-            sq_dists = torch.sum(coords ** 2, dim=-1)
+            sq_dists = torch.where(
+                neighbor_idxs >= 0, torch.sum(coords ** 2, dim=-1), torch.inf,
+            )
 
         return neighbor_idxs, sq_dists
 
@@ -660,14 +856,73 @@ class PointTensor:
             features=self.F[neighbor_idxs],
         )
 
-    def interpolate(self, other, k: int=3, dist_thresh: float=1e6, eps: float=1e-8):
+    def interpolation_weights(
+        self,
+        other,
+        k: int=3,
+        eps: float=1e-8,
+        index: bool=False,
+        cache: bool=False,
+    ) -> Tuple[
+        TensorType['M', 'k', torch.int64],
+        TensorType['M', 'k', torch.float32],
+        TensorType['M', 'k', torch.float32],
+    ]:
+        """Neighbor indices, squared distances, and inverse distance weights to
+        interpolate from self to other. With cache=True, these are saved in the
+        cache of self, keyed by the coordinates of other, and reused until the
+        coordinates of self or other change or the coordinates of other are freed.
+        """
+        interpolations = self.cache.interpolations
+        cache_key = (other._coordinates.data_ptr(), k, eps, index)
+        if cache:
+            # drop entries of which the coordinates of other have been freed
+            for key in [
+                key for key, interp in interpolations.items()
+                if interp.other_coordinates() is None
+            ]:
+                del interpolations[key]
+
+            interp = interpolations.get(cache_key)
+            if interp is not None:
+                if interp.is_valid(self._coordinates, other._coordinates):
+                    return interp.neighbor_idxs, interp.sq_dists, interp.weights
+
+                del interpolations[cache_key]
+
+        interp = InterpolationWeights(
+            self._coordinates,
+            other._coordinates,
+            *self._neighbors(other, k, 'knn', index),
+            eps,
+        )
+
+        if cache:
+            interpolations[cache_key] = interp
+
+        return interp.neighbor_idxs, interp.sq_dists, interp.weights
+
+    def interpolate(
+        self,
+        other,
+        k: int=3,
+        dist_thresh: float=1e6,
+        eps: float=1e-8,
+        index: bool=False,
+        cache: bool=False,
+    ):
         assert self.has_features, 'self must have features other than None.'
         assert self.F.dtype in [torch.int32, torch.int64, torch.float32, torch.float64], (
             f'self.F must have float32/64 or int32/64, got {self.F.dtype}.'
         )
 
-        neighbor_idxs, sq_dists = self._neighbors(other, k, 'knn')
-        weights = 1 / (sq_dists + eps)
+        neighbor_idxs, sq_dists, weights = self.interpolation_weights(
+            other, k, eps, index, cache,
+        )
+
+        # missing neighbors (index -1) have zero weight, gather any valid point
+        found = neighbor_idxs >= 0
+        neighbor_idxs = neighbor_idxs.clamp(min=0)
 
         if self.F.dtype in [torch.float32, torch.float64]:
             weights = weights.to(self.F)
@@ -680,24 +935,27 @@ class PointTensor:
             mask = (
                 torch.any(sq_dists == 0, dim=1)
                 |
-                torch.all(torch.sqrt(sq_dists) < dist_thresh, dim=1)
+                torch.all((torch.sqrt(sq_dists) < dist_thresh) | ~found, dim=1)
             )
             features[~mask] = 0.0
         elif self.F.dtype in [torch.int32, torch.int64]:
+            # accumulate normalized weights of neighbors for each unique value
+            values, value_idxs = torch.unique(self.F, return_inverse=True)
             weights = weights.float()
-            features = torch.full((neighbor_idxs.shape[0],), self.F.amin()).to(self.F)
-            max_interp = torch.zeros_like(features).float()
-            for value in torch.unique(self.F)[1:]:
-                interp = torch.einsum(
-                    'Mk...,Mk,M->M...',
-                    (self.F == value).float()[neighbor_idxs],
-                    weights,
-                    1 / weights.sum(dim=1),
-                )
+            votes = torch.zeros(
+                neighbor_idxs.shape[0], values.shape[0],
+                device=weights.device,
+            )
+            votes.scatter_add_(1, value_idxs[neighbor_idxs], weights)
+            votes *= (1 / weights.sum(dim=1)).unsqueeze(1)
+
+            # majority of any value except the minimum, with ties to lowest value
+            features = torch.full_like(votes[:, 0], values[0], dtype=self.F.dtype)
+            if values.shape[0] > 1:
+                max_votes, max_idxs = votes[:, 1:].max(dim=1)
                 features = torch.where(
-                    (interp >= 0.5) & (interp > max_interp), value, features,
+                    max_votes >= 0.5, values[1:][max_idxs], features,
                 )
-                max_interp = torch.maximum(max_interp, interp)
 
         return other.new_tensor(features=features)
 
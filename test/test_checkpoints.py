@@ -0,0 +1,29 @@
+import torch
+
+from teethland.models.checkpoints import CheckpointRegistry
+
+
+def test_shared_checkpoint_loaded_once(tmp_path, monkeypatch):
+    path = tmp_path / 'fullnet.ckpt'
+    torch.save({'state_dict': {'backbone.weight': torch.ones(2)}}, path)
+
+    num_loads = 0
+    load = torch.load
+
+    def counting_load(*args, **kwargs):
+        nonlocal num_loads
+        num_loads += 1
+        return load(*args, **kwargs)
+
+    monkeypatch.setattr(torch, 'load', counting_load)
+
+    registry = CheckpointRegistry()
+    for _ in range(3):  # align, instance, and single tooth stages
+        registry.acquire(path)
+
+    for _ in range(3):
+        assert torch.equal(registry.submodule(path, 'backbone')['weight'], torch.ones(2))
+        registry.release(path)
+
+    assert num_loads == 1
+    assert not registry.checkpoints and not registry.groups
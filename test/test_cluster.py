@@ -0,0 +1,112 @@
+import pytest
+import torch
+
+from teethland import PointTensor
+from teethland.cluster import learned_region_cluster, sparse_wdbscan, wdbscan
+
+
+def synthetic_embeddings(
+    batch_size: int=2,
+    num_points: int=2000,
+    num_teeth: int=8,
+    seed: int=0,
+):
+    g = torch.Generator().manual_seed(seed)
+
+    # points are pulled towards one of the tooth centroids
+    coords = torch.rand(batch_size * num_points, 3, generator=g)
+    centroids = torch.rand(batch_size, num_teeth, 3, generator=g)
+    batch_idxs = torch.arange(batch_size).repeat_interleave(num_points)
+    tooth_idxs = torch.randint(num_teeth, (batch_size * num_points,), generator=g)
+    dirs = centroids[batch_idxs, tooth_idxs] - coords
+
+    offsets = dirs + 0.01 * torch.randn(coords.shape, generator=g)
+    offsets = torch.atanh(offsets.clamp(-0.99, 0.99))
+    sigmas = torch.log(400 * (1 + 0.5 * torch.rand(coords.shape[0], 1, generator=g))) / 10
+    errors = torch.linalg.norm(dirs - torch.tanh(offsets), dim=-1, keepdim=True)
+    seeds = 1 - 5 * errors - 0.2 * torch.rand(errors.shape, generator=g)
+    seeds = torch.logit(seeds.clamp(0.01, 0.99))
+    seeds[torch.rand(coords.shape[0], generator=g) < 0.2] = -5  # gingiva
+
+    batch_counts = torch.full((batch_size,), num_points)
+    return [
+        PointTensor(coords, features, batch_counts)
+        for features in [offsets, sigmas, seeds]
+    ]
+
+
+@pytest.mark.parametrize('num_seeds', [1, 7, 256])
+@pytest.mark.parametrize('seed', [0, 1])
+def test_learned_region_cluster_batched(num_seeds, seed):
+    offsets, sigmas, seeds = synthetic_embeddings(seed=seed)
+
+    sequential = learned_region_cluster(offsets, sigmas, seeds)
+    batched = learned_region_cluster(
+        offsets, sigmas, seeds, batched=True, num_seeds=num_seeds,
+    )
+
+    assert torch.any(sequential.F >= 0)
+    assert torch.equal(sequential.F, batched.F)
+
+
+def test_learned_region_cluster_batched_ties():
+    offsets, sigmas, seeds = synthetic_embeddings()
+    seeds.F = torch.where(seeds.F > 0, seeds.F.amax(), seeds.F)  # all seeds tie
+
+    sequential = learned_region_cluster(offsets, sigmas, seeds)
+    batched = learned_region_cluster(offsets, sigmas, seeds, batched=True, num_seeds=16)
+
+    assert torch.equal(sequential.F, batched.F)
+
+
+def test_learned_region_cluster_batched_no_foreground():
+    offsets, sigmas, seeds = synthetic_embeddings()
+    seeds.F = torch.full_like(seeds.F, -5)
+
+    sequential = learned_region_cluster(offsets, sigmas, seeds)
+    batched = learned_region_cluster(offsets, sigmas, seeds, batched=True)
+
+    assert torch.all(sequential.F == -1)
+    assert torch.equal(sequential.F, batched.F)
+
+
+def random_landmarks(num_points: int=300, seed: int=0):
+    g = torch.Generator().manual_seed(seed)
+
+    # points around a few landmarks, plus uniform outliers
+    centers = torch.rand(10, 3, generator=g)
+    center_idxs = torch.randint(10, (num_points,), generator=g)
+    coords = centers[center_idxs] + 0.02 * torch.randn(num_points, 3, generator=g)
+    coords[:num_points // 10] = torch.rand(num_points // 10, 3, generator=g)
+    weights = torch.rand(num_points, generator=g)
+
+    return coords, weights
+
+
+@pytest.mark.parametrize('noise', [True, False])
+@pytest.mark.parametrize('weighted', [True, False])
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_sparse_wdbscan(noise, weighted, seed):
+    coords, weights = random_landmarks(seed=seed)
+    weights = weights if weighted else None
+    mu = 2.0 if weighted else 4
+
+    dists = torch.linalg.norm(coords[None] - coords[:, None], axis=-1)
+    expected = wdbscan(dists, epsilon=0.03, mu=mu, weights=weights, noise=noise)
+    status = sparse_wdbscan(coords, epsilon=0.03, mu=mu, weights=weights, noise=noise)
+
+    assert torch.equal(status, expected)
+
+
+def test_sparse_wdbscan_edge_cases():
+    # duplicate points, a single point, and only noise
+    coords = torch.tensor([[0.0, 0.0, 0.0]] * 3 + [[1.0, 1.0, 1.0]])
+    for mu in [1, 2, 10]:
+        dists = torch.linalg.norm(coords[None] - coords[:, None], axis=-1)
+        for noise in [True, False]:
+            expected = wdbscan(dists, epsilon=0.03, mu=mu, noise=noise)
+            status = sparse_wdbscan(coords, epsilon=0.03, mu=mu, noise=noise)
+            assert torch.equal(status, expected)
+
+    status = sparse_wdbscan(coords[:1], epsilon=0.03, mu=1)
+    assert torch.equal(status, torch.tensor([1]))
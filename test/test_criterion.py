@@ -0,0 +1,128 @@
+import pytest
+import torch
+
+from teethland import PointTensor
+from teethland.nn.modules.criterion import SpatialEmbeddingLoss
+from teethland.nn.modules.loss import lovasz_hinge_batch, lovasz_hinge_flat
+
+
+def spatial_embedding_loss_loop(
+    criterion: SpatialEmbeddingLoss,
+    pred_offsets: PointTensor,
+    pred_sigmas: PointTensor,
+    pred_seeds: PointTensor,
+    targets: PointTensor,
+):
+    loss = 0
+    for b in range(targets.batch_size):
+        spatial_emb = torch.tanh(pred_offsets.batch(b).F) + pred_offsets.batch(b).C
+        sigma = pred_sigmas.batch(b).F
+        seed_map = torch.sigmoid(pred_seeds.batch(b).F)
+
+        smooth_loss = 0
+        instance_loss = 0
+        seed_loss = 0
+        obj_count = 0
+
+        instances = targets.batch(b).F
+
+        bg_mask = instances == -1
+        if bg_mask.sum() > 0:
+            seed_loss += torch.sum(torch.pow(seed_map[bg_mask] - 0, 2))
+
+        for k in instances.unique()[1:]:
+            mask_k = instances == k
+
+            center_k = spatial_emb[mask_k].mean(0)
+
+            sigmas_ki = sigma[mask_k]
+            sigma_k = sigmas_ki.mean(0)
+
+            smooth_loss = smooth_loss + torch.mean(
+                torch.pow(sigmas_ki - sigma_k.detach(), 2),
+            )
+
+            sigma_k = torch.exp(sigma_k * 10)
+
+            probs_i = torch.exp(-1 * torch.sum(
+                sigma_k * torch.pow(spatial_emb - center_k, 2),
+                dim=1,
+            ))
+
+            logits_i = 2 * probs_i - 1
+            instance_loss = instance_loss + lovasz_hinge_flat(logits_i, mask_k)
+
+            seed_loss += criterion.w_foreground * torch.sum(
+                torch.pow(seed_map[mask_k] - probs_i[mask_k, None].detach(), 2),
+            )
+
+            obj_count += 1
+
+        if obj_count > 0:
+            instance_loss /= obj_count
+            smooth_loss /= obj_count
+
+        seed_loss = seed_loss / targets.batch_counts[b]
+
+        loss += (
+            criterion.w_instance * instance_loss
+            + criterion.w_smooth * smooth_loss
+            + criterion.w_seed * seed_loss
+        )
+
+    loss = loss / targets.batch_size
+
+    return loss + pred_offsets.F.sum()*0
+
+
+def random_predictions(instance_counts, num_points: int=300, seed: int=0):
+    g = torch.Generator().manual_seed(seed)
+
+    batch_counts = torch.full((len(instance_counts),), num_points)
+    coords = torch.rand(batch_counts.sum(), 3, generator=g)
+    instances = torch.cat([
+        torch.randint(-1, count, (num_points,), generator=g)
+        for count in instance_counts
+    ])
+    instances[::num_points] = -1  # every scan has background
+
+    preds = [
+        PointTensor(coords, 0.1 * torch.randn(coords.shape[0], channels, generator=g), batch_counts)
+        for channels in [3, 3, 1]
+    ]
+    for pred in preds:
+        pred.F.requires_grad_(True)
+    targets = PointTensor(coords, instances, batch_counts)
+
+    return preds, targets
+
+
+@pytest.mark.parametrize('max_chunk_elements', [1, 1000, 2**24])
+@pytest.mark.parametrize('instance_counts', [[4], [3, 5], [3, 0]])
+def test_spatial_embedding_loss(max_chunk_elements, instance_counts):
+    preds, targets = random_predictions(instance_counts)
+    criterion = SpatialEmbeddingLoss(max_chunk_elements=max_chunk_elements)
+
+    loss = criterion(*preds, targets)
+    grads = torch.autograd.grad(loss, [pred.F for pred in preds])
+    expected_loss = spatial_embedding_loss_loop(criterion, *preds, targets)
+    expected_grads = torch.autograd.grad(expected_loss, [pred.F for pred in preds])
+
+    assert torch.allclose(loss, expected_loss, rtol=1e-4)
+    for grad, expected_grad in zip(grads, expected_grads):
+        assert torch.allclose(grad, expected_grad, rtol=1e-3, atol=1e-6)
+
+
+def test_lovasz_hinge_batch():
+    g = torch.Generator().manual_seed(0)
+    logits = torch.randn(4, 50, generator=g)
+    labels = torch.rand(4, 50, generator=g) < 0.3
+    logits[1] = 0.5  # ties
+    labels[2] = False  # no foreground
+    labels[3] = True  # only foreground
+
+    losses = lovasz_hinge_batch(logits, labels)
+    for loss, row_logits, row_labels in zip(losses, logits, labels):
+        assert torch.allclose(loss, lovasz_hinge_flat(row_logits, row_labels))
+
+    assert torch.equal(lovasz_hinge_batch(logits[:, :0], labels[:, :0]), torch.zeros(4))
@@ -0,0 +1,52 @@
+import pytest
+import torch
+
+from benchmarks.label_interpolation import interpolate_labels_loop, synthetic_instances
+from teethland import PointTensor
+
+
+def label_grid(size: int, dtype: torch.dtype):
+    # labels on an integer grid, so the midpoints of cells tie between neighbors
+    i, j = torch.meshgrid(torch.arange(size), torch.arange(size), indexing='ij')
+    coords = torch.column_stack((i.flatten(), j.flatten(), torch.zeros(size ** 2)))
+    labels = (i + 2 * j).flatten() % 4 - 1
+
+    x = PointTensor(coordinates=coords.float(), features=labels.to(dtype))
+    queries = torch.cat((
+        coords,  # coinciding points
+        coords + torch.tensor([0.5, 0.0, 0.0]),  # ties between two neighbors
+        coords + torch.tensor([0.5, 0.5, 0.0]),  # ties between four neighbors
+    ))
+
+    return x, PointTensor(coordinates=queries.float())
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_interpolate_labels(seed):
+    x_down, x = synthetic_instances(16, 5000, 0.1, torch.device('cpu'), seed)
+
+    expected = interpolate_labels_loop(x_down, x)
+
+    assert torch.equal(x_down.interpolate(x, cache=True).F, expected)
+
+
+@pytest.mark.parametrize('dtype', [torch.int32, torch.int64])
+@pytest.mark.parametrize('k', [1, 2, 3, 4])
+def test_interpolate_labels_ties(k, dtype):
+    x, queries = label_grid(6, dtype)
+
+    interp = x.interpolate(queries, k, cache=True).F
+    expected = interpolate_labels_loop(x, queries, k)
+
+    assert interp.dtype == dtype
+    assert torch.equal(interp, expected)
+
+
+def test_interpolate_single_label():
+    x, queries = label_grid(4, torch.int64)
+    x = x.new_tensor(features=torch.full_like(x.F, 3))
+
+    interp = x.interpolate(queries, cache=True).F
+
+    assert torch.equal(interp, interpolate_labels_loop(x, queries))
+    assert torch.all(interp == 3)
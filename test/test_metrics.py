@@ -0,0 +1,220 @@
+import numpy as np
+import pytest
+import torch
+
+from teethland import PointTensor
+from teethland.metrics import LandmarkMeanAveragePrecision, ToothF1Score
+
+
+class ToothF1ScoreLoop(ToothF1Score):
+
+    def update(
+        self,
+        pred_instances: PointTensor,
+        pred_classes: PointTensor,
+        instances: PointTensor,
+        classes: PointTensor,
+    ) -> None:
+        num_pred = pred_instances.F.amax() + 1
+        num_true = instances.F.amax() + 1
+
+        if num_pred == 0 or num_true == 0:
+            self.tooth_fp += num_pred
+            self.tooth_fdi_fp += num_pred
+            self.tooth_fn += num_true
+            self.tooth_fdi_fn += num_true
+            return
+
+        ious = torch.zeros((num_pred, num_true)).to(instances.F.device, torch.float32)
+        tp_idxs = set()
+        for i in range(num_pred):
+            for j in range(num_true):
+                if j in tp_idxs:
+                    continue
+
+                pred_pos = pred_instances.F == i
+                target_pos = instances.F == j
+                tp = (pred_pos & target_pos).sum()
+                fp = (pred_pos & ~target_pos).sum()
+                fn = (~pred_pos & target_pos).sum()
+                
+                iou = tp / (tp + fp + fn)
+                ious[i, j] = iou
+
+                if iou >= self.iou_thresh:
+                    tp_idxs.add(j)
+                    break                    
+        
+        fp = (ious.amax(1) < self.iou_thresh).sum()
+        fn = (ious.amax(0) < self.iou_thresh).sum()
+        tp = (num_pred + num_true - fp - fn) // 2
+        self.tooth_fp += fp
+        self.tooth_fn += fn
+        self.tooth_tp += tp
+
+        if not self.fdi:
+            return
+
+        idxs = torch.nonzero(ious >= self.iou_thresh)
+        match_classes = torch.column_stack((
+            pred_classes.F.argmax(-1)[idxs[:, 0]],
+            classes.F[idxs[:, 1]],
+        ))
+        fp += (match_classes[:, 0] != match_classes[:, 1]).sum()
+        fn += (match_classes[:, 0] != match_classes[:, 1]).sum()
+        tp -= 2 * (match_classes[:, 0] != match_classes[:, 1]).sum()      
+        self.tooth_fdi_fp += fp
+        self.tooth_fdi_fn += fn
+        self.tooth_fdi_tp += tp
+
+
+def random_scan(num_pred: int, num_true: int, num_points: int=500, seed: int=0):
+    g = torch.Generator().manual_seed(seed)
+
+    # predictions are noisy and partly merged or split copies of the targets
+    coords = torch.rand(num_points, 3, generator=g)
+    instances = torch.randint(-1, num_true, (num_points,), generator=g)
+    pred_instances = torch.where(
+        torch.rand(num_points, generator=g) < 0.7,
+        instances % max(num_pred, 1),
+        torch.randint(-1, num_pred, (num_points,), generator=g),
+    )
+    if num_pred == 0:
+        pred_instances = torch.full_like(instances, -1)
+
+    num_classes = 8
+    pred_classes = torch.randn(max(num_pred, 1), num_classes, generator=g)[:num_pred]
+    classes = torch.randint(num_classes, (num_true,), generator=g)
+
+    return (
+        PointTensor(coords, pred_instances),
+        PointTensor(torch.rand(num_pred, 3, generator=g), pred_classes),
+        PointTensor(coords, instances),
+        PointTensor(torch.rand(num_true, 3, generator=g), classes),
+    )
+
+
+@pytest.mark.parametrize('iou_thresh', [0.1, 0.3, 0.5, 0.8])
+def test_tooth_f1_score(iou_thresh):
+    metric = ToothF1Score(iou_thresh, fdi=True)
+    expected_metric = ToothF1ScoreLoop(iou_thresh, fdi=True)
+    for seed, (num_pred, num_true) in enumerate([
+        (8, 8), (5, 10), (12, 6), (0, 6), (6, 0), (1, 1),
+    ]):
+        scan = random_scan(num_pred, num_true, seed=seed)
+        metric.update(*scan)
+        expected_metric.update(*scan)
+
+    for name in ['tp', 'fp', 'fn', 'fdi_tp', 'fdi_fp', 'fdi_fn']:
+        assert getattr(metric, f'tooth_{name}') == getattr(expected_metric, f'tooth_{name}')
+
+
+def voc_ap_loop(rec, prec):
+    rec = rec.cpu().numpy()
+    prec = prec.cpu().numpy()
+
+    mrec = np.concatenate(([0.], rec, [1.]))
+    mpre = np.concatenate(([0.], prec, [0.]))
+
+    for i in range(mpre.size - 1, 0, -1):
+        mpre[i - 1] = np.maximum(mpre[i - 1], mpre[i])
+
+    i = np.where(mrec[1:] != mrec[:-1])[0]
+
+    return np.sum((mrec[i + 1] - mrec[i]) * mpre[i + 1])
+
+
+def eval_ap_loop(pred_coords, pred_batch_idxs, gt_coords, gt_batch_idxs, dist_thresh):
+    batch_idxs = torch.unique(torch.cat((pred_batch_idxs, gt_batch_idxs)))
+
+    class_recs, npos = {}, 0
+    for i in batch_idxs:
+        keypoints = gt_coords[gt_batch_idxs == i]
+        npos += keypoints.shape[0]
+        class_recs[i.item()] = {'kp': keypoints, 'det': [False] * keypoints.shape[0]}
+
+    nd = pred_coords.shape[0]
+    tp = torch.zeros(nd)
+    fp = torch.zeros(nd)
+    for d in range(nd):
+        R = class_recs[pred_batch_idxs[d].item()]
+        dmin = torch.inf
+        if R['kp'].numel() > 0:
+            distance = torch.linalg.norm(pred_coords[d].reshape(-1, 3) - R['kp'], axis=1)
+            dmin = min(distance)
+            jmin = torch.argmin(distance)
+
+        if dmin < dist_thresh and not R['det'][jmin]:
+            tp[d] = 1.
+            R['det'][jmin] = 1
+        else:
+            fp[d] = 1.
+
+    fp = torch.cumsum(fp, dim=0)
+    tp = torch.cumsum(tp, dim=0)
+    rec = tp / float(npos)
+    prec = tp / torch.maximum(tp + fp, torch.tensor(1e-9))
+
+    return voc_ap_loop(rec, prec)
+
+
+def random_landmarks(num_meshes: int=6, seed: int=0):
+    g = torch.Generator().manual_seed(seed)
+
+    scans = []
+    for _ in range(num_meshes):
+        num_true = int(torch.randint(0, 8, (), generator=g))
+        gt_coords = torch.rand(num_true, 3, generator=g)
+        gt_classes = torch.randint(3, (num_true,), generator=g)
+
+        # detections near keypoints, duplicated detections, and false positives
+        num_pred = int(torch.randint(0, 10, (), generator=g))
+        if num_true:
+            idxs = torch.randint(num_true, (num_pred,), generator=g)
+            pred_coords = gt_coords[idxs] + 0.08 * torch.randn(num_pred, 3, generator=g)
+            pred_classes = gt_classes[idxs]
+        else:
+            pred_coords = torch.rand(num_pred, 3, generator=g)
+            pred_classes = torch.randint(3, (num_pred,), generator=g)
+        pred_coords = torch.cat((pred_coords, pred_coords[:1]))
+        pred_classes = torch.cat((pred_classes, pred_classes[:1]))
+
+        scans.append((
+            PointTensor(pred_coords, torch.column_stack((torch.ones_like(pred_classes), pred_classes)).float()),
+            PointTensor(gt_coords, gt_classes),
+        ))
+
+    return scans
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_landmark_map(seed):
+    scans = random_landmarks(seed=seed)
+    metric = LandmarkMeanAveragePrecision()
+    for pred_landmarks, landmarks in scans:
+        metric.update(pred_landmarks, landmarks)
+
+    pred_coords = torch.cat([pred.C for pred, _ in scans])
+    pred_classes = torch.cat([pred.F[:, 1].long() for pred, _ in scans])
+    pred_batch_idxs = torch.cat([torch.full((pred.C.shape[0],), b) for b, (pred, _) in enumerate(scans)])
+    gt_coords = torch.cat([gt.C for _, gt in scans])
+    gt_classes = torch.cat([gt.F for _, gt in scans])
+    gt_batch_idxs = torch.cat([torch.full((gt.C.shape[0],), b) for b, (_, gt) in enumerate(scans)])
+
+    thresh_aps = []
+    for dist_thresh in metric.dist_threshs:
+        aps = []
+        for cls in torch.unique(gt_classes):
+            pred_mask, gt_mask = pred_classes == cls, gt_classes == cls
+            if not torch.any(pred_mask):  # previous implementation failed here
+                aps.append(0.0)
+                continue
+
+            aps.append(eval_ap_loop(
+                pred_coords[pred_mask], pred_batch_idxs[pred_mask],
+                gt_coords[gt_mask], gt_batch_idxs[gt_mask],
+                dist_thresh,
+            ))
+        thresh_aps.append(np.mean(aps))
+
+    assert abs(metric.compute().item() - np.mean(thresh_aps)) < 1e-7
@@ -0,0 +1,56 @@
+import pytest
+import torch
+
+from benchmarks.nms import (
+    instance_nms_loop,
+    synthetic_proposals,
+    synthetic_tta_clusters,
+    tta_nms_loop,
+)
+from teethland import PointTensor
+from teethland.models.fullnet import instance_nms, tta_nms
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_instance_nms(seed):
+    probs, point_idxs = synthetic_proposals(16, 200, 1000, torch.device('cpu'), seed)
+
+    assert torch.equal(instance_nms(probs, point_idxs), instance_nms_loop(probs, point_idxs))
+
+
+def test_instance_nms_edge_cases():
+    probs, point_idxs = synthetic_proposals(8, 200, 1000, torch.device('cpu'))
+    features = probs.F.reshape(point_idxs.shape).clone()
+
+    # proposal without foreground, duplicated proposal with tied score, and
+    # proposal with duplicate point indices
+    features[0] = 0.0
+    features[2], point_idxs[2] = features[1], point_idxs[1]
+    point_idxs[3, 100:] = point_idxs[3, :100]
+    probs = probs.new_tensor(features=features.flatten())
+
+    assert torch.equal(instance_nms(probs, point_idxs), instance_nms_loop(probs, point_idxs))
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_tta_nms(seed):
+    clusters, labels = synthetic_tta_clusters(8, 1000, torch.device('cpu'), seed)
+
+    assert torch.equal(tta_nms(clusters, labels), tta_nms_loop(clusters, labels))
+
+
+def test_tta_nms_edge_cases():
+    # instance 1 and 3 have no points, instances 0 and 2 are identical
+    clusters = PointTensor(
+        coordinates=torch.rand(8, 3),
+        features=torch.tensor([0, 0, -1, -1, 2, 2, -1, -1]),
+        batch_counts=torch.tensor([4, 4]),
+    )
+    labels = PointTensor(
+        coordinates=torch.rand(4, 3),
+        batch_counts=torch.tensor([2, 2]),
+    )
+
+    keep = tta_nms(clusters, labels)
+    assert torch.equal(keep, tta_nms_loop(clusters, labels))
+    assert torch.equal(keep, torch.tensor([0, 1, 3]))
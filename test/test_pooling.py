@@ -0,0 +1,87 @@
+import pytest
+import torch
+from torch_scatter import scatter_mean
+
+import teethland
+from teethland import PointTensor
+from teethland.nn.modules.pooling import MaskedAveragePooling
+
+
+def masked_average_pooling_loop(
+    module: MaskedAveragePooling,
+    features: PointTensor,
+    instances: PointTensor,
+):
+    ids = instances.F.unique()
+    if ids.shape[0] == 1:
+        out = PointTensor(
+            coordinates=features.C[:0],
+            features=features.F[:0],
+            batch_counts=0 * features.batch_counts,
+        )
+
+        return out, out
+
+    prototypes, embeddings = [], []
+    for id in ids[1:]:
+        prototype = features[instances.F == id]
+
+        prototypes.append(prototype)
+        embeddings.append(prototype.F.mean(0))
+
+    prototypes = teethland.stack(prototypes)
+    embeddings = torch.stack(embeddings)
+
+    centroids = scatter_mean(
+        instances.C[instances.F >= 0], 
+        instances.F[instances.F >= 0],
+        dim=0
+    )
+    
+    batch_counts = []
+    for idx in torch.unique(instances.batch_indices):
+        count = torch.unique(instances.F[instances.batch_indices == idx]).shape[0] - 1
+        batch_counts.append(count)
+    out = PointTensor(
+        coordinates=centroids,
+        features=module.mlp(embeddings),
+        batch_counts=torch.tensor(batch_counts).to(instances.batch_indices),
+    )
+
+    return prototypes, out
+
+
+def random_instances(instance_counts, num_points: int=200, seed: int=0):
+    g = torch.Generator().manual_seed(seed)
+
+    # consecutive instance indices over the batch, -1 in every batch element
+    instance_idxs, offset = [], 0
+    for count in instance_counts:
+        idxs = torch.randint(-1, count, (num_points,), generator=g)
+        idxs[0] = -1
+        instance_idxs.append(torch.where(idxs >= 0, idxs + offset, -1))
+        offset += count
+
+    batch_counts = torch.full((len(instance_counts),), num_points)
+    coords = torch.rand(batch_counts.sum(), 3, generator=g)
+    features = PointTensor(coords, torch.randn(coords.shape[0], 16, generator=g), batch_counts)
+    instances = PointTensor(coords, torch.cat(instance_idxs), batch_counts)
+
+    return features, instances
+
+
+@pytest.mark.parametrize('instance_counts', [[5], [3, 4], [4, 0, 2], [0, 0]])
+def test_masked_average_pooling(instance_counts):
+    torch.manual_seed(0)
+    module = MaskedAveragePooling(num_features=16, out_channels=8)
+    features, instances = random_instances(instance_counts)
+
+    prototypes, out = module(features, instances)
+    expected_prototypes, expected_out = masked_average_pooling_loop(module, features, instances)
+
+    assert torch.allclose(out.C, expected_out.C, atol=1e-6)
+    assert torch.allclose(out.F, expected_out.F, atol=1e-5)
+    assert torch.equal(out.batch_counts, expected_out.batch_counts)
+    assert torch.equal(prototypes.batch_counts, expected_prototypes.batch_counts)
+    assert torch.equal(prototypes.C, expected_prototypes.C)
+    assert torch.equal(prototypes.F, expected_prototypes.F)
@@ -0,0 +1,88 @@
+import pytest
+import torch
+
+from teethland import PointTensor
+from teethland.nn.modules.stratified_transformer import StratifiedTransformer
+
+
+def random_model(out_channels):
+    model = StratifiedTransformer(
+        in_channels=6,
+        channels_list=[8, 16, 24, 32],
+        out_channels=out_channels,
+        depths=[1, 1, 1],
+        heads_list=[2, 2, 2],
+        window_sizes=[0.1, 0.2, 0.4],
+        point_embedding={
+            'use': True,
+            'kpconv_point_influence': 0.02,
+            'kpconv_ball_radius': 0.05,
+        },
+        stratified_union=False,
+        downsample_ratio=0.26,
+        max_drop_path_prob=0.0,
+        stratified_downsample_ratio=0.26,
+        crpe_bins=8,
+        transformer_lr_ratio=0.1,
+    )
+
+    # random norm weights and biases, so they do not fold away trivially
+    torch.manual_seed(0)
+    with torch.no_grad():
+        for param in [*model.upsample_blocks.parameters(), *model.heads.parameters()]:
+            param.normal_()
+
+    return model
+
+
+def random_inputs(batch_counts=(40, 24)):
+    # encoding and skip connections from coarse to fine, as in forward
+    generator = torch.Generator().manual_seed(1)
+    inputs, features = [], []
+    for scale, channels in zip([1, 4, 16, 64], [32, 24, 16, 8]):
+        counts = torch.tensor(batch_counts) * scale // 8
+        features.append(torch.randn(counts.sum(), channels, generator=generator))
+        features[-1].requires_grad_()
+        inputs.append(PointTensor(
+            coordinates=torch.rand(counts.sum(), 3, generator=generator),
+            features=features[-1],
+            batch_counts=counts,
+        ))
+
+    return inputs[0], inputs[1:], features
+
+
+def outputs_and_gradients(model, grouped: bool):
+    model.zero_grad()
+    encoding, x_ups, features = random_inputs()
+    if grouped:
+        outs = model.decode_grouped(encoding, x_ups)
+    else:
+        outs = model.decode(encoding, x_ups)
+
+    # weigh outputs randomly so every output channel gets its own gradient
+    generator = torch.Generator().manual_seed(2)
+    loss = sum((out.F * torch.randn(out.F.shape, generator=generator)).sum() for out in outs)
+    loss.backward()
+
+    grads = [feats.grad for feats in features]
+    grads += [param.grad.clone() for param in model.parameters() if param.grad is not None]
+
+    return [out.F.detach() for out in outs], grads
+
+
+@pytest.mark.parametrize('out_channels', [[1, 4, 4, 4, 4, 4], [2, None]])
+def test_decode_grouped(out_channels):
+    model = random_model(out_channels)
+
+    outs, grads = outputs_and_gradients(model, grouped=False)
+    grouped_outs, grouped_grads = outputs_and_gradients(model, grouped=True)
+
+    assert len(outs) == len(grouped_outs) == len(out_channels)
+    for out, grouped_out in zip(outs, grouped_outs):
+        assert out.shape == grouped_out.shape
+        assert torch.allclose(out, grouped_out, rtol=1e-4, atol=1e-4)
+
+    assert len(grads) == len(grouped_grads)
+    for grad, grouped_grad in zip(grads, grouped_grads):
+        assert torch.allclose(grad, grouped_grad, rtol=1e-4, atol=1e-3)
@@ -0,0 +1,167 @@
+import json
+
+import pytest
+import torch
+from torch.distributions.multivariate_normal import MultivariateNormal
+
+from teethland import PointTensor
+from teethland.datamodules import TeethInstSegDataModule
+
+
+def determine_transition_probabilities_loop(classes, idxs, is_lower):
+    with open('fdi_pair_distrs.json', 'r') as f:
+        pair_normals = json.load(f)
+    means = torch.tensor(pair_normals['means']).to(classes.F.device)
+    covs = torch.tensor(pair_normals['covs']).to(classes.F.device)
+
+    offset = 16 * is_lower
+    normals = MultivariateNormal(
+        loc=means[offset:offset + 16, offset:offset + 16, :2],
+        covariance_matrix=covs[offset:offset + 16, offset:offset + 16, :2, :2],
+    )
+
+    trans_log_probs = torch.zeros(idxs.shape[0] - 1, 16, 16).to(classes.F)
+    for i, (idx1, idx2) in enumerate(zip(idxs[:-1], idxs[1:])):
+        offsets = classes.C[idx2] - classes.C[idx1]
+        trans_log_probs[i] = normals.log_prob(offsets[:2])
+
+    return trans_log_probs
+
+
+def determine_seqence_loop(classes):
+    directions = classes.C / torch.linalg.norm(classes.C, dim=-1, keepdim=True)
+    cos_angles = torch.einsum('ni,mi->nm', directions, directions)
+
+    idxs = torch.full((classes.C.shape[0],), -1).to(classes.C.device)
+    inverse = torch.full_like(idxs, -1)
+    idxs[0] = classes.C[:, 1].argmax()  # most posterior
+    inverse[idxs[0]] = 0
+    for i in range(1, idxs.shape[0]):
+        dots = cos_angles[idxs[i - 1], inverse == -1]
+        next_idx = torch.nonzero(inverse == -1)[dots.argmax(), 0]
+        idxs[i] = next_idx
+        inverse[next_idx] = i
+
+    return idxs, inverse
+
+
+def dynamic_programming_loop(classes, idxs, trans_log_probs, tooth_factor=4.0):
+    log_probs = torch.log(classes.F.softmax(dim=-1))
+
+    q = torch.zeros_like(log_probs)
+    q[0] = -tooth_factor * log_probs[idxs[0]]
+
+    up = torch.arange(16).to(classes.F.device)
+    p = torch.zeros_like(q).long()
+    p[0] = up
+
+    for i in range(1, classes.F.shape[0]):
+        for j in range(16):
+            prev_costs = q[i - 1]
+            trans_costs = -trans_log_probs[i - 1, :, j]
+            trans_costs[j] = 40
+
+            costs = prev_costs + trans_costs
+            m = costs.amin()
+            q[i, j] = m - tooth_factor * log_probs[idxs[i], j]
+            p[i, j] = costs.argmin()
+
+    path = q[-1].argmin(keepdim=True)
+    for i in range(p.shape[0] - 1):
+        path = torch.cat((p[None, -1 - i, path[0]], path))
+
+    return path, q[-1].min()
+
+
+@pytest.fixture
+def dm():
+    # the decoding methods do not depend on the configuration
+    return TeethInstSegDataModule.__new__(TeethInstSegDataModule)
+
+
+def random_teeth(num_teeth: int, seed: int=0):
+    generator = torch.Generator().manual_seed(seed)
+
+    return PointTensor(
+        coordinates=20 * torch.rand(num_teeth, 3, generator=generator) - 10,
+        features=4 * torch.randn(num_teeth, 16, generator=generator),
+    )
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+@pytest.mark.parametrize('num_teeth', [1, 2, 16, 32])
+def test_determine_seqence(dm, num_teeth, seed):
+    classes = random_teeth(num_teeth, seed)
+
+    idxs, inverse = dm.determine_seqence(classes)
+    expected_idxs, expected_inverse = determine_seqence_loop(classes)
+
+    assert torch.equal(idxs, expected_idxs)
+    assert torch.equal(inverse, expected_inverse)
+
+
+def test_determine_seqence_ties(dm):
+    # duplicate teeth and teeth in the same direction have tied cosines
+    coords = torch.tensor([
+        [0.0, 10.0, 0.0], [5.0, 5.0, 0.0], [0.0, 10.0, 0.0], [1.0, 1.0, 0.0],
+        [-5.0, 5.0, 0.0], [2.0, 2.0, 0.0], [-5.0, 5.0, 0.0], [5.0, -5.0, 0.0],
+    ])
+    classes = PointTensor(coordinates=coords, features=torch.zeros(8, 16))
+
+    idxs, inverse = dm.determine_seqence(classes)
+    expected_idxs, expected_inverse = determine_seqence_loop(classes)
+
+    assert torch.equal(idxs, expected_idxs)
+    assert torch.equal(inverse, expected_inverse)
+
+
+@pytest.mark.parametrize('is_lower', [False, True])
+@pytest.mark.parametrize('num_teeth', [1, 2, 16])
+def test_transition_probabilities(dm, num_teeth, is_lower):
+    classes = random_teeth(num_teeth)
+    idxs = torch.randperm(num_teeth, generator=torch.Generator().manual_seed(1))
+
+    trans_log_probs = dm.determine_transition_probabilities(classes, idxs, is_lower)
+    expected = determine_transition_probabilities_loop(classes, idxs, is_lower)
+
+    assert trans_log_probs.shape == expected.shape
+    assert torch.allclose(trans_log_probs, expected, rtol=1e-5, atol=1e-5)
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+@pytest.mark.parametrize('num_teeth', [1, 2, 16])
+def test_dynamic_programming(dm, num_teeth, seed):
+    classes = random_teeth(num_teeth, seed)
+    idxs = torch.randperm(num_teeth, generator=torch.Generator().manual_seed(seed))
+    trans_log_probs = dm.determine_transition_probabilities(classes, idxs, seed % 2 == 1)
+
+    path, cost = dm.dynamic_programming(classes, idxs, trans_log_probs)
+    expected_path, expected_cost = dynamic_programming_loop(classes, idxs, trans_log_probs)
+
+    assert torch.equal(path, expected_path)
+    assert torch.equal(cost, expected_cost)
+
+
+def test_dynamic_programming_ties(dm):
+    # equal class scores and transitions, so every step ties
+    classes = random_teeth(8)
+    classes = classes.new_tensor(features=torch.zeros_like(classes.F))
+    idxs = torch.arange(8)
+    trans_log_probs = torch.zeros(7, 16, 16)
+
+    path, cost = dm.dynamic_programming(classes, idxs, trans_log_probs)
+    expected_path, expected_cost = dynamic_programming_loop(classes, idxs, trans_log_probs)
+
+    assert torch.equal(path, expected_path)
+    assert torch.equal(cost, expected_cost)
+
+    # ties in some classes only
+    features = torch.randint(3, (8, 16), generator=torch.Generator().manual_seed(0))
+    classes = classes.new_tensor(features=features.float())
+    trans_log_probs = -torch.randint(3, (7, 16, 16), generator=torch.Generator().manual_seed(1)).float()
+
+    path, cost = dm.dynamic_programming(classes, idxs, trans_log_probs)
+    expected_path, expected_cost = dynamic_programming_loop(classes, idxs, trans_log_probs)
+
+    assert torch.equal(path, expected_path)
+    assert torch.equal(cost, expected_cost)
@@ -0,0 +1,73 @@
+import importlib
+
+import numpy as np
+import pytest
+
+from benchmarks.teethseg_metrics import calculate_metrics_loop, synthetic_scan
+calculate_metrics = importlib.import_module('evaluation.3dteethseg').calculate_metrics
+
+
+def tied_scan(seed: int=0):
+    rng = np.random.default_rng(seed)
+
+    # integer coordinates keep centroids exact, so the mirrored teeth tie
+    tooth = rng.integers(-3, 4, size=(20, 3)).astype(float)
+    vertices = np.concatenate((
+        tooth + [-10, 0, 0], (tooth + [-10, 0, 0]) * [-1, 1, 1],
+        tooth + [0, -10, 0], rng.integers(-3, 4, size=(30, 3)) + [0, 20, 0],
+    ))
+    gt_instances = np.repeat([1, 2, 3, 0], [20, 20, 20, 30])
+    gt_labels = np.repeat([11, 21, 31, 0], [20, 20, 20, 30])
+
+    # one prediction between two teeth and one on the gingiva, non-contiguous ids
+    pred_instances = np.repeat([7, 7, 3, 12], [20, 20, 20, 30])
+    pred_instances[-20:] = 0
+    pred_labels = np.repeat([11, 11, 31, 41], [20, 20, 20, 30])
+    pred_labels[-20:] = 0
+
+    gt_label_dict = {'instances': gt_instances.tolist(), 'labels': gt_labels.tolist(), 'mesh_vertices': vertices}
+    pred_label_dict = {'instances': pred_instances.tolist(), 'labels': pred_labels.tolist()}
+
+    return gt_label_dict, pred_label_dict
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_calculate_metrics(seed):
+    gt_label_dict, pred_label_dict = synthetic_scan(16, 5000, seed)
+
+    metrics = calculate_metrics(gt_label_dict, pred_label_dict)
+    loop_metrics = calculate_metrics_loop(gt_label_dict, pred_label_dict)
+
+    assert np.allclose(metrics, loop_metrics, rtol=1e-12, atol=0)
+
+
+def test_calculate_metrics_ties():
+    gt_label_dict, pred_label_dict = tied_scan()
+
+    metrics = calculate_metrics(gt_label_dict, pred_label_dict)
+    loop_metrics = calculate_metrics_loop(gt_label_dict, pred_label_dict)
+
+    assert np.allclose(metrics, loop_metrics, rtol=1e-12, atol=0)
+
+
+def test_calculate_metrics_no_predictions():
+    gt_label_dict, pred_label_dict = tied_scan()
+    pred_label_dict['instances'] = [0] * len(pred_label_dict['instances'])
+    pred_label_dict['labels'] = [0] * len(pred_label_dict['labels'])
+
+    # the loop cannot match without predicted centroids
+    with pytest.raises(ValueError):
+        calculate_metrics_loop(gt_label_dict, pred_label_dict)
+
+    # every tooth is penalized instead
+    TLA, TSA, TIR = calculate_metrics(gt_label_dict, pred_label_dict)
+    gt_instances = np.array(gt_label_dict['instances'])
+    vertices = gt_label_dict['mesh_vertices']
+    tooth_sizes = []
+    for inst in range(1, 4):
+        verts = vertices[gt_instances == inst]
+        tooth_sizes.append(np.sqrt(np.sum((verts - verts.mean(0)) ** 2, axis=0)))
+
+    assert np.isclose(TLA, 5 * np.linalg.norm(tooth_sizes, axis=-1).mean())
+    assert TSA == np.mean(gt_instances == 0)
+    assert TIR == 0
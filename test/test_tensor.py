@@ -0,0 +1,73 @@
+import torch
+
+from teethland import PointTensor
+import teethland.tensor
+
+
+def random_proposals(num_proposals: int=4, num_points: int=64):
+    generator = torch.Generator().manual_seed(0)
+
+    return PointTensor(
+        coordinates=torch.rand(num_proposals * num_points, 3, generator=generator),
+        features=torch.rand(num_proposals * num_points, generator=generator),
+        batch_counts=torch.full((num_proposals,), num_points),
+    )
+
+
+def test_spatial_index_built_once(monkeypatch):
+    num_trees = 0
+    KDTree = teethland.tensor.KDTree
+
+    def counting_kdtree(*args, **kwargs):
+        nonlocal num_trees
+        num_trees += 1
+        return KDTree(*args, **kwargs)
+
+    monkeypatch.setattr(teethland.tensor, 'KDTree', counting_kdtree)
+
+    proposals = random_proposals()
+    x = PointTensor(torch.rand(100, 3, generator=torch.Generator().manual_seed(1)))
+
+    proposals.cache.spatial_index = proposals.spatial_index
+    sources = [proposals.batch(b) for b in range(proposals.batch_size)]
+    for _ in range(3):  # e.g. segmentation, multi-class, and caries heads
+        for source in sources:
+            features = torch.rand(source.num_points)
+            source.new_tensor(features=features).interpolate(x, index=True)
+        for b in range(proposals.batch_size):
+            proposals.batch(b).interpolate(x, index=True)
+
+    assert num_trees == proposals.batch_size
+
+
+def test_interpolate_index_unchanged():
+    proposals = random_proposals()
+    x = PointTensor(torch.rand(100, 3, generator=torch.Generator().manual_seed(1)))
+
+    proposals.cache.spatial_index = proposals.spatial_index
+    for b in range(proposals.batch_size):
+        source = proposals.batch(b)
+        expected = source.interpolate(x, dist_thresh=0.03).F
+        for cache in [False, True, True]:
+            interp = source.interpolate(x, dist_thresh=0.03, index=True, cache=cache)
+            assert torch.allclose(interp.F, expected)
+
+        labels = source.new_tensor(features=(source.F * 3).long() - 1)
+        expected = labels.interpolate(x).F
+        assert torch.equal(labels.interpolate(x, index=True, cache=True).F, expected)
+
+
+def test_spatial_index_missing_neighbors():
+    proposals = PointTensor(
+        coordinates=torch.rand(5, 3),
+        batch_counts=torch.tensor([2, 3]),
+    )
+    queries = torch.rand(4, 3)
+    neighbor_idxs, sq_dists = proposals.spatial_index.query(
+        queries, torch.tensor([0, 0, 1, 1]), k=3,
+    )
+
+    assert torch.all(neighbor_idxs[:2, 2] == -1)
+    assert torch.all(torch.isinf(sq_dists[:2, 2]))
+    assert torch.all((0 <= neighbor_idxs[:2, :2]) & (neighbor_idxs[:2, :2] < 2))
+    assert torch.all((2 <= neighbor_idxs[2:]) & (neighbor_idxs[2:] < 5))